@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 from flask_mqtt import Mqtt
 import json
 import random
@@ -9,6 +9,22 @@ from isdProjectImports import mqttImports
 from isdProjectImports import dbFunctions
 from isdProjectImports import voteHandling
 from isdProjectImports import logHandler
+from isdProjectImports import espRegistry
+from isdProjectImports import voteWriter
+from isdProjectImports import mqttDispatcher
+from isdProjectImports import voteTally
+from isdProjectImports import eventStream
+from isdProjectImports import dbMigrations
+from isdProjectImports import dbBackend
+from isdProjectImports import dbPool
+from isdProjectImports import metrics
+from isdProjectImports import mqttMessages
+from isdProjectImports import responseCache
+from isdProjectImports import pagination
+from isdProjectImports import voteScheduler
+from isdProjectImports import voteSessions
+from isdProjectImports import registrationCoalescer
+from isdProjectImports import resyncResponder
 from flask_cors import CORS
 import threading
 import time # testing purposes
@@ -18,8 +34,36 @@ mqttKeepAliveSec = 10
 mqttBrokerIP = 'localhost'  # Replace with broker IP if not running locally.
 mqttQoSLevel = 1
 
-globalVoteInformation = voteHandling.VoteInformation() # Global vote information object.
-globalVoteInformationList = []  # List of global vote information objects.
+# Vote writer setup, votes are written to the database in batches of up to voteWriterBatchSize or every voteWriterFlushIntervalMs.
+voteWriterBatchSize = 200
+voteWriterFlushIntervalMs = 50
+voteWriterMaxQueueSize = 10000
+
+# Registration coalescer setup, registrations arriving within registrationWindowMs are registered together, up to registrationBatchSize per batch.
+registrationBatchSize = 500
+registrationWindowMs = 50
+registrationMaxQueueSize = 10000
+
+# Resync requests arriving within resyncWindowMs of a broadcast are answered together at the end of the window.
+resyncWindowMs = 500
+
+# Log level, set to logHandler.DEBUG to log every received MQTT message.
+logHandler.setLevel(logHandler.INFO)
+
+# MQTT dispatcher setup, number of worker threads handling MQTT messages and the queue size of each worker.
+mqttWorkerCount = 4
+mqttWorkerQueueSize = 1000
+
+# Event stream setup, maximum number of dashboards connected to /api/events.
+eventStreamMaxClients = 250
+
+# Database connection pool setup. Connections are held by the MQTT workers, the vote writer and the Flask request threads,
+# pool statistics are shown under 'dbPool' in /api/getServerStats.
+dbPoolSize = mqttWorkerCount + 4
+dbPoolMaxOverflow = 10
+dbPoolRecycleSec = 1800  # Below MySQL's wait_timeout so idle connections are replaced before the server drops them.
+dbPoolPrePing = True
+dbPoolTimeoutSec = 10
 
 # Flask app setup.
 app = Flask(__name__)
@@ -31,9 +75,58 @@ app.config['MQTT_BROKER_PORT'] = mqttBrokerPort
 app.config['MQTT_KEEPALIVE'] = mqttKeepAliveSec
 app.config['MQTT_TLS_ENABLED'] = False
 
-# Database setup.
-app.config['SQLALCHEMY_DATABASE_URI'] = f'mysql+pymysql://{credentials.dbUsername}:{credentials.dbPassword}@{credentials.dbHostname}:{credentials.dbPort}/{credentials.dbName}'
+# Database setup, the backend (MySQL or SQLite) is selected with 'dbBackend' in credentials.py.
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dbPool.pool_options(dbPoolSize, dbPoolMaxOverflow, dbPoolRecycleSec, dbPoolPrePing, dbPoolTimeoutSec)
+dbBackend.init_app(app, dbFunctions.db, dbBackend.database_uri(credentials))
+
+# Background vote writer, started in main.
+globalVoteWriter = voteWriter.VoteWriter(app, batchSize=voteWriterBatchSize, flushIntervalMs=voteWriterFlushIntervalMs, maxQueueSize=voteWriterMaxQueueSize)
+
+# The live tallies already count the votes of a batch the writer could not store, they are loaded from the database again.
+@globalVoteWriter.on_dropped
+def forget_dropped_votes(rows):
+    for topicID in {topicID for _, topicID, _ in rows}:
+        voteTally.tally.forget(topicID)
+
+# Topics are loaded from the database when they are not tracked, the queued votes are written first so the loaded counts include them.
+@voteTally.tally.before_load
+def write_queued_votes(topicIDs):
+    if globalVoteWriter.drain() == False:
+        logHandler.log(f'write_queued_votes(), vote writer not drained, the tally of topics {topicIDs} may miss queued votes.')
+
+# Batched ESP registration, started in main.
+globalRegistrationCoalescer = registrationCoalescer.RegistrationCoalescer(app, batchSize=registrationBatchSize, windowMs=registrationWindowMs, maxQueueSize=registrationMaxQueueSize)
+
+# MQTT message handler pool, started in main.
+globalMessageDispatcher = mqttDispatcher.MessageDispatcher(workerCount=mqttWorkerCount, maxQueueSize=mqttWorkerQueueSize)
+
+# Live updates pushed to dashboards.
+globalEventStream = eventStream.EventStream(maxClients=eventStreamMaxClients)
+
+# Topic start and end transitions, started in main.
+globalVoteScheduler = voteScheduler.VoteScheduler()
+
+# Answers resync requests with the vote state kept up to date by publish_vote_status().
+globalResyncResponder = resyncResponder.ResyncResponder(mqttImports.publishJSONtoMQTT, windowMs=resyncWindowMs)
+
+# Stats of components outside of this module, name -> function returning a dict, e.g. the async server mode (asyncServer.py).
+serverStatsProviders = {}
+
+# HTTP request latency, labelled with the route pattern so IDs in URLs do not create new series.
+@app.before_request
+def start_request_timer():
+    g.requestStartTime = time.perf_counter()
+
+
+@app.after_request
+def observe_request_time(response):
+    startTime = g.pop('requestStartTime', None)
+    if startTime is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.httpRequestSeconds.labels(route, request.method, str(response.status_code)).observe(time.perf_counter() - startTime)
+    return response
+
 
 # Only for confirming that server is running.
 @app.route('/')
@@ -41,152 +134,221 @@ def index():
     return 'Flask MQTT Server is running!'
 
 
-# Subscribe to all topics in 'initialSubscribeTopics' list when server is started.
+# Subscribe to the filters of the routes and restore the other subscriptions when the server (re)connects.
 @mqttImports.mqtt.on_connect()
 def handle_connect(client, userdata, flags, rc):
    if rc == 0:
-       for topic in mqttImports.initialSubscribeTopics:
-            mqttImports.mqtt.subscribe(topic, qos=1)  # subscribe to each topic
-            logHandler.log(f'handle_message(), Subscribed to topic: {topic}')
+       mqttImports.subscriptions.restore()
    else:
         logHandler.log(f'handle_message(), Connection failed with result code {str(rc)}')
 
 
 # MQTT message handling
-# TODO: Figure out a way to move the case handling to their own functions.
+# The paho network thread (the event loop in asyncServer.py) only decodes the message and picks the handler, the handler runs on a dispatcher worker.
+# Nothing here may block: a message for a full worker queue is dropped and counted.
 @mqttImports.mqtt.on_message()
 def handle_message(client, userdata, message):
-    receivedMessage = message.payload.decode("utf-8")
     receivedTopic = message.topic
-    logHandler.log(f'handle_message(), Received message: {receivedMessage} on topic: {receivedTopic}')
 
-    # Decode JSON message.
-    decodedMessage = mqttImports.decodeStringToJSON(receivedMessage)
-    if decodedMessage == -1:
-        logHandler.log(f'JSON decode failed.')
-        return # TODO: maybe add something to notify ESPs about failed JSON decode.
+    # Find the handler registered for the topic.
+    match = mqttImports.router.match(receivedTopic)
+    if match is None:
+        metrics.mqttMessagesReceived.labels('unmatched').inc()
+        logHandler.log(f'handle_message(), No handler for topic: {receivedTopic}')
+        return
+    route, params = match
+    metrics.mqttMessagesReceived.labels(route.name).inc()
+
+    # Decode and validate the payload with the route's schema, malformed messages never reach a worker.
+    if route.schema is not None:
+        try:
+            decodedMessage = route.schema.decode(message.payload)
+        except mqttMessages.MessageError as error:
+            if error.reason == 'json':
+                metrics.mqttDecodeFailures.inc()
+            metrics.mqttInvalidMessages.labels(route.name, error.reason).inc()
+            logHandler.log(f'handle_message(), Invalid message on topic: {receivedTopic}, {error}. Message: {message.payload[:200]!r}')
+            return # TODO: maybe add something to notify ESPs about failed JSON decode.
+    else:
+        decodedMessage = mqttImports.decodeStringToJSON(message.payload.decode("utf-8"))
+        if decodedMessage == -1:
+            logHandler.log(f'handle_message(), JSON decode failed. Message: {message.payload[:200]!r} on topic: {receivedTopic}')
+            return
+
+    # Hand the message to a worker, messages with the same order key (device) are kept in order.
+    orderKey = params[route.orderKey] if route.orderKey is not None else route.name
+    if globalMessageDispatcher.submit(route.name, orderKey, route.handler, decodedMessage=decodedMessage, **params) == False:
+        logHandler.log(f'handle_message(), Worker queue full, message on topic {receivedTopic} dropped.')
+        reject_message(route.name, params)
 
-    # Handle received message based on topic.
-    
+    return # End of function.
 
-    # ESP registration handling.
-    if receivedTopic.startswith("/registration/Server/") == True:
-        logHandler.log(f'handle_message(), Message handling going to ESP registration handling path.')
 
-        # Extract ESP MAC address from topic.
-        macAddress = receivedTopic.split("/")[3]
+# Tells an ESP that its registration or vote was dropped because the server is overloaded, so it sends it again.
+# Only queues the reply, it is called on the MQTT network loop too.
+def reject_message(routeName, params):
+    if routeName == 'registration':
+        mqttImports.publishJSONtoMQTT(f'{mqttImports.registrationResponeTopic}{params["macAddress"]}', {'Error': 'ServerBusy'})
+    elif routeName == 'vote':
+        mqttImports.publishJSONtoMQTT(f'{mqttImports.voteRejectedTopic}{params["deviceID"]}', {'Error': 'ServerBusy'})
 
-        # Register ESP in database.
-        # Inside mqtt.on_message() in app.py
-        registeredESP, registrationStatus = dbFunctions.register_esp(app, macAddress)
 
-        if registrationStatus == True:
-            # return uniqueID to ESP.
-            
-            #time.sleep(10) #TODO: remove this once ESP is updated to handle the registration response.
+# ESP registration handling.
+@mqttImports.router.route(mqttImports.registrationIncomingTopic, name='registration', orderKey='macAddress', schema=mqttMessages.RegistrationMessage)
+def handle_registration(macAddress, decodedMessage):
+    logHandler.debug('handle_registration(), Received message: %s from ESP MAC address: %s', decodedMessage, macAddress)
 
-            mqttImports.mqtt.publish(f'/registration/esp/{macAddress}', f'{{"VotingID":"{registeredESP.DeviceID}"}}', qos=1)
-            mqttImports.mqtt.subscribe(f'/registration/ESP/{registeredESP.DeviceID}', qos=1) # Subscribe to ESP's uniqueID topic.
-            logHandler.log(f'handle_message(), ESP registration successful, ESP uniqueID: {registeredESP.DeviceID}, ESP MAC address: {registeredESP.MacAddress}\n')
+    # Register ESP in database, together with the other ESPs registering at the same time.
+    if globalRegistrationCoalescer.submit(macAddress) == False:
+        logHandler.log(f'handle_registration(), ESP registration failed, ESP MAC address: {macAddress}\n')
+        reject_message('registration', {'macAddress': macAddress})
 
-        else:
-            #TODO: add something to notify ESP about failed registration.
-            logHandler.log(f'handle_message(), ESP registration failed, ESP MAC address: {macAddress}\n')
+    return # end of ESP registration handling.
 
-        return # end of ESP registration handling.
 
+# Reply on '/registration/esp/<macAddress>': the VotingID of the ESP and its room, the ESP subscribes to the setup topic of the room.
+# Sent again when the ESP is moved to another room. Without 'Room' the ESP is in the default room.
+def registration_message(deviceID, room):
+    message = {'VotingID': deviceID}
+    if room is not None:
+        message['Room'] = room
+    return message
 
-    # Vote handling.
-    elif receivedTopic.startswith("/vote/") == True:
-        
-        logHandler.log(f'handle_message(), Message handling going to vote handling path.')
 
-        # Extract ESP ID from topic.
-        deviceID = receivedTopic.split("/")[2]
+# Replies to a batch of registered ESPs.
+@globalRegistrationCoalescer.on_registered
+def reply_to_registered_esps(registeredESPs):
+    # Return uniqueID to every ESP of the batch.
+    for registeredESP in registeredESPs:
+        mqttImports.publishJSONtoMQTT(f'/registration/esp/{registeredESP.MacAddress}', registration_message(registeredESP.DeviceID, registeredESP.Room))
+        globalEventStream.publish('registration', {
+            'DeviceIndex': registeredESP.DeviceIndex,
+            'DeviceID': registeredESP.DeviceID,
+            'MacAddress': registeredESP.MacAddress,
+        }, key=f'registration:{registeredESP.DeviceIndex}')
 
-        # Convert strings to datetime objects
-        if globalVoteInformation.voteStartTime == None and globalVoteInformation.voteEndTime == None:
-            return # No vote is active #TODO: Figure out a more reliable way to handle this.
-        
-        try:
-            vote_end_time = globalVoteInformation.voteEndTime
-            #datetime.strptime(vote_end_time, "%Y-%m-%d %H:%M:%S")
-            vote_start_time = globalVoteInformation.voteStartTime
-            #datetime.strptime(vote_start_time, "%Y-%m-%d %H:%M:%S")
-
-            # Test timing restrictions and if vote is for the correct topic.
-            logHandler.log(f'handle_message(), vote_end_time: {vote_end_time}, vote_start_time: {vote_start_time}, datetime.now(): {datetime.now()}')
-            logHandler.log(f'handle_message(), decodedMessage[\'VoteTitle\']: {decodedMessage["VoteTitle"]}, globalVoteInformation.title: {globalVoteInformation.title}')
-
-            if (
-                vote_end_time < datetime.now()
-                or vote_start_time > datetime.now()
-                or decodedMessage['VoteTitle'] != globalVoteInformation.title
-            ):
-                logHandler.log(f'handle_message(), vote is not active or vote is not for the correct topic, exit function.')
-                logHandler.log(f'handle_message(), vote_end_time: {vote_end_time}, vote_start_time: {vote_start_time}, datetime.now(): {datetime.now()}')
-                logHandler.log(f'handle_message(), decodedMessage[\'VoteTitle\']: {decodedMessage["VoteTitle"]}, globalVoteInformation.title: {globalVoteInformation.title}')
-                return # Vote is not active or vote is not for the correct topic, exit function.
-            
-            elif dbFunctions.find_if_vote_exists(app, deviceID, globalVoteInformation) == False:
-                dbFunctions.create_vote(app, deviceID, decodedMessage['vote'], globalVoteInformation)
-                return # Exit function.
+    # Subscribe to the uniqueID topics of the batch, a no-op while the '/registration/ESP/+' wildcard covers them.
+    mqttImports.subscriptions.add(*[f'/registration/ESP/{registeredESP.DeviceID}' for registeredESP in registeredESPs])
+    logHandler.log(f'reply_to_registered_esps(), {len(registeredESPs)} ESPs registered.')
 
+
+# Messages of registered ESPs on their uniqueID topic, routed so they are counted and not logged as unmatched.
+@mqttImports.router.route(mqttImports.deviceTopic, name='device', orderKey='deviceID')
+def handle_device_message(deviceID, decodedMessage):
+    logHandler.debug('handle_device_message(), Received message: %s from DeviceID: %s', decodedMessage, deviceID)
+
+
+# Vote handling.
+@mqttImports.router.route(mqttImports.voteIncomingTopic, name='vote', orderKey='deviceID', schema=mqttMessages.VoteMessage)
+def handle_vote(deviceID, decodedMessage):
+    logHandler.debug('handle_vote(), Received message: %s from DeviceID: %s', decodedMessage, deviceID)
+
+    try:
+        # Resolve the ESP from the registry, its room selects the topic.
+        esp = dbFunctions.lookup_esp(app, deviceID)
+        if esp is None or not esp.assigned:
+            metrics.votes.labels('rejectedUnassigned').inc()
+            logHandler.log(f'handle_vote(), ESP not assigned, vote ignored. DeviceID: {deviceID}')
+            return # Exit function.
+
+        # Test if vote is for the topic of the room.
+        session = voteSessions.sessions.resolve(esp.room, decodedMessage.VoteTitle)
+        if session is None:
+            metrics.votes.labels('rejectedTitle').inc()
+            logHandler.debug('handle_vote(), vote is not for the topic of the room, exit function. decodedMessage.VoteTitle: %s, room: %s', decodedMessage.VoteTitle, esp.room)
+            return # Vote is not for the correct topic, exit function.
+
+        # The scheduler keeps the started/ended state of the topic, no time comparisons here.
+        topicID = session.topicID
+        if not globalVoteScheduler.isAccepting(topicID):
+            metrics.votes.labels('rejectedInactive').inc()
+            logHandler.debug('handle_vote(), vote is not active, exit function. topicID: %s', topicID)
+            return # Vote is not active, exit function.
+
+        # Hand the vote to the background writer.
+        if globalVoteWriter.submit(esp.userID, topicID, decodedMessage.vote) == False:
+            metrics.votes.labels('rejectedQueueFull').inc()
+            reject_message('vote', {'deviceID': deviceID})
+        else:
+            previousVote = dbFunctions.tally_vote(app, esp.userID, topicID, decodedMessage.vote)
+            if previousVote is None:
+                metrics.votes.labels('created').inc()
+            elif previousVote != decodedMessage.vote:
+                metrics.votes.labels('updated').inc()
             else:
-                dbFunctions.update_vote(app, deviceID, decodedMessage['vote'], globalVoteInformation)
-                return # Exit function.
-        
-        except Exception as errorMsg:
-            logHandler.log(f'handle_message(), Another crash in vote handling. Somebody should really fix this shite.')
-            logHandler.log(f'handle_message(), Error: {errorMsg}')
-            return
+                metrics.votes.labels('unchanged').inc()
+
+            # Push the new counts to the dashboards, undelivered updates of a topic are replaced by newer ones.
+            if previousVote != decodedMessage.vote:
+                globalEventStream.publish('tally', tally_event(topicID, {
+                    'UserID': esp.userID,
+                    'VoteType': decodedMessage.vote,
+                    'PreviousVoteType': previousVote,
+                }), key=f'tally:{topicID}')
+        return # Exit function.
     
-    # Vote resync handling.
-    elif receivedTopic == "/setupVote/Resync":
-        try:
-            logHandler.log(f'handle_message(), Message handling going to vote resync handling path.')
-            
-            # Create message.
-            if globalVoteInformation.voteEndTime < datetime.now():
-                resyncMessage = f"""{{
-                "VoteTitle": "{globalVoteInformation.title}",
-                "VoteType": "public",
-                "VoteStatus": "ended"
-                }}"""
-            else:
-                resyncMessage = f"""{{
-                "VoteTitle": "{globalVoteInformation.title}",
-                "VoteType": "public",
-                "VoteStatus": "started"
-                }}"""
-
-            # Send vote information to /setupVote/Resync topic.
-            mqttImports.publishJSONtoMQTT('/setupVote/Setup', resyncMessage)
-            
-            return # End of vote handling.
+    except Exception as errorMsg:
+        metrics.votes.labels('error').inc()
+        logHandler.log(f'handle_vote(), Another crash in vote handling. Somebody should really fix this shite.')
+        logHandler.log(f'handle_vote(), Error: {errorMsg}')
+        return
+
+
+# Vote resync handling.
+@mqttImports.router.route(mqttImports.voteResyncTopic, name='resync', schema=mqttMessages.ResyncMessage)
+def handle_resync(decodedMessage):
+    try:
+        logHandler.debug('handle_resync(), Message handling going to vote resync handling path.')
         
-        except Exception as errorMsg:
-            logHandler.log(f'handle_message(), Error: {errorMsg}')
-            return
+        # Send the current state of the topic of every room to the setup topic of the room, requests of the same window are collapsed.
+        globalResyncResponder.request()
+        
+        return # End of vote handling.
+    
+    except Exception as errorMsg:
+        logHandler.log(f'handle_resync(), Error: {errorMsg}')
+        return
 
-    return # End of function.
 
 # API endpoints
+def listing(function, *args):
+    """
+    Call a dbFunctions listing with the query string options of the request:
+    '?stream=1' streams the list in chunks, 'limit', 'after' and the filters return a keyset page (see pagination).
+    """
+    try:
+        page = pagination.parse_page_request(request.args)
+    except ValueError as errorMsg:
+        return jsonify({'message': str(errorMsg)}), 400
+    stream = request.args.get('stream', '').lower() in ('1', 'true')
+    return function(app, *args, stream=stream, page=page)
+
+
 @app.route('/api/getRegisteredESPs', methods=['GET'])
+@responseCache.cache.cached(responseCache.ESPS)
 def getRegisteredESPs():
-    return dbFunctions.get_registered_esps(app)
+    return listing(dbFunctions.get_registered_esps)
 
 @app.route('/api/getUnassignedESPs', methods=['GET'])
+@responseCache.cache.cached(responseCache.ESPS)
 def getUnassignedESPs():
-    return dbFunctions.get_unassigned_esps(app)
+    return listing(dbFunctions.get_unassigned_esps)
+
+
+@app.route('/api/getAllESPs', methods=['GET'])
+@responseCache.cache.cached(responseCache.ESPS)
+def getAllESPs():
+    return listing(dbFunctions.get_all_esps)
 
 
 @app.route('/api/getTopics', methods=['GET'])
+@responseCache.cache.cached(responseCache.TOPICS)
 def getTopics():
-    return dbFunctions.get_all_topics(app)
+    return listing(dbFunctions.get_all_topics)
 
 
 @app.route('/api/getTopic/<topicID>', methods=['GET'])
+@responseCache.cache.cached(responseCache.TOPICS)
 def getTopic(topicID):
     return dbFunctions.get_topic(app, topicID)
 
@@ -198,7 +360,8 @@ def createTopic():
         "Title": "TEXT",
         "Description": "TEXT",
         "StartTime": "YYYY-MM-DD HH:MM:SS",
-        "EndTime": "YYYY-MM-DD HH:MM:SS"
+        "EndTime": "YYYY-MM-DD HH:MM:SS",
+        "Room": "TEXT" (optional, the default room if missing)
     }
     """
     try:
@@ -209,21 +372,32 @@ def createTopic():
             logHandler.log(f'createTopic(), Invalid request.')
             return jsonify({'message': 'Invalid request.'}), 400
 
-        globalVoteInformation.updateVoteInformation(data['Title'], data['Description'], datetime.strptime(data['StartTime'], '%Y-%m-%d %H:%M:%S'), data['EndTime'])
+        # Both times are stored as datetimes, the vote handling compares them with datetime.now().
+        try:
+            voteStartTime = datetime.strptime(data['StartTime'], '%Y-%m-%d %H:%M:%S')
+            voteEndTime = datetime.strptime(data['EndTime'], '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            logHandler.log(f'createTopic(), Invalid request, StartTime or EndTime is not YYYY-MM-DD HH:MM:SS.')
+            return jsonify({'message': 'StartTime and EndTime must be YYYY-MM-DD HH:MM:SS.'}), 400
+
+        voteInformation = voteHandling.VoteInformation()
+        voteInformation.updateVoteInformation(data['Title'], data['Description'], voteStartTime, voteEndTime, data.get('Room'))
+        if voteInformation.voteStartTime >= voteInformation.voteEndTime:
+            logHandler.log(f'createTopic(), Invalid request, StartTime is not before EndTime.')
+            return jsonify({'message': 'StartTime must be before EndTime.'}), 400
 
-        # convert datetime string to datetime object
-        voteStartTime = globalVoteInformation.voteStartTime
+        # Create new topic in database.
+        if dbFunctions.create_topic(app, voteInformation) == True:
+            voteTally.tally.seed(voteInformation.topicID, [])
 
-        # Publish vote information to /setupVote/Setup topic.
-        if voteStartTime < datetime.now():
-            voteInformationJson = f'{{"VoteTitle":"{globalVoteInformation.title}","VoteType":"public","VoteStatus":"started"}}'
-        else:
-            voteInformationJson = f'{{"VoteTitle":"{globalVoteInformation.title}","VoteType":"public","VoteStatus":"ended"}}'
-        mqttImports.publishJSONtoMQTT('/setupVote/Setup', voteInformationJson)
+            # The new topic replaces the topic of its room, the pending transitions of that one are dropped.
+            replaced = voteSessions.sessions.add(voteInformation)
+            if replaced is not None:
+                globalVoteScheduler.forget(replaced.topicID)
+                voteTally.tally.forget(replaced.topicID)
 
-        # Create new topic in database.
-        if dbFunctions.create_topic(app, globalVoteInformation) == True:
-            # TODO: figure out voteStartTiming.
+            # Publishes the current state to the setup topic of the room and the dashboards, and the start and end at their times.
+            globalVoteScheduler.schedule(voteInformation)
             return jsonify({'message': 'Topic created successfully.'}), 200
         else:
             return jsonify({'message': 'Topic creation failed.'}), 400
@@ -249,7 +423,10 @@ def assignUserToESP():
             logHandler.log(f'assignUserToESP(), Invalid request.')
             return jsonify({'message': 'Invalid request.'}), 400
         
-        return dbFunctions.assign_user_to_esp(app, data['username'], data['espID'])
+        response = dbFunctions.assign_user_to_esp(app, data['username'], data['espID'])
+        if response[1] == 200:
+            globalEventStream.publish('assignment', {'DeviceIndex': data['espID'], 'Assigned': True, 'Username': data['username']}, key=f'assignment:{data["espID"]}')
+        return response
     
     except Exception as errorMsg:
         logHandler.log(f'assignUserToESP(), Error: {errorMsg}')
@@ -271,45 +448,255 @@ def unassignESP():
             logHandler.log(f'unassignESP(), Invalid request.')
             return jsonify({'message': 'Invalid request.'}), 400
         
-        return dbFunctions.unassign_esp_with_id(app, data['espID'])
+        response = dbFunctions.unassign_esp_with_id(app, data['espID'])
+        if response[1] == 200:
+            globalEventStream.publish('assignment', {'DeviceIndex': data['espID'], 'Assigned': False}, key=f'assignment:{data["espID"]}')
+        return response
     
     except Exception as errorMsg:
         logHandler.log(f'unassignESP(), Error: {errorMsg}')
         return jsonify({'message': f'{str(errorMsg)}'}), 500
 
 
+@app.route('/api/setESPRoom', methods=['POST'])
+def setESPRoom():
+    """Input JSON format:
+    {
+        "espID": "INT",
+        "Room": "TEXT" or null for the default room
+    }
+    """
+    try:
+        data = request.json
+
+        # Validate request.
+        if mqttImports.validateKeywordsInJSON(data, ['espID'], 1) == False or 'Room' not in data:
+            logHandler.log(f'setESPRoom(), Invalid request.')
+            return jsonify({'message': 'Invalid request.'}), 400
+
+        response, code = dbFunctions.set_esp_room(app, data['espID'], data['Room'])
+
+        # Tell a registered ESP its new room, it moves its subscription to the setup topic of the room.
+        esp = response.get_json() if code == 200 else None
+        if esp is not None and esp['DeviceID'] is not None:
+            mqttImports.publishJSONtoMQTT(f'/registration/esp/{esp["MacAddress"]}', registration_message(esp['DeviceID'], esp['Room']))
+
+        return response, code
+
+    except Exception as errorMsg:
+        logHandler.log(f'setESPRoom(), Error: {errorMsg}')
+        return jsonify({'message': f'{str(errorMsg)}'}), 500
+
+
+@app.route('/api/bulkProvisionESPs', methods=['POST'])
+def bulkProvisionESPs():
+    """Input CSV, as the request body or as the uploaded file 'file':
+    MacAddress,Room
+    AA:BB:CC:DD:EE:01,hall-a
+    AA:BB:CC:DD:EE:02
+    """
+    try:
+        upload = request.files.get('file')
+        text = upload.read().decode('utf-8-sig') if upload is not None else request.get_data(as_text=True)
+
+        try:
+            esps = registrationCoalescer.parse_provisioning_csv(text)
+        except ValueError as errorMsg:
+            return jsonify({'message': str(errorMsg)}), 400
+        if not esps:
+            logHandler.log(f'bulkProvisionESPs(), Invalid request.')
+            return jsonify({'message': 'Invalid request.'}), 400
+
+        return dbFunctions.provision_esps(app, esps)
+
+    except Exception as errorMsg:
+        logHandler.log(f'bulkProvisionESPs(), Error: {errorMsg}')
+        return jsonify({'message': f'{str(errorMsg)}'}), 500
+
+
 @app.route('/api/unassignAllESPs', methods=['POST'])
 def unassignAllESPs():
-    return dbFunctions.unassign_all_esps(app)
+    response = dbFunctions.unassign_all_esps(app)
+    if response[1] == 200:
+        globalEventStream.publish('assignment', {'DeviceIndex': None, 'Assigned': False}, key='assignment:all')
+    return response
 
 
 @app.route('/api/getVotes/<int:topicID>', methods=['GET'])
 def get_votes_by_topic(topicID):
-    return dbFunctions.get_votes(app, topicID)
+    return listing(dbFunctions.get_votes, topicID)
+
+
+@app.route('/api/getTally/<int:topicID>', methods=['GET'])
+def get_tally_by_topic(topicID):
+    return dbFunctions.get_tally(app, topicID)
 
 
 @app.route('/api/getAssignedESPs', methods=['GET'])
+@responseCache.cache.cached(responseCache.ESPS)
 def get_assigned_esps():
-    return dbFunctions.get_assigned_esps(app)
+    return listing(dbFunctions.get_assigned_esps)
+
+
+@app.route('/api/getServerStats', methods=['GET'])
+def get_server_stats():
+    return jsonify({
+        'deviceRegistry': espRegistry.registry.stats(),
+        'voteWriter': globalVoteWriter.stats(),
+        'registrationCoalescer': globalRegistrationCoalescer.stats(),
+        'mqttSubscriptions': mqttImports.subscriptions.stats(),
+        'mqttPublisher': mqttImports.publisher.stats(),
+        'resyncResponder': globalResyncResponder.stats(),
+        'mqttDispatcher': globalMessageDispatcher.stats(),
+        'logHandler': logHandler.stats(),
+        'voteTally': voteTally.tally.stats(),
+        'eventStream': globalEventStream.stats(),
+        'dbPool': dbPool.stats(dbFunctions.db.engine),
+        'responseCache': responseCache.cache.stats(),
+        'voteScheduler': globalVoteScheduler.stats(),
+        'voteSessions': voteSessions.sessions.stats(),
+        **{name: provider() for name, provider in serverStatsProviders.items()},
+    }), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def vote_status_message(voteInformation, state):
+    """Setup message of a room, ESPs only know 'started' and 'ended' so a pending topic is sent as ended."""
+    message = {
+        'VoteTitle': voteInformation.title,
+        'VoteType': 'public',
+        'VoteStatus': 'started' if state == voteScheduler.STARTED else 'ended',
+    }
+    if voteInformation.room is not None:
+        message['Room'] = voteInformation.room
+    return message
+
+
+# Send every topic start and end to the ESPs of its room and the dashboards.
+@globalVoteScheduler.on_transition
+def publish_vote_status(voteInformation, state):
+    key = f'setup:{voteInformation.room}'
+    topic = mqttImports.voteSetupTopicOf(voteInformation.room)
+    mqttImports.publishJSONtoMQTT(topic, globalResyncResponder.update(key, topic, vote_status_message(voteInformation, state)), key=key)
+    globalEventStream.publish('topic', topic_event(voteInformation), key=f'topic:{voteInformation.topicID}')
+
+
+# The tally of an ended topic is dropped, /api/getTally loads it from the database again when it is read.
+@globalVoteScheduler.on_transition
+def forget_ended_tally(voteInformation, state):
+    if state == voteScheduler.ENDED:
+        voteTally.tally.forget(voteInformation.topicID)
+
+
+def topic_event(voteInformation):
+    return {
+        'TopicID': voteInformation.topicID,
+        'Title': voteInformation.title,
+        'Description': voteInformation.description,
+        'StartTime': str(voteInformation.voteStartTime),
+        'EndTime': str(voteInformation.voteEndTime),
+        'Room': voteInformation.room,
+        'State': globalVoteScheduler.state(voteInformation.topicID),
+    }
+
+
+def tally_event(topicID, lastVote=None):
+    counts = voteTally.tally.counts(topicID) or {}
+    return {'TopicID': topicID, 'Counts': counts, 'TotalVotes': sum(counts.values()), 'LastVote': lastVote}
+
+
+# New event stream clients first receive the topic of every room and its tally.
+def initial_events():
+    initialEvents = []
+    for session in voteSessions.sessions.all():
+        initialEvents.append(('topic', topic_event(session), f'topic:{session.topicID}'))
+        if voteTally.tally.isTracked(session.topicID):
+            initialEvents.append(('tally', tally_event(session.topicID), f'tally:{session.topicID}'))
+    return initialEvents
+
+
+@app.route('/api/events', methods=['GET'])
+def events():
+    """Server-Sent Events stream of 'topic', 'tally', 'registration' and 'assignment' events."""
+
+    subscriber = globalEventStream.subscribe(initial_events())
+    if subscriber is None:
+        return jsonify({'message': 'Too many event stream clients.'}), 503
+
+    return Response(globalEventStream.stream(subscriber), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/api/forceResync', methods=['GET'])
 def force_resync():
-    mqttImports.publishJSONtoMQTT('/setupVote/Resync', '"{“resync”:”---”}"')
+    globalResyncResponder.request()
     return jsonify({'message': 'Resync message sent.'}), 200
 
 
+# Database CLI commands, run with 'flask --app app migrate' and 'flask --app app explain-queries'.
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending database migrations."""
+    message, status = dbMigrations.apply_migrations(app)
+    print(message)
+    if status == False:
+        raise SystemExit(1)
+
+
+@app.cli.command('explain-queries')
+def explain_queries_command():
+    """Check with EXPLAIN that the hot queries use an index."""
+    results = dbMigrations.explain_hot_queries(app)
+    for result in results:
+        print(f"{'ok  ' if result['UsesIndex'] else 'SCAN'} {result['Query']:<24} {result['Plan']}")
+    if not all(result['UsesIndex'] for result in results):
+        raise SystemExit(1)
+
+
 def startup_procedures():
     time.sleep(3) # Wait for app to be fully initialized.
     with app.app_context():
         logHandler.log(f'Server started.')
-        logHandler.log(f'Finding active topic.')
-        dbFunctions.find_active_topic(app, globalVoteInformation)
-        logHandler.log(f'Active topic: {globalVoteInformation.title}, voteStartTime: {globalVoteInformation.voteStartTime}, voteEndTime: {globalVoteInformation.voteEndTime}')
+        logHandler.log(f'Finding active topics.')
+        activeTopics = dbFunctions.find_active_topics(app)
+        for voteInformation in activeTopics:
+            logHandler.log(f'Active topic: {voteInformation.title}, room: {voteInformation.room}, voteStartTime: {voteInformation.voteStartTime}, voteEndTime: {voteInformation.voteEndTime}')
+            voteSessions.sessions.add(voteInformation)
+
+        # Seed the live vote tallies of the active topics and schedule their start and end.
+        dbFunctions.load_vote_tally(app, [voteInformation.topicID for voteInformation in activeTopics])
+        for voteInformation in activeTopics:
+            globalVoteScheduler.schedule(voteInformation)
+
+
+# Starts everything except the MQTT network loop and the HTTP server, shared with asyncServer.py.
+def start_background_services():
+    # Bring the database schema up to date before any traffic is handled.
+    migrationMessage, migrationStatus = dbMigrations.apply_migrations(app)
+    if migrationStatus == False:
+        logHandler.log(f'Database migration failed: {migrationMessage}')
+
+    # Start the MQTT publisher before connecting and before the services that publish. Services are stopped in
+    # reverse start order on shutdown, so the publisher stops last and sends the replies of the others.
+    mqttImports.publisher.start()
+
+    # Start the background vote writer, it flushes the remaining votes on shutdown.
+    globalVoteWriter.start()
+
+    # Start the registration coalescer and the MQTT handler workers. Started after the vote writer so they are drained first on shutdown.
+    globalRegistrationCoalescer.start()
+    globalMessageDispatcher.start()
+
+    # Start the topic scheduler.
+    globalVoteScheduler.start()
+
 
 if __name__ == '__main__':
-    # Initialize imported app extensions.
-    dbFunctions.db.init_app(app)
+    start_background_services()
+
     mqttImports.mqtt.init_app(app)
 
     # Create a thread for startup procedures.
@@ -0,0 +1,210 @@
+# Asyncio server mode: the REST API and the MQTT client of app.py on one asyncio event loop.
+#
+# The HTTP server is uvicorn (ASGI) and the MQTT client socket is driven by the event loop (asyncMqtt),
+# so idle connections and event stream clients do not hold threads. Served on the loop:
+#   /api/getTally/<topicID>   from the in-memory vote tally.
+#   /api/getVotes/<topicID>   through the async database engine (asyncDb), with the query of dbFunctions.get_votes().
+#   /api/events               Server-Sent Events, awaited instead of one blocked thread per client.
+# Every other route is the unchanged Flask route of app.py, run by the a2wsgi adapter on a pool of wsgiThreadCount threads.
+# MQTT handlers still run on the MQTT workers of app.py, they write through the synchronous engine.
+#
+# Requires uvicorn and a2wsgi, and for the async database reads greenlet with aiomysql (MySQL) or aiosqlite (SQLite).
+# Without an async driver /api/getVotes falls back to the Flask route.
+# Run from the repository root instead of app.py: python asyncServer.py
+import asyncio
+import json
+import re
+import time
+
+import app as server
+from isdProjectImports import asyncDb
+from isdProjectImports import asyncMqtt
+from isdProjectImports import credentials
+from isdProjectImports import dbBackend
+from isdProjectImports import dbFunctions
+from isdProjectImports import eventStream
+from isdProjectImports import jsonResponses
+from isdProjectImports import logHandler
+from isdProjectImports import metrics
+from isdProjectImports import mqttImports
+from isdProjectImports import voteTally
+
+try:
+    import uvicorn
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    uvicorn = None
+    WSGIMiddleware = None
+
+asyncServerHost = '0.0.0.0'
+asyncServerPort = 5000
+
+# Threads running the Flask routes that are not served on the event loop.
+wsgiThreadCount = 8
+
+# Async database engine, only used for reads. Writes use the pool configured in app.py.
+asyncDbPoolSize = 5
+asyncDbMaxOverflow = 10
+
+# Response headers of the routes served on the loop, Flask-CORS adds them to the Flask routes.
+jsonHeaders = [(b'content-type', b'application/json'), (b'access-control-allow-origin', b'*')]
+eventStreamHeaders = [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no'), (b'access-control-allow-origin', b'*')]
+
+mqttLoop = asyncMqtt.AsyncMqttLoop(mqttImports.mqtt.client)
+asyncDatabase = asyncDb.AsyncDatabase(dbBackend.database_uri(credentials), poolSize=asyncDbPoolSize, maxOverflow=asyncDbMaxOverflow, recycleSec=server.dbPoolRecycleSec, prePing=server.dbPoolPrePing, timeoutSec=server.dbPoolTimeoutSec)
+# The Flask app as an ASGI app. a2wsgi iterates a streamed response on one thread and buffers a few chunks,
+# so a slow client slows down the query instead of filling memory.
+wsgiApplication = WSGIMiddleware(server.app, workers=wsgiThreadCount) if WSGIMiddleware is not None else None
+
+# Metrics.
+stats = {'loopRequests': 0, 'wsgiRequests': 0, 'asyncDbFallbacks': 0}
+
+
+async def send_response(send, status, headers, body):
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def get_tally(scope, receive, send, topicID):
+    counts = voteTally.tally.counts(int(topicID))
+    if counts is None:
+        return None  # Not tracked yet, the Flask route loads it from the database.
+    body = json.dumps({'Counts': counts, 'TopicID': int(topicID), 'TotalVotes': sum(counts.values())}, separators=(',', ':')).encode('utf-8')
+    await send_response(send, 200, jsonHeaders, body)
+    return 200
+
+
+async def get_votes(scope, receive, send, topicID):
+    # Pages and streamed responses are built by the Flask route.
+    if scope['query_string'] or asyncDatabase.engine is None:
+        stats['asyncDbFallbacks'] += 1
+        return None
+    try:
+        rows = await asyncDatabase.fetch_all(dbFunctions.votes_statement(int(topicID)))
+    except Exception as errorMsg:
+        await send_response(send, 500, jsonHeaders, json.dumps({'error': str(errorMsg)}).encode('utf-8'))
+        return 500
+    await send_response(send, 200, jsonHeaders, jsonResponses.voteWithUsernameColumns.encode(rows))
+    return 200
+
+
+async def events(scope, receive, send):
+    subscriber = server.globalEventStream.subscribe(server.initial_events(), eventStream.AsyncEventSubscriber(asyncio.get_running_loop()))
+    if subscriber is None:
+        await send_response(send, 503, jsonHeaders, json.dumps({'message': 'Too many event stream clients.'}).encode('utf-8'))
+        return 503
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        subscriber.close()
+
+    disconnectWatcher = asyncio.get_running_loop().create_task(wait_for_disconnect())
+    stream = server.globalEventStream.stream_async(subscriber)
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': eventStreamHeaders})
+        async for chunk in stream:
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+    except OSError:
+        pass  # Client disconnected.
+    finally:
+        disconnectWatcher.cancel()
+        await stream.aclose()
+    return 200
+
+
+# (method, path regex, route label, handler). A handler returns the status code, or None to hand the request to Flask.
+loopRoutes = [
+    ('GET', re.compile(r'/api/getTally/(\d+)'), '/api/getTally/<int:topicID>', get_tally),
+    ('GET', re.compile(r'/api/getVotes/(\d+)'), '/api/getVotes/<int:topicID>', get_votes),
+    ('GET', re.compile(r'/api/events'), '/api/events', events),
+]
+
+
+async def handle_http(scope, receive, send):
+    for method, pattern, route, handler in loopRoutes:
+        if scope['method'] != method:
+            continue
+        match = pattern.fullmatch(scope['path'])
+        if match is None:
+            continue
+        startTime = time.perf_counter()
+        status = await handler(scope, receive, send, *match.groups())
+        if status is not None:
+            stats['loopRequests'] += 1
+            metrics.httpRequestSeconds.labels(route, method, str(status)).observe(time.perf_counter() - startTime)
+            return
+        break
+
+    # Flask observes the latency of its routes itself.
+    stats['wsgiRequests'] += 1
+    await wsgiApplication(scope, receive, send)
+
+
+def configure_mqtt_client(mqtt):
+    """
+    Apply the MQTT_* settings of app.py to the client like Mqtt.init_app(), without connecting.
+
+    init_app() ends with _connect(), which connects and starts paho's own network thread. Here mqttLoop
+    connects the client on the event loop, so _connect() is skipped and its credential and TLS settings
+    are applied instead.
+    """
+
+    mqtt._connect = lambda: None
+    try:
+        mqtt.init_app(server.app)
+    finally:
+        del mqtt._connect
+
+    if mqtt.username is not None:
+        mqtt.client.username_pw_set(mqtt.username, mqtt.password)
+    if mqtt.tls_enabled:
+        mqtt.client.tls_set(ca_certs=mqtt.tls_ca_certs, certfile=mqtt.tls_certfile, keyfile=mqtt.tls_keyfile, cert_reqs=mqtt.tls_cert_reqs, tls_version=mqtt.tls_version, ciphers=mqtt.tls_ciphers)
+        if mqtt.tls_insecure:
+            mqtt.client.tls_insecure_set(mqtt.tls_insecure)
+
+
+async def startup():
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, server.start_background_services)
+
+    try:
+        await asyncDatabase.start()
+    except ImportError as errorMsg:
+        logHandler.log(f'asyncServer, async database driver not available, /api/getVotes is served by Flask: {errorMsg}')
+
+    # The MQTT callbacks registered in app.py run on the event loop.
+    configure_mqtt_client(mqttImports.mqtt)
+    mqttLoop.start(mqttImports.mqtt.broker_url, mqttImports.mqtt.broker_port, mqttImports.mqtt.keepalive)
+
+    server.serverStatsProviders['asyncServer'] = lambda: {**stats, 'wsgiThreads': wsgiThreadCount, 'mqtt': mqttLoop.stats(), 'asyncDb': asyncDatabase.stats()}
+    loop.run_in_executor(None, server.startup_procedures)
+
+
+async def shutdown():
+    await mqttLoop.stop()
+    await asyncDatabase.stop()
+    wsgiApplication.executor.shutdown(wait=False)
+
+
+async def application(scope, receive, send):
+    """The ASGI application."""
+
+    if scope['type'] == 'http':
+        await handle_http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+if __name__ == '__main__':
+    if uvicorn is None:
+        raise SystemExit('The async server mode needs uvicorn and a2wsgi: pip install uvicorn a2wsgi')
+    uvicorn.run(application, host=asyncServerHost, port=asyncServerPort, loop='asyncio', lifespan='on', log_level='warning')
@@ -0,0 +1,196 @@
+# Side by side benchmark of the threaded server (app.py) and the asyncio server mode (asyncServer.py).
+#
+# Dashboards poll the REST API while the ESPs vote: --pollers clients poll /api/getTally, /api/getVotes and
+# /api/getTopics of a running vote as fast as they are answered, while simulated ESPs (see mqttLoadTest.py)
+# vote at --voteRate. Reports HTTP latency percentiles per route, polls/s, errors, committed votes and,
+# with --serverPid, the thread count and memory of the server process.
+#
+# Run both modes against the same broker and database, one after the other:
+#   python app.py                  python benchmarks/asyncServerBenchmark.py --mode threaded --serverPid <pid>
+#   python asyncServer.py          python benchmarks/asyncServerBenchmark.py --mode async --serverPid <pid> --compare benchmarks/results/asyncServerBenchmark-threaded-....json
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+from mqttLoadTest import SimulatedFleet, committed_votes, git_commit, http_json, percentiles, resultsFolder, setup_topic
+
+
+def process_sample(pid):
+    """Threads and resident memory (kB) of process 'pid', from /proc."""
+
+    sample = {}
+    with open(f'/proc/{pid}/status') as statusFile:
+        for line in statusFile:
+            if line.startswith('Threads:'):
+                sample['threads'] = int(line.split()[1])
+            elif line.startswith('VmRSS:'):
+                sample['rssKB'] = int(line.split()[1])
+    return sample
+
+
+class Pollers:
+    """'count' threads polling 'paths' round robin until stop() is called."""
+
+    def __init__(self, server, paths, count):
+        self.server = server
+        self.paths = paths
+        self.count = count
+        self.latency = {path: [] for path in paths}
+        self.errors = 0
+        self._running = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        self._running.set()
+        for index in range(self.count):
+            thread = threading.Thread(target=self._run, args=(index,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._running.clear()
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self, index):
+        latency = {path: [] for path in self.paths}
+        errors = 0
+        request = index
+        while self._running.is_set():
+            path = self.paths[request % len(self.paths)]
+            request += 1
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(self.server + path, timeout=30) as response:
+                    response.read()
+                latency[path].append(time.perf_counter() - start)
+            except (urllib.error.URLError, OSError):
+                errors += 1
+        with self._lock:
+            for path, values in latency.items():
+                self.latency[path].extend(values)
+            self.errors += errors
+
+
+def send_votes(args, fleet, title):
+    start = time.perf_counter()
+    totalVotes = int(args.voteRate * args.duration)
+    for voteIndex in range(totalVotes):
+        delay = start + voteIndex / args.voteRate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        fleet.publish_vote(voteIndex % len(fleet.macAddresses), title, ('yes', 'no')[(voteIndex // len(fleet.macAddresses)) % 2])
+    return totalVotes, time.perf_counter() - start
+
+
+def compare(previousPath, results):
+    with open(previousPath) as previousFile:
+        previous = json.load(previousFile)
+    print(f'\n{"":<28}{previous["mode"]:>16}{results["mode"]:>16}')
+    print(f'{"polls/s":<28}{previous["pollsPerSec"]:>16}{results["pollsPerSec"]:>16}')
+    print(f'{"poll errors":<28}{previous["pollErrors"]:>16}{results["pollErrors"]:>16}')
+    for path, latency in results['pollLatency'].items():
+        route = path.split('/')[2]
+        old = previous['pollLatency'].get(path, {})
+        print(f'{route + " p50 ms":<28}{old.get("p50Ms", "-"):>16}{latency.get("p50Ms", "-"):>16}')
+        print(f'{route + " p99 ms":<28}{old.get("p99Ms", "-"):>16}{latency.get("p99Ms", "-"):>16}')
+    print(f'{"committed votes":<28}{previous["committedVotes"]:>16}{results["committedVotes"]:>16}')
+    for key in ('maxThreads', 'maxRssKB'):
+        print(f'{key:<28}{str(previous["server"].get(key, "-")):>16}{str(results["server"].get(key, "-")):>16}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mode', required=True, help='Label of the server mode under test, e.g. threaded or async.')
+    parser.add_argument('--broker', default='localhost')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--server', default='http://localhost:5000')
+    parser.add_argument('--serverPid', type=int, default=None, help='PID of the server process, samples its threads and memory.')
+    parser.add_argument('--devices', type=int, default=300, help='Number of simulated ESPs.')
+    parser.add_argument('--connections', type=int, default=4, help='MQTT connections the ESPs are spread over.')
+    parser.add_argument('--qos', type=int, default=1)
+    parser.add_argument('--pollers', type=int, default=50, help='Concurrent HTTP polling clients.')
+    parser.add_argument('--voteRate', type=float, default=500, help='Votes/s sent while polling.')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds of load.')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--output', default=None, help='Result file, defaults to benchmarks/results/asyncServerBenchmark-<mode>-<commit>-<time>.json')
+    parser.add_argument('--compare', default=None, help='Result file of the other mode to compare against.')
+    args = parser.parse_args()
+
+    fleet = SimulatedFleet(args)
+    fleet.connect()
+    serverSamples = []
+    try:
+        fleet.register()
+        if not fleet.votingIDs:
+            raise SystemExit('No ESP registered, is the server running?')
+        fleet.macAddresses = [macAddress for macAddress in fleet.macAddresses if macAddress in fleet.votingIDs]
+        title = setup_topic(args, fleet)
+        topicID = next(topic['TopicID'] for topic in http_json(args.server, '/api/getTopics') if topic['Title'] == title)
+        baseline = committed_votes(args)
+
+        pollers = Pollers(args.server, [f'/api/getTally/{topicID}', f'/api/getVotes/{topicID}', '/api/getTopics'], args.pollers)
+        sampling = threading.Event()
+
+        def sample_server():
+            while not sampling.wait(1):
+                serverSamples.append(process_sample(args.serverPid))
+
+        sampler = threading.Thread(target=sample_server, daemon=True)
+        if args.serverPid is not None:
+            sampler.start()
+
+        pollers.start()
+        pollStart = time.perf_counter()
+        sentVotes, sendSec = send_votes(args, fleet, title)
+        pollers.stop()
+        pollSec = time.perf_counter() - pollStart
+        sampling.set()
+
+        # Wait for the vote writer to commit the votes sent during the run.
+        deadline = time.perf_counter() + args.timeout
+        committed = committed_votes(args) - baseline
+        while committed < sentVotes and time.perf_counter() < deadline:
+            time.sleep(0.1)
+            committed = committed_votes(args) - baseline
+    finally:
+        fleet.disconnect()
+
+    polls = sum(len(values) for values in pollers.latency.values())
+    results = {
+        'mode': args.mode,
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': vars(args),
+        'pollsPerSec': round(polls / pollSec, 1),
+        'pollErrors': pollers.errors,
+        'pollLatency': {path: percentiles(values) for path, values in pollers.latency.items()},
+        'sentVotes': sentVotes,
+        'sendRate': round(sentVotes / sendSec, 1),
+        'committedVotes': committed,
+        'server': {
+            'maxThreads': max((sample['threads'] for sample in serverSamples), default=None),
+            'maxRssKB': max((sample['rssKB'] for sample in serverSamples), default=None),
+        },
+    }
+
+    output = args.output or os.path.join(resultsFolder, f'asyncServerBenchmark-{args.mode}-{results["commit"] or "unknown"}-{datetime.now().strftime("%Y%m%d-%H%M%S")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as outputFile:
+        json.dump(results, outputFile, indent=2)
+    print(f'{args.mode}: {results["pollsPerSec"]} polls/s, {pollers.errors} errors, committed {committed}/{sentVotes} votes, results written to {output}')
+    for path, latency in results['pollLatency'].items():
+        print(f'  {path:<28} {latency}')
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# Before/after timings of the listing responses for 10k rows.
+# 'before' is the previous implementation: ORM objects, one dict per row with str() timestamps and jsonify().
+# 'after' is dbFunctions with jsonResponses (column tuples, precomputed column lists, orjson when installed),
+# buffered and streamed. Also reports the peak Python memory of building the response and checks that
+# the JSON is unchanged. Runs against a temporary SQLite database.
+# Run from the repository root: python benchmarks/jsonResponsesBenchmark.py
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+repositoryRoot = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, repositoryRoot)
+workingDirectory = tempfile.mkdtemp(prefix='jsonResponsesBenchmark-')
+os.chdir(workingDirectory)  # logHandler writes Logs/ to the working directory.
+
+from flask import Flask, jsonify
+from isdProjectImports import dbFunctions, jsonResponses
+
+rowCount = 10000
+repeats = 5
+
+
+def create_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(workingDirectory, "listing.db")}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    dbFunctions.db.init_app(app)
+    return app
+
+
+def seed(app):
+    db = dbFunctions.db
+    with app.app_context():
+        db.create_all()
+        topic = dbFunctions.Topics(Title='Topic', Description='Description')
+        db.session.add(topic)
+        db.session.flush()
+        db.session.execute(dbFunctions.RegisteredESPs.__table__.insert(), [
+            {'DeviceID': f'device-{index}', 'MacAddress': f'mac-{index}', 'Registered': True, 'Assigned': index % 2 == 0}
+            for index in range(rowCount)
+        ])
+        db.session.execute(dbFunctions.Votes.__table__.insert(), [
+            {'UserID': index, 'VoteType': 'yes', 'TopicID': topic.TopicID} for index in range(rowCount)
+        ])
+        db.session.commit()
+        return topic.TopicID
+
+
+def before_get_all_esps(app):
+    with app.app_context():
+        esp_data_list = []
+        for esp in dbFunctions.RegisteredESPs.query.all():
+            esp_data_list.append({
+                "DeviceIndex": esp.DeviceIndex,
+                "DeviceID": esp.DeviceID,
+                "RegistrationTime": str(esp.RegistrationTime),
+                "LastActiveTime": str(esp.LastActiveTime),
+                "Assigned": esp.Assigned,
+                "Registered": esp.Registered,
+                "MacAddress": esp.MacAddress,
+                "Room": esp.Room
+            })
+        return jsonify(esp_data_list).get_data()
+
+
+def before_get_votes_by_user_topic(app, topicID):
+    with app.app_context():
+        vote_data_list = []
+        for vote in dbFunctions.Votes.query.filter_by(TopicID=topicID).all():
+            vote_data_list.append({
+                "VoteID": vote.VoteID,
+                "UserID": vote.UserID,
+                "VoteType": vote.VoteType,
+                "TopicID": vote.TopicID,
+                "VoteTime": str(vote.VoteTime)
+            })
+        return jsonify(vote_data_list).get_data()
+
+
+def body(response):
+    response = response[0] if isinstance(response, tuple) else response
+    return b''.join(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8') for chunk in response.response)
+
+
+def measure(function):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        data = function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times) * 1000, peak / 1024 / 1024, data
+
+
+def main():
+    app = create_app()
+    topicID = seed(app)
+
+    votesStatement = dbFunctions.db.select(dbFunctions.Votes.VoteID, dbFunctions.Votes.UserID, dbFunctions.Votes.VoteType, dbFunctions.Votes.TopicID, dbFunctions.Votes.VoteTime).where(dbFunctions.Votes.TopicID == topicID)
+
+    def after_votes():
+        with app.app_context():
+            return jsonResponses.voteColumns.response(dbFunctions.db.session.execute(votesStatement).all())
+
+    cases = [
+        ('ESPs', [
+            ('before (ORM + jsonify)', lambda: before_get_all_esps(app)),
+            ('after', lambda: body(dbFunctions.get_all_esps(app))),
+            ('after, streamed', lambda: body(dbFunctions.get_all_esps(app, stream=True))),
+        ]),
+        ('votes', [
+            ('before (ORM + jsonify)', lambda: before_get_votes_by_user_topic(app, topicID)),
+            ('after', lambda: body(after_votes())),
+            ('after, streamed', lambda: body(jsonResponses.voteColumns.stream_response(app, dbFunctions.db, votesStatement))),
+        ]),
+    ]
+
+    print(f'{rowCount} rows, encoder: {"orjson" if jsonResponses.orjson is not None else "json"}')
+    for listing, functions in cases:
+        reference = None
+        for name, function in functions:
+            milliseconds, peakMb, data = measure(function)
+            parsed = json.loads(data)
+            reference = parsed if reference is None else reference
+            print(f'{listing:<6} {name:<24} {milliseconds:>8.1f} ms   peak {peakMb:>6.1f} MB   {"same JSON" if parsed == reference else "DIFFERENT JSON"}')
+
+
+if __name__ == '__main__':
+    main()
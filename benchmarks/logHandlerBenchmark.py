@@ -0,0 +1,55 @@
+# Throughput of logHandler.log() compared with the previous open/append/close per call.
+# Run from the repository root: python benchmarks/logHandlerBenchmark.py
+from datetime import datetime
+import os
+import sys
+import tempfile
+import time
+
+repositoryRoot = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, repositoryRoot)
+
+messages = 100000
+
+
+def old_log(logfile, message):
+    with open(logfile, 'a') as logFile:
+        logFile.write(f'{datetime.now().strftime("%d-%m-%Y  %H-%M-%S")}: {message}\n')
+    return
+
+
+def main():
+    # logHandler creates its Logs/ folder in the working directory, keep it out of the repository.
+    os.chdir(tempfile.mkdtemp(prefix='logHandlerBenchmark-'))
+    from isdProjectImports import logHandler
+
+    deviceID = '2b1f4c9e-6f0a-4d0e-9a57-0c6f3e5b8d21'
+    decodedMessage = {'VoteTitle': 'Budget 2024', 'vote': 'yes'}
+
+    start = time.perf_counter()
+    for index in range(messages):
+        old_log('old-log.txt', f'handle_message(), Received message: {decodedMessage} from DeviceID: {deviceID}')
+    oldTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for index in range(messages):
+        logHandler.log(f'handle_message(), Received message: {decodedMessage} from DeviceID: {deviceID}')
+    enqueueTime = time.perf_counter() - start
+    logHandler.flush(timeout=60)
+    totalTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for index in range(messages):
+        logHandler.debug('handle_vote(), Received message: %s from DeviceID: %s', decodedMessage, deviceID)
+    disabledDebugTime = time.perf_counter() - start
+
+    print(f'messages: {messages}')
+    print(f'open/append/close per call: {messages / oldTime:>12,.0f} msg/s')
+    print(f'queued log(), caller side:  {messages / enqueueTime:>12,.0f} msg/s')
+    print(f'queued log(), written:      {messages / totalTime:>12,.0f} msg/s')
+    print(f'disabled debug():           {messages / disabledDebugTime:>12,.0f} msg/s')
+    print(f'dropped messages: {logHandler.stats()["droppedMessages"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+# Load generator for the MQTT path of app.py.
+#
+# Simulates N ESPs that run the real protocol against a running server and MQTT broker:
+#   1. publish to /registration/Server/<mac> and wait for the VotingID on /registration/esp/<mac>
+#   2. (setup over the REST API) create a topic and assign a user to every simulated ESP
+#   3. vote on /vote/<VotingID> with {"VoteTitle": ..., "vote": ...} at a ramp of offered rates
+#
+# Reports registration latency percentiles, vote-commit latency percentiles per offered rate and the
+# highest rate the server sustains. A vote counts as committed once the vote writer has flushed (or
+# coalesced) as many votes as were sent before it, read from /api/getServerStats.
+# Results are written as JSON so runs of different commits can be compared with --compare.
+#
+# Run from the repository root while app.py and Mosquitto are running:
+#   python benchmarks/mqttLoadTest.py --devices 1000 --rates 100,250,500,1000,2000
+import argparse
+import json
+import os
+import subprocess
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+import paho.mqtt.client as mqtt
+
+resultsFolder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def percentiles(values):
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+    return {'count': len(ordered), 'p50Ms': at(0.50), 'p90Ms': at(0.90), 'p99Ms': at(0.99), 'maxMs': round(ordered[-1] * 1000, 3)}
+
+
+def http_json(server, path, payload=None):
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = urllib.request.Request(server + path, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def new_client(clientID):
+    if hasattr(mqtt, 'CallbackAPIVersion'):
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=clientID)
+    else:
+        client = mqtt.Client(client_id=clientID)
+    client.max_inflight_messages_set(1000)
+    return client
+
+
+class SimulatedFleet:
+    """N simulated ESPs multiplexed over a few MQTT connections."""
+
+    def __init__(self, args):
+        self.args = args
+        self.macAddresses = [f'5E:{(index >> 32) & 0xFF:02X}:{(index >> 24) & 0xFF:02X}:{(index >> 16) & 0xFF:02X}:{(index >> 8) & 0xFF:02X}:{index & 0xFF:02X}' for index in range(args.devices)]
+        self.votingIDs = {}
+        self.registrationSent = {}
+        self.registrationLatency = []
+        self.registered = threading.Event()
+        self._lock = threading.Lock()
+        self.clients = []
+
+    def connect(self):
+        for index in range(self.args.connections):
+            client = new_client(f'loadtest-{os.getpid()}-{index}')
+            client.on_message = self._on_message
+            client.connect(self.args.broker, self.args.port, keepalive=30)
+            client.subscribe('/registration/esp/+', qos=self.args.qos)
+            client.loop_start()
+            self.clients.append(client)
+        time.sleep(1)  # Let the subscriptions settle.
+
+    def disconnect(self):
+        for client in self.clients:
+            client.loop_stop()
+            client.disconnect()
+
+    def _on_message(self, client, userdata, message, *args):
+        macAddress = message.topic.split('/')[-1]
+        receivedAt = time.perf_counter()
+        with self._lock:
+            sentAt = self.registrationSent.get(macAddress)
+            if sentAt is None or macAddress in self.votingIDs:
+                return
+            self.votingIDs[macAddress] = json.loads(message.payload.decode('utf-8'))['VotingID']
+            self.registrationLatency.append(receivedAt - sentAt)
+            if len(self.votingIDs) == len(self.macAddresses):
+                self.registered.set()
+
+    def register(self):
+        start = time.perf_counter()
+        for index, macAddress in enumerate(self.macAddresses):
+            with self._lock:
+                self.registrationSent[macAddress] = time.perf_counter()
+            self.clients[index % len(self.clients)].publish(f'/registration/Server/{macAddress}', '{}', qos=self.args.qos)
+        self.registered.wait(self.args.timeout)
+        return time.perf_counter() - start
+
+    def publish_vote(self, index, title, choice):
+        votingID = self.votingIDs[self.macAddresses[index]]
+        self.clients[index % len(self.clients)].publish(f'/vote/{votingID}', json.dumps({'VoteTitle': title, 'vote': choice}), qos=self.args.qos)
+
+
+def setup_topic(args, fleet):
+    title = f'LoadTest-{datetime.now().strftime("%Y%m%d-%H%M%S")}'
+    now = datetime.now()
+    http_json(args.server, '/api/createTopic', {
+        'Title': title,
+        'Description': 'mqttLoadTest.py',
+        'StartTime': (now - timedelta(minutes=1)).strftime('%Y-%m-%d %H:%M:%S'),
+        'EndTime': (now + timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S'),
+    })
+
+    simulated = set(fleet.macAddresses)
+    unassigned = http_json(args.server, '/api/getUnassignedESPs')
+    for esp in unassigned:
+        if esp['MacAddress'] in simulated:
+            http_json(args.server, '/api/assignUserToESP', {'username': f'loadtest-{esp["DeviceIndex"]}', 'espID': esp['DeviceIndex']})
+    return title
+
+
+def committed_votes(args):
+    voteWriter = http_json(args.server, '/api/getServerStats')['voteWriter']
+    return voteWriter['flushedVotes'] + voteWriter['coalescedVotes']
+
+
+def run_rate_step(args, fleet, title, offeredRate, stepIndex):
+    """Send votes at 'offeredRate' for args.duration seconds and measure their commit latency."""
+
+    baseline = committed_votes(args)
+    sendTimes = []
+    commitSamples = []  # (time, committed votes since baseline)
+    sending = threading.Event()
+    sending.set()
+
+    def poll_commits():
+        while True:
+            commitSamples.append((time.perf_counter(), committed_votes(args) - baseline))
+            if not sending.is_set() and commitSamples[-1][1] >= len(sendTimes):
+                return
+            if not sending.is_set() and time.perf_counter() - sendTimes[-1] > args.timeout:
+                return
+            time.sleep(args.pollInterval)
+
+    poller = threading.Thread(target=poll_commits, daemon=True)
+    poller.start()
+
+    start = time.perf_counter()
+    totalVotes = int(offeredRate * args.duration)
+    choices = ('yes', 'no') if stepIndex % 2 == 0 else ('no', 'yes')
+    for voteIndex in range(totalVotes):
+        # Pace the votes, sleep until this vote is due.
+        due = start + voteIndex / offeredRate
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        deviceIndex = voteIndex % len(fleet.macAddresses)
+        fleet.publish_vote(deviceIndex, title, choices[(voteIndex // len(fleet.macAddresses)) % 2])
+        sendTimes.append(time.perf_counter())
+    sendDuration = time.perf_counter() - start
+    sending.clear()
+    poller.join()
+
+    # Commit latency of vote k: first sample where at least k + 1 votes were committed.
+    latencies = []
+    sampleIndex = 0
+    for voteIndex, sentAt in enumerate(sendTimes):
+        while sampleIndex < len(commitSamples) and commitSamples[sampleIndex][1] < voteIndex + 1:
+            sampleIndex += 1
+        if sampleIndex == len(commitSamples):
+            break
+        latencies.append(max(0.0, commitSamples[sampleIndex][0] - sentAt))
+
+    committed = commitSamples[-1][1] if commitSamples else 0
+    lastCommit = next((sampleTime for sampleTime, count in commitSamples if count >= committed), start)
+    return {
+        'offeredRate': offeredRate,
+        'sentVotes': len(sendTimes),
+        'sendRate': round(len(sendTimes) / sendDuration, 1),
+        'committedVotes': committed,
+        'commitRate': round(committed / max(lastCommit - start, 1e-9), 1),
+        'commitLatency': percentiles(latencies),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(previousPath, results):
+    with open(previousPath) as previousFile:
+        previous = json.load(previousFile)
+    print(f'\nCompared with {previousPath} (commit {previous.get("commit")}):')
+    print(f'  max sustainable votes/s: {previous["maxSustainableVotesPerSec"]} -> {results["maxSustainableVotesPerSec"]}')
+    print(f'  registration p99 ms:     {previous["registration"]["latency"].get("p99Ms")} -> {results["registration"]["latency"].get("p99Ms")}')
+    previousSteps = {step['offeredRate']: step for step in previous['steps']}
+    for step in results['steps']:
+        old = previousSteps.get(step['offeredRate'])
+        if old:
+            print(f'  {step["offeredRate"]:>7} votes/s commit p99 ms: {old["commitLatency"].get("p99Ms")} -> {step["commitLatency"].get("p99Ms")}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--broker', default='localhost')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--server', default='http://localhost:5000')
+    parser.add_argument('--devices', type=int, default=500, help='Number of simulated ESPs.')
+    parser.add_argument('--connections', type=int, default=8, help='MQTT connections the ESPs are spread over.')
+    parser.add_argument('--qos', type=int, default=1)
+    parser.add_argument('--rates', default='100,250,500,1000,2000', help='Offered vote rates (votes/s) of the ramp.')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per rate step.')
+    parser.add_argument('--maxP99Ms', type=float, default=1000, help='A rate is sustained if the commit p99 stays below this.')
+    parser.add_argument('--pollInterval', type=float, default=0.005)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--output', default=None, help='Result file, defaults to benchmarks/results/mqttLoadTest-<commit>-<time>.json')
+    parser.add_argument('--compare', default=None, help='Previous result file to compare against.')
+    args = parser.parse_args()
+
+    fleet = SimulatedFleet(args)
+    fleet.connect()
+    try:
+        registrationTime = fleet.register()
+        print(f'Registered {len(fleet.votingIDs)}/{args.devices} ESPs in {registrationTime:.2f}s')
+        if not fleet.votingIDs:
+            raise SystemExit('No ESP registered, is the server running?')
+        fleet.macAddresses = [macAddress for macAddress in fleet.macAddresses if macAddress in fleet.votingIDs]
+
+        title = setup_topic(args, fleet)
+        steps = []
+        maxSustainable = 0
+        for stepIndex, offeredRate in enumerate(float(rate) for rate in args.rates.split(',')):
+            step = run_rate_step(args, fleet, title, offeredRate, stepIndex)
+            steps.append(step)
+            sustained = step['committedVotes'] >= 0.99 * step['sentVotes'] and step['commitLatency'].get('p99Ms', float('inf')) <= args.maxP99Ms
+            print(f'{offeredRate:>8.0f} votes/s offered: sent {step["sendRate"]}/s, committed {step["committedVotes"]}/{step["sentVotes"]}, commit latency {step["commitLatency"]}{"" if sustained else "  (not sustained)"}')
+            if not sustained:
+                break
+            maxSustainable = offeredRate
+    finally:
+        fleet.disconnect()
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': vars(args),
+        'registration': {'registered': len(fleet.votingIDs), 'seconds': round(registrationTime, 3), 'latency': percentiles(fleet.registrationLatency)},
+        'steps': steps,
+        'maxSustainableVotesPerSec': maxSustainable,
+    }
+
+    output = args.output or os.path.join(resultsFolder, f'mqttLoadTest-{results["commit"] or "unknown"}-{datetime.now().strftime("%Y%m%d-%H%M%S")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as outputFile:
+        json.dump(results, outputFile, indent=2)
+    print(f'Max sustainable: {maxSustainable:.0f} votes/s, results written to {output}')
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# Microbenchmark of MQTT vote payload decoding.
+# Compares the previous path (bytes -> str -> json.loads -> validateKeywordsInJSON -> dict lookups)
+# with mqttMessages.VoteMessage.decode() on valid and invalid payloads, with orjson when installed
+# and with the standard json module.
+# Run from the repository root: python benchmarks/mqttMessagesBenchmark.py
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+repositoryRoot = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, repositoryRoot)
+os.chdir(tempfile.mkdtemp(prefix='mqttMessagesBenchmark-'))  # logHandler writes Logs/ to the working directory.
+
+from isdProjectImports import logHandler, mqttImports, mqttMessages
+
+iterations = 200000
+
+payloads = {
+    'valid': b'{"VoteTitle":"Budget 2024","vote":"yes"}',
+    'invalid json': b'{"VoteTitle":"Budget 2024","vote":',
+    'missing field': b'{"VoteTitle":"Budget 2024"}',
+    'wrong type': b'{"VoteTitle":2024,"vote":"yes"}',
+}
+
+
+def old_decode(payload):
+    # handle_message() before mqttMessages, without the log line of a failed decode.
+    try:
+        decodedMessage = json.loads(payload.decode('utf-8'))
+    except json.decoder.JSONDecodeError:
+        return None
+    if not isinstance(decodedMessage, dict) or not mqttImports.validateKeywordsInJSON(decodedMessage, ['VoteTitle', 'vote'], 2):
+        return None
+    return decodedMessage['VoteTitle'], decodedMessage['vote']
+
+
+def new_decode(payload):
+    try:
+        message = mqttMessages.VoteMessage.decode(payload)
+    except mqttMessages.MessageError:
+        return None
+    return message.VoteTitle, message.vote
+
+
+def measure(function, payload):
+    return min(timeit.repeat(lambda: function(payload), number=iterations, repeat=3)) / iterations * 1e9
+
+
+def main():
+    decoders = [('json + validateKeywordsInJSON', old_decode, None)]
+    if mqttMessages.orjson is not None:
+        decoders.append(('VoteMessage.decode (orjson)', new_decode, mqttMessages.orjson.loads))
+    decoders.append(('VoteMessage.decode (json)', new_decode, json.loads))
+
+    print(f'{"ns per message":<32}' + ''.join(f'{name:>15}' for name in payloads))
+    for name, function, loads in decoders:
+        if loads is not None:
+            mqttMessages._loads = loads
+        print(f'{name:<32}' + ''.join(f'{measure(function, payload):>15.0f}' for payload in payloads.values()))
+
+    logHandler.flush(1)
+
+
+if __name__ == '__main__':
+    main()
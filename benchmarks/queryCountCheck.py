@@ -0,0 +1,100 @@
+# Query-count regression check of the listing functions in dbFunctions.
+# Every listing must issue the same, constant number of SQL statements no matter how many
+# rows it returns (no N+1 queries). Runs against an in-memory SQLite database as a local
+# stand-in for MySQL and exits with status 1 on a regression.
+# Run from the repository root: python benchmarks/queryCountCheck.py
+import os
+import sys
+import tempfile
+
+repositoryRoot = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, repositoryRoot)
+os.chdir(tempfile.mkdtemp(prefix='queryCountCheck-'))  # logHandler writes Logs/ to the working directory.
+
+from flask import Flask
+from sqlalchemy import event
+from isdProjectImports import dbFunctions
+
+maxStatementsPerListing = 2
+rowCounts = (5, 500)
+
+
+def create_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    dbFunctions.db.init_app(app)
+    return app
+
+
+def seed(app, rows):
+    db = dbFunctions.db
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        topic = dbFunctions.Topics(Title='Topic', Description='Description')
+        db.session.add(topic)
+        db.session.flush()
+        for index in range(rows):
+            esp = dbFunctions.RegisteredESPs(DeviceID=f'device-{index}', MacAddress=f'mac-{index}', Registered=True)
+            db.session.add(esp)
+            db.session.flush()
+            user = dbFunctions.Users(Username=f'user-{index}', DeviceIndex=esp.DeviceIndex)
+            db.session.add(user)
+            db.session.flush()
+            esp.UserID = user.UserID
+            esp.Assigned = index % 2 == 0
+            db.session.add(dbFunctions.Votes(UserID=user.UserID, VoteType='yes', TopicID=topic.TopicID))
+        db.session.commit()
+        return topic.TopicID
+
+
+def count_statements(app, function, *args):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = dbFunctions.db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = function(app, *args)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    status = response[1] if isinstance(response, tuple) else response.status_code
+    if status != 200:
+        raise RuntimeError(f'{function.__name__} failed with status {status}: {response}')
+    return len(statements)
+
+
+def main():
+    app = create_app()
+    listings = {
+        'get_registered_esps': lambda topicID: (dbFunctions.get_registered_esps,),
+        'get_unassigned_esps': lambda topicID: (dbFunctions.get_unassigned_esps,),
+        'get_assigned_esps': lambda topicID: (dbFunctions.get_assigned_esps,),
+        'get_all_esps': lambda topicID: (dbFunctions.get_all_esps,),
+        'get_all_topics': lambda topicID: (dbFunctions.get_all_topics,),
+        'get_votes': lambda topicID: (dbFunctions.get_votes, topicID),
+        'get_votes_by_user': lambda topicID: (dbFunctions.get_votes_by_user, 1),
+    }
+
+    counts = {name: [] for name in listings}
+    for rows in rowCounts:
+        topicID = seed(app, rows)
+        for name, call in listings.items():
+            counts[name].append(count_statements(app, *call(topicID)))
+
+    failed = False
+    for name, statementCounts in counts.items():
+        ok = len(set(statementCounts)) == 1 and statementCounts[0] <= maxStatementsPerListing
+        failed = failed or not ok
+        print(f'{"ok  " if ok else "FAIL"} {name:<22} statements for {rowCounts} rows: {statementCounts}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
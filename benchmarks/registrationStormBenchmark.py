@@ -0,0 +1,80 @@
+# Time to register a hall of ESPs that power on at the same time.
+# 'before' registers every MAC address with dbFunctions.register_esp() like the old MQTT handler did,
+# 'after' submits them to the RegistrationCoalescer and waits until the last reply batch is handed out.
+# Both are run for new ESPs and again for the same ESPs registering a second time (a power cycle).
+# Runs against a temporary SQLite database.
+# Run from the repository root: python benchmarks/registrationStormBenchmark.py [--devices 1000]
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+repositoryRoot = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, repositoryRoot)
+workingDirectory = tempfile.mkdtemp(prefix='registrationStormBenchmark-')
+os.chdir(workingDirectory)  # logHandler writes Logs/ to the working directory.
+
+from flask import Flask
+from isdProjectImports import dbFunctions, registrationCoalescer
+
+
+def create_app(name):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(workingDirectory, name)}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    dbFunctions.db.init_app(app)
+    with app.app_context():
+        dbFunctions.db.create_all()
+    return app
+
+
+def before(app, macAddresses):
+    start = time.perf_counter()
+    for macAddress in macAddresses:
+        registeredESP, status = dbFunctions.register_esp(app, macAddress)
+        assert status, registeredESP
+    return time.perf_counter() - start
+
+
+def after(app, macAddresses):
+    coalescer = registrationCoalescer.RegistrationCoalescer(app)
+    replied = []
+    done = threading.Event()
+
+    @coalescer.on_registered
+    def reply(registeredESPs):
+        replied.extend(registeredESPs)
+        if len(replied) >= len(macAddresses):
+            done.set()
+
+    coalescer.start()
+    start = time.perf_counter()
+    for macAddress in macAddresses:
+        coalescer.submit(macAddress)
+    done.wait(120)
+    elapsed = time.perf_counter() - start
+    coalescer.stop()
+    assert len({esp.MacAddress for esp in replied}) == len(macAddresses)
+    return elapsed, coalescer.stats()['batches']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=int, default=1000)
+    arguments = parser.parse_args()
+
+    macAddresses = [f'AA:BB:CC:{index >> 16 & 0xFF:02X}:{index >> 8 & 0xFF:02X}:{index & 0xFF:02X}' for index in range(arguments.devices)]
+    beforeApp = create_app('before.db')
+    afterApp = create_app('after.db')
+
+    print(f'{arguments.devices} ESPs')
+    for run in ('new ESPs', 'power cycle'):
+        beforeSec = before(beforeApp, macAddresses)
+        afterSec, batches = after(afterApp, macAddresses)
+        print(f'{run:<12} before {beforeSec:>7.2f} s   after {afterSec:>6.2f} s in {batches} batches   {beforeSec / afterSec:>5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
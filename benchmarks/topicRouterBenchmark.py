@@ -0,0 +1,63 @@
+# Microbenchmark of topicRouter.TopicRouter.match() against the old startswith/split chain.
+# Run from the repository root: python benchmarks/topicRouterBenchmark.py
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from isdProjectImports import topicRouter
+
+iterations = 200000
+
+
+def handler(**params):
+    return params
+
+
+def build_router(extraRoutes):
+    router = topicRouter.TopicRouter()
+    router.add('/registration/Server/<macAddress>', handler, 'registration', 'macAddress')
+    router.add('/vote/<deviceID>', handler, 'vote', 'deviceID')
+    router.add('/setupVote/Resync', handler, 'resync')
+    for index in range(extraRoutes):
+        router.add(f'/telemetry{index}/<deviceID>/#', handler, f'telemetry{index}', 'deviceID')
+    return router
+
+
+def build_if_chain(extraRoutes):
+    prefixes = [f'/telemetry{index}/' for index in range(extraRoutes)]
+
+    def route(topic):
+        if topic.startswith('/registration/Server/'):
+            return 'registration', {'macAddress': topic.split('/')[3]}
+        for prefix in prefixes:
+            if topic.startswith(prefix):
+                return prefix, {'deviceID': topic.split('/')[2]}
+        if topic == '/setupVote/Resync':
+            return 'resync', {}
+        if topic.startswith('/vote/'):
+            return 'vote', {'deviceID': topic.split('/')[2]}
+        return None
+    return route
+
+
+def main():
+    topics = {
+        'vote': '/vote/2b1f4c9e-6f0a-4d0e-9a57-0c6f3e5b8d21',
+        'registration': '/registration/Server/AA:BB:CC:DD:EE:FF',
+        'resync': '/setupVote/Resync',
+        'miss': '/unknown/topic',
+    }
+
+    print(f'{"routes":>7} {"topic":>13} {"router ns/op":>13} {"if-chain ns/op":>15}')
+    for extraRoutes in (0, 10, 100, 1000):
+        router = build_router(extraRoutes)
+        ifChain = build_if_chain(extraRoutes)
+        for label, topic in topics.items():
+            routerTime = timeit.timeit(lambda: router.match(topic), number=iterations)
+            chainTime = timeit.timeit(lambda: ifChain(topic), number=iterations)
+            print(f'{extraRoutes + 3:>7} {label:>13} {routerTime / iterations * 1e9:>13.0f} {chainTime / iterations * 1e9:>15.0f}')
+
+
+if __name__ == '__main__':
+    main()
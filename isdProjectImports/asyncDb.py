@@ -0,0 +1,98 @@
+import time
+from isdProjectImports import logHandler
+from isdProjectImports import metrics
+
+# The async engine needs SQLAlchemy's asyncio extension (greenlet) and an async driver, aiomysql or aiosqlite.
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine
+except ImportError:
+    create_async_engine = None
+
+# Driver of the synchronous database URI -> async driver.
+asyncDrivers = {
+    'mysql+pymysql': 'mysql+aiomysql',
+    'mysql': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_uri(uri):
+    """
+    Return the URI of the database at 'uri' (see dbBackend.database_uri()) with its async driver.
+
+    Raises:
+        - ValueError: If there is no async driver for the URI's driver.
+    """
+
+    driver, separator, rest = uri.partition('://')
+    if not separator or driver not in asyncDrivers:
+        raise ValueError(f'No async driver for database URI {driver}.')
+    return f'{asyncDrivers[driver]}://{rest}'
+
+
+def available():
+    return create_async_engine is not None
+
+
+class AsyncDatabase:
+    """
+    Read queries run on the asyncio event loop of asyncServer.py.
+
+    The statements are built by dbFunctions (e.g. dbFunctions.votes_statement()), only the
+    execution is async, so an awaiting request does not hold a thread while MySQL answers.
+    Writes stay on the synchronous engine of the vote writer and the MQTT workers.
+    """
+
+    def __init__(self, uri, poolSize=5, maxOverflow=10, recycleSec=1800, prePing=True, timeoutSec=10):
+        self.uri = async_database_uri(uri)
+        self.poolOptions = {}
+        if not self.uri.startswith('sqlite'):
+            self.poolOptions = {'pool_size': poolSize, 'max_overflow': maxOverflow, 'pool_recycle': recycleSec, 'pool_pre_ping': prePing, 'pool_timeout': timeoutSec}
+        self.engine = None
+
+        # Metrics.
+        self.queries = 0
+        self.failedQueries = 0
+
+    async def start(self):
+        """
+        Create the engine.
+
+        Raises:
+            - ImportError: If SQLAlchemy's asyncio extension or the async driver is not installed.
+        """
+
+        if create_async_engine is None:
+            raise ImportError('sqlalchemy.ext.asyncio is not available, install greenlet.')
+        self.engine = create_async_engine(self.uri, **self.poolOptions)
+        logHandler.log(f'AsyncDatabase started, using {self.engine.url.render_as_string(hide_password=True)}')
+
+    async def stop(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+
+    async def fetch_all(self, statement):
+        """Run a select statement and return its rows."""
+
+        start = time.perf_counter()
+        try:
+            async with self.engine.connect() as connection:
+                result = await connection.execute(statement)
+                rows = result.all()
+            self.queries += 1
+            return rows
+        except Exception:
+            self.failedQueries += 1
+            raise
+        finally:
+            metrics.dbCallSeconds.labels('async_fetch_all').observe(time.perf_counter() - start)
+
+    def stats(self):
+        pool = self.engine.pool.status() if self.engine is not None else None
+        return {
+            'driver': self.uri.split('://')[0],
+            'pool': pool,
+            'queries': self.queries,
+            'failedQueries': self.failedQueries,
+        }
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+from paho.mqtt.client import MQTT_ERR_SUCCESS
+from isdProjectImports import logHandler
+
+
+class AsyncMqttLoop:
+    """
+    Runs the network loop of a paho client on an asyncio event loop instead of paho's own thread.
+
+    The client socket is watched with loop.add_reader() / add_writer() (paho's external event
+    loop callbacks), keepalive and reconnects are handled by run(). Callbacks of the client
+    (on_connect, on_message, on_publish) are therefore called on the event loop and must not
+    block; app.handle_message() only decodes the message and hands it to the MQTT workers with
+    MessageDispatcher.submit(), which drops the message instead of waiting when the queue of the
+    worker is full.
+    publish() and subscribe() may still be called from other threads, e.g. the publish queue.
+    """
+
+    def __init__(self, client, reconnectMinSec=1, reconnectMaxSec=30, miscIntervalSec=1):
+        self.client = client
+        self.reconnectMinSec = reconnectMinSec
+        self.reconnectMaxSec = reconnectMaxSec
+        self.miscIntervalSec = miscIntervalSec
+        self.loop = None
+        self._loopThread = None
+        self._task = None
+
+        # Metrics.
+        self.connects = 0
+        self.failedConnects = 0
+        self.disconnects = 0
+
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    def start(self, host, port, keepalive):
+        """Connect and keep the client connected, called on the event loop."""
+
+        self.loop = asyncio.get_running_loop()
+        self._loopThread = threading.current_thread()
+        self._task = self.loop.create_task(self.run(host, port, keepalive))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.client.disconnect()
+
+    async def run(self, host, port, keepalive):
+        delay = self.reconnectMinSec
+        connected = False
+        while True:
+            try:
+                # connect() resolves the host and opens the socket, it runs in the default executor.
+                if connected:
+                    result = await self.loop.run_in_executor(None, self.client.reconnect)
+                else:
+                    result = await self.loop.run_in_executor(None, self.client.connect, host, port, keepalive)
+                connected = result == MQTT_ERR_SUCCESS
+            except (OSError, ValueError) as errorMsg:
+                logHandler.log(f'AsyncMqttLoop.run(), connecting to {host}:{port} failed: {errorMsg}')
+                result = None
+
+            if result == MQTT_ERR_SUCCESS:
+                self.connects += 1
+                delay = self.reconnectMinSec
+                # loop_misc() sends the keepalive pings and returns an error once the connection is lost.
+                while self.client.loop_misc() == MQTT_ERR_SUCCESS:
+                    await asyncio.sleep(self.miscIntervalSec)
+                self.disconnects += 1
+                logHandler.log(f'AsyncMqttLoop.run(), connection to {host}:{port} lost, reconnecting.')
+            else:
+                self.failedConnects += 1
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.reconnectMaxSec)
+
+    def _call_in_loop(self, callback, *args):
+        # Socket callbacks also come from the executor (connect) and the publish queue thread.
+        if threading.current_thread() is self._loopThread:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._call_in_loop(self.loop.add_reader, sock, client.loop_read)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._call_in_loop(self.loop.remove_reader, sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._call_in_loop(self.loop.add_writer, sock, self._write, sock)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._call_in_loop(self.loop.remove_writer, sock)
+
+    def _write(self, sock):
+        self.client.loop_write()
+        # A register from another thread can arrive after paho unregistered, do not keep polling an idle socket.
+        # A socket closed by loop_write() was already unregistered.
+        if self.client.socket() is sock and not self.client.want_write():
+            self.loop.remove_writer(sock)
+
+    def stats(self):
+        return {
+            'connects': self.connects,
+            'failedConnects': self.failedConnects,
+            'disconnects': self.disconnects,
+        }
@@ -0,0 +1,90 @@
+import sqlite3
+from sqlalchemy import event
+from isdProjectImports import logHandler
+
+# Supported values of 'dbBackend' in credentials.py.
+MYSQL = 'mysql'
+SQLITE = 'sqlite'
+
+# SQLite tuning, applied to every new connection.
+sqlitePragmas = (
+    ('journal_mode', 'WAL'),        # Readers do not block the writer and vice versa.
+    ('synchronous', 'NORMAL'),      # With WAL only a power loss can lose the last commits, the database stays consistent.
+    ('mmap_size', 268435456),       # Read the database through a 256 MB memory map instead of read() calls.
+    ('cache_size', -16000),         # 16 MB page cache per connection.
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),         # Wait up to 5 s for the write lock instead of failing with 'database is locked'.
+)
+sqliteStatementCacheSize = 256  # Prepared statements kept per connection by the sqlite3 module.
+
+
+def database_uri(credentials):
+    """
+    Build the SQLAlchemy database URI of the backend selected in credentials.py.
+
+    Args:
+        - credentials (module): The credentials module, 'dbBackend' defaults to 'mysql'.
+          The SQLite backend stores the database at 'sqlitePath', defaults to 'voting.db'.
+
+    Returns:
+        - str: The database URI.
+
+    Raises:
+        - ValueError: If 'dbBackend' is not a supported backend.
+    """
+
+    backend = getattr(credentials, 'dbBackend', MYSQL)
+    if backend == MYSQL:
+        return f'mysql+pymysql://{credentials.dbUsername}:{credentials.dbPassword}@{credentials.dbHostname}:{credentials.dbPort}/{credentials.dbName}'
+    if backend == SQLITE:
+        return f'sqlite:///{getattr(credentials, "sqlitePath", "voting.db")}'
+    raise ValueError(f'Unsupported database backend {backend}, expected {MYSQL} or {SQLITE}.')
+
+
+def engine_options(uri):
+    """Return the SQLALCHEMY_ENGINE_OPTIONS for 'uri'."""
+
+    if uri.startswith('sqlite'):
+        # Connections are shared by the MQTT workers and the vote writer thread.
+        return {'connect_args': {'check_same_thread': False, 'cached_statements': sqliteStatementCacheSize}}
+    return {}
+
+
+def _set_sqlite_pragmas(dbapiConnection, connectionRecord):
+    if not isinstance(dbapiConnection, sqlite3.Connection):
+        return
+    cursor = dbapiConnection.cursor()
+    for pragma, value in sqlitePragmas:
+        cursor.execute(f'PRAGMA {pragma}={value}')
+    cursor.close()
+
+
+def init_app(app, db, uri):
+    """
+    Configure 'app' for the database at 'uri' and initialize 'db' with it.
+
+    Args:
+        - app (Flask): The Flask application object.
+        - db (SQLAlchemy): The Flask-SQLAlchemy object, dbFunctions.db.
+        - uri (str): The database URI, see database_uri().
+
+    Note:
+        - Engine options already set in app.config take precedence over the backend defaults.
+        - Pool options are dropped for an in-memory SQLite database, every pooled connection would
+          open a separate empty database.
+    """
+
+    options = {**engine_options(uri), **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    if uri in ('sqlite://', 'sqlite:///:memory:'):
+        for option in ('poolclass', 'pool_size', 'max_overflow', 'pool_recycle', 'pool_pre_ping', 'pool_timeout'):
+            options.pop(option, None)
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    db.init_app(app)
+
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == SQLITE:
+            event.listen(engine, 'connect', _set_sqlite_pragmas)
+        logHandler.log(f'dbBackend, using {engine.dialect.name} database {engine.url.render_as_string(hide_password=True)}')
@@ -4,13 +4,28 @@ from flask import jsonify
 from isdProjectImports import logHandler
 from isdProjectImports import voteHandling
 from isdProjectImports import mqttImports
-from collections import defaultdict
+from isdProjectImports import espRegistry
+from isdProjectImports import voteTally
+from isdProjectImports import metrics
+from isdProjectImports import jsonResponses
+from isdProjectImports import responseCache
+from isdProjectImports import pagination
+import threading
 import uuid
 
 db = SQLAlchemy()
 
+# Serializes seeding of the vote tally so concurrent votes on an untracked topic load it only once.
+_tallyLoadLock = threading.Lock()
+
 class RegisteredESPs(db.Model):
     __tablename__ = 'registeredesps'
+    __table_args__ = (
+        db.Index('ix_registeredesps_assigned_registered', 'Assigned', 'Registered'),
+        db.Index('ix_registeredesps_registered', 'Registered'),
+        db.Index('ix_registeredesps_userid', 'UserID'),
+        db.Index('ix_registeredesps_room', 'Room'),
+    )
     DeviceIndex = db.Column(db.Integer, primary_key=True, unique=True, autoincrement=True)
     DeviceID = db.Column(db.String(255), unique=True, nullable=False)
     RegistrationTime = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp())
@@ -19,6 +34,7 @@ class RegisteredESPs(db.Model):
     Assigned = db.Column(db.Boolean, default=False)
     Registered = db.Column(db.Boolean, default=False)
     MacAddress = db.Column(db.String(255), unique=True)
+    Room = db.Column(db.String(64))  # Vote session the ESP belongs to, None for the default room.
 
 class Users(db.Model):
     __tablename__ = 'users'
@@ -29,14 +45,24 @@ class Users(db.Model):
 
 class Topics(db.Model):
     __tablename__ = 'topics'
+    __table_args__ = (
+        db.Index('ix_topics_start_end', 'StartTime', 'EndTime'),
+        db.Index('ix_topics_room', 'Room'),
+    )
     TopicID = db.Column(db.Integer, primary_key=True, autoincrement=True)
     Title = db.Column(db.Text, nullable=False)
     Description = db.Column(db.Text)
     StartTime = db.Column(db.TIMESTAMP)
     EndTime = db.Column(db.TIMESTAMP)
+    Room = db.Column(db.String(64))  # None for the default room.
 
 class Votes(db.Model):
     __tablename__ = 'votes'
+    __table_args__ = (
+        db.Index('uq_votes_user_topic', 'UserID', 'TopicID', unique=True),
+        db.Index('ix_votes_topic_voteid', 'TopicID', 'VoteID'),
+        db.Index('ix_votes_user_voteid', 'UserID', 'VoteID'),
+    )
     VoteID = db.Column(db.Integer, primary_key=True, autoincrement=True)
     UserID = db.Column(db.Integer, db.ForeignKey('registeredesps.UserID'))
     VoteType = db.Column(db.Text, nullable=False)
@@ -44,13 +70,45 @@ class Votes(db.Model):
     VoteTime = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp())
 
 
+def _listing_response(app, statement, serializer, stream, page):
+    """Run a listing query and serialize it as a page, a streamed list or a list."""
+
+    if page is not None and page.limit is not None:
+        with app.app_context():
+            rows, nextCursor = pagination.page_rows(db.session.execute(statement).all(), page)
+            return serializer.page_response(rows, nextCursor), 200
+
+    if stream:
+        return serializer.stream_response(app, db, statement)
+
+    with app.app_context():
+        rows = db.session.execute(statement).all()
+        return serializer.response(rows), 200
 
-def get_registered_esps(app):
+
+# Columns of the ESP listings, in the order of jsonResponses.espColumns.
+_espListColumns = (
+    RegisteredESPs.DeviceIndex,
+    RegisteredESPs.DeviceID,
+    RegisteredESPs.RegistrationTime,
+    RegisteredESPs.LastActiveTime,
+    RegisteredESPs.Assigned,
+    RegisteredESPs.Registered,
+    RegisteredESPs.MacAddress,
+    RegisteredESPs.Room,
+)
+
+
+@metrics.timed(metrics.dbCallSeconds)
+def get_registered_esps(app, stream=False, page=None):
     """
     Retrieve information about registered ESP devices from the database.
 
     Args:
         - app (Flask): The Flask application object.
+        - stream (bool): Stream the JSON array in chunks instead of building it in memory, for large result sets.
+        - page (PageRequest): Keyset page and filters, see pagination.parse_page_request(). With a limit the
+          response is {"items": [...], "nextCursor": key or null} instead of a list.
 
     Returns:
         - JSON: A JSON response containing information about registered ESP devices.
@@ -69,41 +127,31 @@ def get_registered_esps(app):
 
     logHandler.log(f'Running dbFunctions.get_registered_esps()')
     try:
-        with app.app_context():
-            registered_esps = (
-                db.session.query(RegisteredESPs)
-                .filter(RegisteredESPs.Registered == True)
-                .all()
-            )
-
-            esp_data = defaultdict(lambda: {})
-
-            for esp in registered_esps:
-                esp_data[esp.DeviceIndex].update({
-                    "DeviceIndex": esp.DeviceIndex,
-                    "DeviceID": esp.DeviceID,
-                    "RegistrationTime": str(esp.RegistrationTime),
-                    "LastActiveTime": str(esp.LastActiveTime),
-                    "Assigned": esp.Assigned,
-                    "Registered": esp.Registered,
-                    "MacAddress": esp.MacAddress,
-                })
-
-            esp_data_list = list(esp_data.values())
-
-            return jsonify(esp_data_list), 200
-
+        # Column query serialized straight from the row tuples, see jsonResponses.
+        statement = (
+            db.select(*_espListColumns)
+            .where(RegisteredESPs.Registered == True)
+        )
+        statement = pagination.apply(statement, page, RegisteredESPs.DeviceIndex, RegisteredESPs.RegistrationTime, RegisteredESPs.Assigned, RegisteredESPs.Registered)
+        return _listing_response(app, statement, jsonResponses.espColumns, stream, page)
+
+    except ValueError as errorMsg:
+        return jsonify({'message': str(errorMsg)}), 400
     except Exception as errorMsg:
         error_message = {"error": str(errorMsg)}
         return jsonify(error_message), 500
 
 
-def get_unassigned_esps(app):
+@metrics.timed(metrics.dbCallSeconds)
+def get_unassigned_esps(app, stream=False, page=None):
     """
     Retrieve information about unassigned ESP devices from the database.
 
     Args:
         - app (Flask): The Flask application object.
+        - stream (bool): Stream the JSON array in chunks instead of building it in memory, for large result sets.
+        - page (PageRequest): Keyset page and filters, see pagination.parse_page_request(). With a limit the
+          response is {"items": [...], "nextCursor": key or null} instead of a list.
 
     Returns:
         - JSON: A JSON response containing information about unassigned ESP devices.
@@ -116,38 +164,30 @@ def get_unassigned_esps(app):
 
     logHandler.log(f'Running dbFunctions.get_unassigned_esps()')
     try:
-        with app.app_context():
-            unassigned_esps = (
-                db.session.query(RegisteredESPs)
-                .filter(RegisteredESPs.Registered == True, RegisteredESPs.Assigned == False)
-                .all()
-            )
-
-            esp_data = []
-            for esp in unassigned_esps:
-                esp_data.append({
-                    "DeviceIndex": esp.DeviceIndex,
-                    "DeviceID": esp.DeviceID,
-                    "RegistrationTime": str(esp.RegistrationTime),
-                    "LastActiveTime": str(esp.LastActiveTime),
-                    "Assigned": esp.Assigned,
-                    "Registered": esp.Registered,
-                    "MacAddress": esp.MacAddress,
-                })
-
-            return jsonify(esp_data), 200
-
+        statement = (
+            db.select(*_espListColumns)
+            .where(RegisteredESPs.Registered == True, RegisteredESPs.Assigned == False)
+        )
+        statement = pagination.apply(statement, page, RegisteredESPs.DeviceIndex, RegisteredESPs.RegistrationTime, RegisteredESPs.Assigned, RegisteredESPs.Registered)
+        return _listing_response(app, statement, jsonResponses.espColumns, stream, page)
+
+    except ValueError as errorMsg:
+        return jsonify({'message': str(errorMsg)}), 400
     except Exception as errorMsg:
         error_message = {"error": str(errorMsg)}
         return jsonify(error_message), 500
 
 
-def get_assigned_esps(app):
+@metrics.timed(metrics.dbCallSeconds)
+def get_assigned_esps(app, stream=False, page=None):
     """
     Retrieve information about assigned ESP devices from the database.
 
     Args:
         - app (Flask): The Flask application object.
+        - stream (bool): Stream the JSON array in chunks instead of building it in memory, for large result sets.
+        - page (PageRequest): Keyset page and filters, see pagination.parse_page_request(). With a limit the
+          response is {"items": [...], "nextCursor": key or null} instead of a list.
 
     Returns:
         - JSON: A JSON response containing information about assigned ESP devices.
@@ -167,34 +207,31 @@ def get_assigned_esps(app):
 
     logHandler.log(f'Running dbFunctions.get_assigned_esps()')
     try:
-        with app.app_context():
-            assigned_esps = RegisteredESPs.query.filter_by(Assigned=True).all()
-            assigned_esps_info = []
-            for esp in assigned_esps:
-                user = Users.query.filter_by(UserID=esp.UserID).first()
-                esp_info = {
-                    'DeviceIndex': esp.DeviceIndex,
-                    'DeviceID': esp.DeviceID,
-                    'RegistrationTime': esp.RegistrationTime,
-                    'LastActiveTime': esp.LastActiveTime,
-                    'Assigned': esp.Assigned,
-                    'Registered': esp.Registered,
-                    'MacAddress': esp.MacAddress,
-                    'Username': user.Username if user else None,
-                    'UserID': user.UserID
-                }
-                assigned_esps_info.append(esp_info)
-            return jsonify(assigned_esps_info), 200
+        statement = (
+            db.select(*_espListColumns, Users.Username, Users.UserID)
+            .outerjoin(Users, Users.UserID == RegisteredESPs.UserID)
+            .where(RegisteredESPs.Assigned == True)
+        )
+        statement = pagination.apply(statement, page, RegisteredESPs.DeviceIndex, RegisteredESPs.RegistrationTime, RegisteredESPs.Assigned, RegisteredESPs.Registered)
+        return _listing_response(app, statement, jsonResponses.assignedEspColumns, stream, page)
+
+    except ValueError as errorMsg:
+        return jsonify({'message': str(errorMsg)}), 400
     except Exception as errorMsg:
-        return jsonify({'error': str(errorMsg)}), 500
+        error_message = {"error": str(errorMsg)}
+        return jsonify(error_message), 500
 
 
-def get_all_esps(app):
+@metrics.timed(metrics.dbCallSeconds)
+def get_all_esps(app, stream=False, page=None):
     """
     Retrieve information about all ESP devices from the database.
 
     Args:
         - app (Flask): The Flask application object.
+        - stream (bool): Stream the JSON array in chunks instead of building it in memory, for large result sets.
+        - page (PageRequest): Keyset page and filters, see pagination.parse_page_request(). With a limit the
+          response is {"items": [...], "nextCursor": key or null} instead of a list.
 
     Returns:
         - JSON: A JSON response containing information about all ESP devices.
@@ -213,35 +250,27 @@ def get_all_esps(app):
 
     logHandler.log(f'Running dbFunctions.get_all_esps()')
     try:
-        with app.app_context():
-            registered_esps = RegisteredESPs.query.all()
-            esp_data_list = []
-
-            for esp in registered_esps:
-                esp_data = {
-                    "DeviceIndex": esp.DeviceIndex,
-                    "DeviceID": esp.DeviceID,
-                    "RegistrationTime": str(esp.RegistrationTime),
-                    "LastActiveTime": str(esp.LastActiveTime),
-                    "Assigned": esp.Assigned,
-                    "Registered": esp.Registered,
-                    "MacAddress": esp.MacAddress
-                }
-                esp_data_list.append(esp_data)
-
-            return jsonify(esp_data_list)
+        statement = db.select(*_espListColumns)
+        statement = pagination.apply(statement, page, RegisteredESPs.DeviceIndex, RegisteredESPs.RegistrationTime, RegisteredESPs.Assigned, RegisteredESPs.Registered)
+        return _listing_response(app, statement, jsonResponses.espColumns, stream, page)
 
+    except ValueError as errorMsg:
+        return jsonify({'message': str(errorMsg)}), 400
     except Exception as errorMsg:
         error_message = {"error": str(errorMsg)}
         return jsonify(error_message), 500
 
 
-def get_all_topics(app):
+@metrics.timed(metrics.dbCallSeconds)
+def get_all_topics(app, stream=False, page=None):
     """
     Retrieve information about all topics from the database.
 
     Args:
         - app (Flask): The Flask application object.
+        - stream (bool): Stream the JSON array in chunks instead of building it in memory, for large result sets.
+        - page (PageRequest): Keyset page and filters, see pagination.parse_page_request(). With a limit the
+          response is {"items": [...], "nextCursor": key or null} instead of a list.
 
     Returns:
         - JSON: A JSON response containing information about all topics.
@@ -251,6 +280,7 @@ def get_all_topics(app):
                 - Description: The description of the topic.
                 - StartTime: The start time of the topic.
                 - EndTime: The end time of the topic.
+                - Room: The room of the topic, null for the default room.
 
     Raises:
         - JSON: A JSON response with an error message and a status code 500 in case of an exception.
@@ -258,27 +288,18 @@ def get_all_topics(app):
 
     logHandler.log(f'Running dbFunctions.get_all_topics()')
     try:
-        with app.app_context():
-            topics = Topics.query.all()
-            topic_data_list = []
-
-            for topic in topics:
-                topic_data = {
-                    "TopicID": topic.TopicID,
-                    "Title": topic.Title,
-                    "Description": topic.Description,
-                    "StartTime": str(topic.StartTime),
-                    "EndTime": str(topic.EndTime)
-                }
-                topic_data_list.append(topic_data)
-
-            return jsonify(topic_data_list)
+        statement = db.select(Topics.TopicID, Topics.Title, Topics.Description, Topics.StartTime, Topics.EndTime, Topics.Room)
+        statement = pagination.apply(statement, page, Topics.TopicID, Topics.StartTime)
+        return _listing_response(app, statement, jsonResponses.topicColumns, stream, page)
 
+    except ValueError as errorMsg:
+        return jsonify({'message': str(errorMsg)}), 400
     except Exception as errorMsg:
         error_message = {"error": str(errorMsg)}
         return jsonify(error_message), 500
 
 
+@metrics.timed(metrics.dbCallSeconds)
 def get_topic(app, topicID):
     """
     Retrieve information about a specific topic from the database.
@@ -295,6 +316,7 @@ def get_topic(app, topicID):
                 - Description: The description of the topic.
                 - StartTime: The start time of the topic.
                 - EndTime: The end time of the topic.
+                - Room: The room of the topic, null for the default room.
 
     Raises:
         - JSON: A JSON response with an error message and a status code 500 in case of an exception.
@@ -310,7 +332,8 @@ def get_topic(app, topicID):
                 "Title": topic.Title,
                 "Description": topic.Description,
                 "StartTime": str(topic.StartTime),
-                "EndTime": str(topic.EndTime)
+                "EndTime": str(topic.EndTime),
+                "Room": topic.Room
             }
 
             return jsonify(topic_data)
@@ -320,13 +343,27 @@ def get_topic(app, topicID):
         return jsonify(error_message), 500
 
 
-def get_votes(app, topicID):
+def votes_statement(topicID):
+    """Query of get_votes(), serialized with jsonResponses.voteWithUsernameColumns. Also run by the async server, see asyncDb."""
+
+    return (
+        db.select(Votes.VoteID, Votes.UserID, Votes.VoteType, Votes.TopicID, Votes.VoteTime, Users.Username)
+        .outerjoin(Users, Users.UserID == Votes.UserID)
+        .where(Votes.TopicID == topicID)
+    )
+
+
+@metrics.timed(metrics.dbCallSeconds)
+def get_votes(app, topicID, stream=False, page=None):
     """
     Retrieve votes related to a specific topic from the database.
 
     Args:
         - app (Flask): The Flask application object.
         - topicID (int): The unique ID of the topic to retrieve votes for.
+        - stream (bool): Stream the JSON array in chunks instead of building it in memory, for large result sets.
+        - page (PageRequest): Keyset page and filters, see pagination.parse_page_request(). With a limit the
+          response is {"items": [...], "nextCursor": key or null} instead of a list.
 
     Returns:
         - JSON: A JSON response containing information about the votes related to the specified topic.
@@ -343,36 +380,27 @@ def get_votes(app, topicID):
 
     logHandler.log(f'Running dbFunctions.get_votes()')
     try:
-        with app.app_context():
-            votes = Votes.query.filter_by(TopicID=topicID).all()
-            vote_data_list = []
-
-            for vote in votes:
-                username = Users.query.filter_by(UserID=vote.UserID).first().Username
-                vote_data = {
-                    "VoteID": vote.VoteID,
-                    "UserID": vote.UserID,
-                    "VoteType": vote.VoteType,
-                    "TopicID": vote.TopicID,
-                    "VoteTime": str(vote.VoteTime),
-                    "Username": username
-                }
-                vote_data_list.append(vote_data)
-
-            return jsonify(vote_data_list), 200
+        statement = pagination.apply(votes_statement(topicID), page, Votes.VoteID, Votes.VoteTime)
+        return _listing_response(app, statement, jsonResponses.voteWithUsernameColumns, stream, page)
 
+    except ValueError as errorMsg:
+        return jsonify({'message': str(errorMsg)}), 400
     except Exception as errorMsg:
         error_message = {"error": str(errorMsg)}
         return jsonify(error_message), 500
     
 
-def get_votes_by_user(app, userID):
+@metrics.timed(metrics.dbCallSeconds)
+def get_votes_by_user(app, userID, stream=False, page=None):
     """
     Retrieve votes related to a specific topic from the database.
 
     Args:
         - app (Flask): The Flask application object.
         - topicID (int): The unique ID of the topic to retrieve votes for.
+        - stream (bool): Stream the JSON array in chunks instead of building it in memory, for large result sets.
+        - page (PageRequest): Keyset page and filters, see pagination.parse_page_request(). With a limit the
+          response is {"items": [...], "nextCursor": key or null} instead of a list.
 
     Returns:
         - JSON: A JSON response containing information about the votes related to the specified topic.
@@ -389,28 +417,22 @@ def get_votes_by_user(app, userID):
 
     logHandler.log(f'Running dbFunctions.get_votes_by_user()')
     try:
-        with app.app_context():
-            votes = Votes.query.filter_by(UserID=userID).all()
-            vote_data_list = []
-
-            for vote in votes:
-                vote_data = {
-                    "VoteID": vote.VoteID,
-                    "UserID": vote.UserID,
-                    "VoteType": vote.VoteType,
-                    "TopicID": vote.TopicID,
-                    "VoteTime": str(vote.VoteTime)
-                }
-                vote_data_list.append(vote_data)
-
-            return jsonify(vote_data_list)
-
+        statement = (
+            db.select(Votes.VoteID, Votes.UserID, Votes.VoteType, Votes.TopicID, Votes.VoteTime)
+            .where(Votes.UserID == userID)
+        )
+        statement = pagination.apply(statement, page, Votes.VoteID, Votes.VoteTime)
+        return _listing_response(app, statement, jsonResponses.voteColumns, stream, page)
+
+    except ValueError as errorMsg:
+        return jsonify({'message': str(errorMsg)}), 400
     except Exception as errorMsg:
         error_message = {"error": str(errorMsg)}
         return jsonify(error_message), 500
 
 
 # DEBUG ONLY
+@metrics.timed(metrics.dbCallSeconds)
 def clear_database(app):
     try:
         with app.app_context():
@@ -419,6 +441,9 @@ def clear_database(app):
             db.session.query(Users).delete()
             db.session.query(RegisteredESPs).delete()
             db.session.commit()
+            espRegistry.registry.clear()
+            voteTally.tally.clear()
+            responseCache.cache.clear()
             return jsonify("Database cleared.")
 
     except Exception as errorMsg:
@@ -427,6 +452,7 @@ def clear_database(app):
 
 
 # DEBUG ONLY
+@metrics.timed(metrics.dbCallSeconds)
 def init_db(app):
     try:
         with app.app_context():
@@ -440,6 +466,7 @@ def init_db(app):
 
 
 # DEBUG ONLY
+@metrics.timed(metrics.dbCallSeconds)
 def insert_data(app):
     try:
         with app.app_context():
@@ -478,6 +505,7 @@ def insert_data(app):
                 db.session.add(vote)
 
             db.session.commit()
+            responseCache.cache.clear()
             return jsonify("Data inserted successfully.")
 
     except Exception as errorMsg:
@@ -485,25 +513,23 @@ def insert_data(app):
         return jsonify(error_message), 500
 
 
+@metrics.timed(metrics.dbCallSeconds)
 def register_esp(app, mac_address):
     """
-    Retrieve votes cast by a specific user from the database.
+    Register an ESP by its MAC address and give it a new DeviceID.
 
     Args:
         - app (Flask): The Flask application object.
-        - userID (int): The unique ID of the user to retrieve votes for.
+        - mac_address (str): The MAC address of the ESP to be registered.
 
     Returns:
-        - JSON: A JSON response containing information about the votes cast by the specified user.
-            The returned list includes dictionaries for each vote with keys such as:
-                - VoteID: The unique ID of the vote.
-                - UserID: The ID of the user who cast the vote.
-                - VoteType: The type of the vote.
-                - TopicID: The ID of the topic the vote is related to.
-                - VoteTime: The timestamp of when the vote was cast.
+        - tuple: The RegisteredESPs instance and True on success, the error message as a string and False on failure.
+            - A known MAC address gets a new DeviceID and is marked as registered.
+            - An unknown MAC address is added by add_esp() and its result is returned.
 
-    Raises:
-        - JSON: A JSON response with an error message and a status code 500 in case of an exception.
+    Note:
+        - The ESP is stored in espRegistry.registry, so incoming votes are resolved without a database query.
+        - The cached /api/getESPs responses are invalidated.
     """
 
     logHandler.log(f'Running dbFunctions.register_esp()')
@@ -523,6 +549,8 @@ def register_esp(app, mac_address):
 
                 # Return the instance of RegisteredESPs
                 registered_esp = RegisteredESPs.query.filter_by(MacAddress=mac_address).first()
+                espRegistry.registry.store(registered_esp.DeviceID, registered_esp.DeviceIndex, registered_esp.UserID, registered_esp.Assigned, registered_esp.Room)
+                responseCache.cache.invalidate(responseCache.ESPS)
                 return registered_esp, True
 
             else:
@@ -533,6 +561,7 @@ def register_esp(app, mac_address):
         return str(errorMsg), False
 
 
+@metrics.timed(metrics.dbCallSeconds)
 def add_esp(app, mac_address):
     """
     Register an ESP by updating its DeviceID and Registered status in the database.
@@ -568,6 +597,8 @@ def add_esp(app, mac_address):
 
             # Return the instance of RegisteredESPs
             registered_esp = RegisteredESPs.query.filter_by(MacAddress=mac_address).first()
+            espRegistry.registry.store(registered_esp.DeviceID, registered_esp.DeviceIndex, registered_esp.UserID, registered_esp.Assigned, registered_esp.Room)
+            responseCache.cache.invalidate(responseCache.ESPS)
             return registered_esp, True
 
     except Exception as errorMsg:
@@ -575,6 +606,118 @@ def add_esp(app, mac_address):
         return str(errorMsg), False
 
 
+def _esp_upsert_statement(dialectName, rows, update):
+    """
+    Build an INSERT of RegisteredESPs rows that does not fail on an existing MacAddress.
+
+    Args:
+    - dialectName (str): Name of the database dialect, 'mysql' or 'sqlite'.
+    - rows (list): Dictionaries with MacAddress, DeviceID and Registered, at most one per MacAddress.
+    - update (bool): True to overwrite DeviceID and Registered of existing ESPs, False to leave them unchanged.
+    """
+
+    espsTable = RegisteredESPs.__table__
+    if dialectName == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(espsTable).values(rows)
+        if update:
+            return statement.on_duplicate_key_update(DeviceID=statement.inserted.DeviceID, Registered=statement.inserted.Registered)
+        return statement.on_duplicate_key_update(MacAddress=espsTable.c.MacAddress)
+    elif dialectName == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        statement = insert(espsTable).values(rows)
+        if update:
+            return statement.on_conflict_do_update(index_elements=['MacAddress'], set_={'DeviceID': statement.excluded.DeviceID, 'Registered': statement.excluded.Registered})
+        return statement.on_conflict_do_nothing(index_elements=['MacAddress'])
+    raise ValueError(f'ESP upsert is not supported for database dialect {dialectName}.')
+
+
+@metrics.timed(metrics.dbCallSeconds)
+def register_esps(app, mac_addresses):
+    """
+    Register many ESPs at once, the bulk version of register_esp().
+
+    Args:
+        - app (Flask): The Flask application object.
+        - mac_addresses (list): MAC addresses of the ESPs, without duplicates.
+
+    Returns:
+        - tuple: A list of the registered ESPs as RegisteredESPs column rows (DeviceIndex, DeviceID, MacAddress)
+          and True, or an error message and False.
+
+    Note:
+        - Every ESP gets a new DeviceID, unknown MAC addresses are added. This is one upsert keyed by
+          MacAddress and one SELECT for the whole batch, instead of two SELECTs and a commit per ESP.
+    """
+
+    logHandler.log(f'Running dbFunctions.register_esps(), {len(mac_addresses)} ESPs')
+    try:
+        with app.app_context():
+            rows = [{'MacAddress': mac_address, 'DeviceID': str(uuid.uuid4()), 'Registered': True} for mac_address in mac_addresses]
+            db.session.execute(_esp_upsert_statement(db.engine.dialect.name, rows, update=True))
+            db.session.commit()
+
+            registered_esps = db.session.execute(
+                db.select(RegisteredESPs.DeviceIndex, RegisteredESPs.DeviceID, RegisteredESPs.MacAddress, RegisteredESPs.UserID, RegisteredESPs.Assigned, RegisteredESPs.Room)
+                .where(RegisteredESPs.MacAddress.in_(mac_addresses))
+            ).all()
+            for esp in registered_esps:
+                espRegistry.registry.store(esp.DeviceID, esp.DeviceIndex, esp.UserID, esp.Assigned, esp.Room)
+            responseCache.cache.invalidate(responseCache.ESPS)
+            return registered_esps, True
+
+    except Exception as errorMsg:
+        logHandler.log(f'Running dbFunctions.register_esps(), {str(errorMsg)}')
+        return str(errorMsg), False
+
+
+provisionChunkSize = 500  # Rows per INSERT of provision_esps(), keeps the statement below the bind parameter limits.
+
+
+@metrics.timed(metrics.dbCallSeconds)
+def provision_esps(app, esps):
+    """
+    Pre-seed ESPs by MAC address before they register, e.g. from the inventory of a hall.
+
+    Args:
+        - app (Flask): The Flask application object.
+        - esps (list): (MacAddress, Room) tuples, Room is None for the default room.
+
+    Returns:
+        - tuple: A JSON response with the number of added and already known ESPs and an HTTP status code.
+
+    Note:
+        - Provisioned ESPs are not registered, they get their DeviceID when they register over MQTT.
+        - Already known MAC addresses are left unchanged. All chunks are written in one transaction.
+    """
+
+    logHandler.log(f'Running dbFunctions.provision_esps(), {len(esps)} ESPs')
+    try:
+        with app.app_context():
+            rooms = list(dict(esps).items())
+            added = 0
+            known = 0
+            for start in range(0, len(rooms), provisionChunkSize):
+                chunk = rooms[start:start + provisionChunkSize]
+                existing = set(db.session.execute(db.select(RegisteredESPs.MacAddress).where(RegisteredESPs.MacAddress.in_([mac_address for mac_address, _ in chunk]))).scalars())
+                rows = [{'MacAddress': mac_address, 'DeviceID': str(uuid.uuid4()), 'Registered': False, 'Room': room}
+                        for mac_address, room in chunk if mac_address not in existing]
+                if rows:
+                    db.session.execute(_esp_upsert_statement(db.engine.dialect.name, rows, update=False))
+                added += len(rows)
+                known += len(existing)
+            db.session.commit()
+            responseCache.cache.invalidate(responseCache.ESPS)
+
+            logHandler.log(f'dbFunctions.provision_esps(), {added} ESPs added, {known} already known.')
+            return jsonify({'message': 'ESPs provisioned.', 'Added': added, 'Existing': known}), 200
+
+    except Exception as errorMsg:
+        logHandler.log(f'dbFunctions.provision_esps(), ERROR: {str(errorMsg)}')
+        return jsonify({'message': f'{str(errorMsg)}'}), 500
+
+
+@metrics.timed(metrics.dbCallSeconds)
 def unregister_esp(app, device_index):
     """
     Unregister all ESPs from the database.
@@ -606,6 +749,8 @@ def unregister_esp(app, device_index):
                 esp.Assigned = False
                 esp.UserID = None
                 db.session.commit()
+                espRegistry.registry.unassign(device_index)
+                responseCache.cache.invalidate(responseCache.ESPS)
                 return esp, True #TODO: return something else than esp
             else:
                 return "ESP not found with the given DeviceIndex", False
@@ -614,6 +759,7 @@ def unregister_esp(app, device_index):
         return str(errorMsg), False
 
 
+@metrics.timed(metrics.dbCallSeconds)
 def unregister_all_esps(app):
     """
     Unregister all ESPs from the database.
@@ -646,6 +792,8 @@ def unregister_all_esps(app):
                 esp.UserID = None
 
             db.session.commit()
+            espRegistry.registry.unassignAll()
+            responseCache.cache.invalidate(responseCache.ESPS)
 
             return "All ESPs unregistered.", True #TODO: return something else.
 
@@ -653,6 +801,7 @@ def unregister_all_esps(app):
         return str(errorMsg), False
     
 
+@metrics.timed(metrics.dbCallSeconds)
 def create_topic(app, obj: voteHandling.VoteInformation):
     """
     Create a new topic in the database based on the provided VoteInformation object.
@@ -664,6 +813,7 @@ def create_topic(app, obj: voteHandling.VoteInformation):
             - description (str): Description of the topic.
             - voteStartTime (datetime): Start time of the topic.
             - voteEndTime (datetime): End time of the topic.
+            - room (str or None): Room of the topic, None for the default room.
 
     Returns:
         - bool: True if the topic creation succeeds; False otherwise.
@@ -681,11 +831,12 @@ def create_topic(app, obj: voteHandling.VoteInformation):
     logHandler.log(f'Running dbFunctions.create_topic()')
     try:
         with app.app_context():
-            topic = Topics(Title=obj.title, Description=obj.description, StartTime=obj.voteStartTime, EndTime=obj.voteEndTime)
+            topic = Topics(Title=obj.title, Description=obj.description, StartTime=obj.voteStartTime, EndTime=obj.voteEndTime, Room=obj.room)
             db.session.add(topic)
             db.session.commit()
 
             obj.topicID = topic.TopicID
+            responseCache.cache.invalidate(responseCache.TOPICS)
 
             return  True
 
@@ -694,6 +845,7 @@ def create_topic(app, obj: voteHandling.VoteInformation):
         return False
 
 
+@metrics.timed(metrics.dbCallSeconds)
 def create_user(app, username, espID):
     """
     Create a new user in the database.
@@ -736,6 +888,7 @@ def create_user(app, username, espID):
         return str(errorMsg), False
 
 
+@metrics.timed(metrics.dbCallSeconds)
 def assign_user_to_esp(app, username, espID):
     """
     Assign a user to an ESP in the database.
@@ -778,6 +931,8 @@ def assign_user_to_esp(app, username, espID):
             esp.UserID = user.UserID
 
             db.session.commit()
+            espRegistry.registry.assign(esp.DeviceIndex, user.UserID)
+            responseCache.cache.invalidate(responseCache.ESPS)
             return jsonify({'message': 'User assigned to ESP successfully.'}), 200
 
     except Exception as errorMsg:
@@ -785,6 +940,104 @@ def assign_user_to_esp(app, username, espID):
         return str(errorMsg), 500
 
     
+def lookup_esp(app, DeviceID):
+    """
+    Resolve a DeviceID to its cached (DeviceIndex, UserID, Assigned, Room) entry.
+
+    Args:
+    - app (Flask): The Flask application object.
+    - DeviceID (str): The ID of the ESP.
+
+    Returns:
+    - espRegistry.DeviceEntry or None: The cached entry, or None if no ESP has the given DeviceID.
+
+    Note:
+    - The database is only queried on a registry miss; the result is cached for later votes.
+    """
+
+    entry = espRegistry.registry.lookup(DeviceID)
+    if entry is not None:
+        return entry
+
+    generation = espRegistry.registry.generation
+    with app.app_context():
+        esp = RegisteredESPs.query.filter_by(DeviceID=DeviceID).first()
+        if esp is None:
+            return None
+        return espRegistry.registry.store(esp.DeviceID, esp.DeviceIndex, esp.UserID, esp.Assigned, esp.Room, generation)
+
+
+def _vote_upsert_statement(dialectName, rows):
+    """
+    Build an INSERT that updates the VoteType of existing (UserID, TopicID) votes instead of failing.
+
+    Args:
+    - dialectName (str): Name of the database dialect, 'mysql' or 'sqlite'.
+    - rows (list): Dictionaries with UserID, TopicID and VoteType, at most one per (UserID, TopicID).
+
+    Note:
+    - Relies on the unique key uq_votes_user_topic added by dbMigrations.
+    """
+
+    votesTable = Votes.__table__
+    if dialectName == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(votesTable).values(rows)
+        return statement.on_duplicate_key_update(VoteType=statement.inserted.VoteType)
+    elif dialectName == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        statement = insert(votesTable).values(rows)
+        return statement.on_conflict_do_update(index_elements=['UserID', 'TopicID'], set_={'VoteType': statement.excluded.VoteType})
+    raise ValueError(f'Vote upsert is not supported for database dialect {dialectName}.')
+
+
+@metrics.timed(metrics.dbCallSeconds)
+def cast_vote(app, DeviceID, voteType, topicID):
+    """
+    Store the vote of an ESP on a topic, creating it or changing the existing one in a single statement.
+
+    Args:
+    - app (Flask): The Flask application object.
+    - DeviceID (str): The ID of the ESP.
+    - voteType (str): The chosen option.
+    - topicID (int): The ID of the topic the vote is for.
+
+    Returns:
+    - Tuple: A tuple containing a status and a boolean indicating success.
+             - If successful, the status is 'created', 'changed' or 'unchanged' and the boolean is True.
+             - If the ESP is not assigned or an error occurs, returns an error message and False.
+
+    Note:
+    - The vote is written with INSERT ... ON DUPLICATE KEY UPDATE (ON CONFLICT DO UPDATE on SQLite),
+      one round trip that cannot create duplicate votes under concurrency.
+    - The status comes from the live vote tally, which knows the user's previous choice. MySQL's
+      affected-rows value cannot tell a new vote from an unchanged one when CLIENT_FOUND_ROWS is set.
+    """
+
+    logHandler.debug('Running dbFunctions.cast_vote(), DeviceID: %s, topicID: %s', DeviceID, topicID)
+    try:
+        esp = lookup_esp(app, DeviceID)
+        if esp is None or not esp.assigned:
+            return "ESP not assigned.", False
+
+        previous = tally_vote(app, esp.userID, topicID, voteType)
+        try:
+            with app.app_context():
+                db.session.execute(_vote_upsert_statement(db.engine.dialect.name, [{'UserID': esp.userID, 'TopicID': topicID, 'VoteType': voteType}]))
+                db.session.commit()
+        except Exception:
+            voteTally.tally.restore(topicID, esp.userID, previous)
+            raise
+
+        if previous is None:
+            return 'created', True
+        return ('unchanged' if previous == voteType else 'changed'), True
+
+    except Exception as errorMsg:
+        logHandler.log(f'Running dbFunctions.cast_vote(), {str(errorMsg)}')
+        return str(errorMsg), False
+
+
 def update_vote(app, DeviceID, voteType, topicObject):
     """
     Update the vote type for a user associated with a specific ESP.
@@ -793,6 +1046,7 @@ def update_vote(app, DeviceID, voteType, topicObject):
     - app (Flask): The Flask application object.
     - DeviceID (str): The ID of the ESP.
     - voteType (str): The updated vote type.
+    - topicObject: The topic object containing information about the vote topic.
 
     Returns:
     - Tuple: A tuple containing a message and a boolean indicating success.
@@ -800,29 +1054,16 @@ def update_vote(app, DeviceID, voteType, topicObject):
              - If the ESP is not assigned or an error occurs, returns an error message and False.
 
     Note:
-    - This function updates the vote type for a user associated with the specified ESP.
-    - Retrieves the ESP information based on the provided DeviceID.
-    - If the ESP is assigned, it fetches the associated user and updates the vote type.
-    - Returns a message indicating the success or failure of the vote update process.
+    - Uses cast_vote(), a missing vote is created instead of reported.
     """
 
-    logHandler.log(f'Running dbFunctions.update_vote()')
-    try:
-        with app.app_context():
-            esp = RegisteredESPs.query.filter_by(DeviceID=DeviceID).first()
-            
-            if esp.Assigned:
-                user = Users.query.filter_by(UserID=esp.UserID).first()
-                vote = Votes.query.filter_by(UserID=user.UserID).first()
-                vote.VoteType = voteType
-                db.session.commit()
-                return "Vote updated successfully.", True
-            else:
-                return "ESP not assigned.", False
-    except Exception as errorMsg:
-        return str(errorMsg), False
+    status, success = cast_vote(app, DeviceID, voteType, topicObject.topicID)
+    if not success:
+        return status, False
+    return "Vote updated successfully.", True
     
 
+@metrics.timed(metrics.dbCallSeconds)
 def find_if_vote_exists(app, DeviceID, topicObject):
     """
     Check if a vote exists for a user associated with a specific ESP and topic.
@@ -837,12 +1078,13 @@ def find_if_vote_exists(app, DeviceID, topicObject):
     """
 
     try:
-        logHandler.log(f'Running dbFunctions.find_if_vote_exists()')
-        logHandler.log(f'Running dbFunctions.find_if_vote_exists(), DeviceID: {DeviceID}, topicObject: {topicObject}')
+        logHandler.debug('Running dbFunctions.find_if_vote_exists(), DeviceID: %s, topicObject: %s', DeviceID, topicObject)
+        esp = lookup_esp(app, DeviceID)
+        if esp is None:
+            return False
+
         with app.app_context():
-            logHandler.log(f'Running dbFunctions.find_if_vote_exists(), DeviceID: {DeviceID}')
-            esp = RegisteredESPs.query.filter_by(DeviceID=DeviceID).first()
-            vote = Votes.query.filter_by(UserID=esp.UserID, TopicID=topicObject.topicID).first()
+            vote = Votes.query.filter_by(UserID=esp.userID, TopicID=topicObject.topicID).first()
 
             if vote:
                 return True
@@ -870,25 +1112,149 @@ def create_vote(app, DeviceID, voteType, topicObject):
     Handles exceptions and returns appropriate messages regarding the success or failure of creating a vote.
     """
 
-    logHandler.log(f'Running dbFunctions.create_vote()')
+    status, success = cast_vote(app, DeviceID, voteType, topicObject.topicID)
+    with app.app_context():
+        if success:
+            return jsonify({'message': 'Vote created successfully.'}), 200
+        elif status == "ESP not assigned.":
+            return jsonify({'message': 'ESP not assigned.'}), 400
+        else:
+            return jsonify({'message': f'{status}'}), 500
+    
+
+@metrics.timed(metrics.dbCallSeconds)
+def apply_vote_batch(app, votes):
+    """
+    Persist a batch of votes in a single transaction.
+
+    Args:
+    - app (Flask): The Flask application object.
+    - votes (list): (UserID, TopicID, VoteType) tuples, at most one per (UserID, TopicID).
+
+    Returns:
+    - Tuple: A tuple containing a message and a boolean indicating success.
+
+    Note:
+    - The whole batch is written with one multi-row upsert, see _vote_upsert_statement().
+    """
+
+    logHandler.debug('Running dbFunctions.apply_vote_batch(), batch size: %s', len(votes))
     try:
+        rows = [{'UserID': userID, 'TopicID': topicID, 'VoteType': voteType} for userID, topicID, voteType in votes]
         with app.app_context():
-            esp = RegisteredESPs.query.filter_by(DeviceID=DeviceID).first()
-            
-            # create vote if esp is assigned   
-            if esp.Assigned:
-                user = Users.query.filter_by(UserID=esp.UserID).first()
-                vote = Votes(UserID=user.UserID, VoteType=voteType, TopicID=topicObject.topicID)
-                db.session.add(vote)
-                db.session.commit()
-                return jsonify({'message': 'Vote created successfully.'}), 200
-            else:
-                return jsonify({'message': 'ESP not assigned.'}), 400
+            db.session.execute(_vote_upsert_statement(db.engine.dialect.name, rows))
+            db.session.commit()
+
+            return f'{len(rows)} votes stored.', True
     except Exception as errorMsg:
-        logHandler.log(f'Running dbFunctions.create_vote(), {str(errorMsg)}')
-        return jsonify({'message': f'{str(errorMsg)}'}), 500
-    
+        logHandler.log(f'Running dbFunctions.apply_vote_batch(), {str(errorMsg)}')
+        return str(errorMsg), False
+
+
+@metrics.timed(metrics.dbCallSeconds)
+def load_vote_tally(app, topicIDs):
+    """
+    Seed the in-memory vote tally of the given topics from the database.
+
+    Args:
+    - app (Flask): The Flask application object.
+    - topicIDs (list): The IDs of the topics to track.
+
+    Returns:
+    - bool: True if the topics were loaded, False otherwise.
+
+    Note:
+    - All topics are loaded with a single query selecting only (TopicID, UserID, VoteType).
+      The per-user choice is kept so changed votes can be moved between counts later.
+    - The before_load handlers of the tally run first, so votes still queued for the database are read too.
+    """
+
+    logHandler.log(f'Running dbFunctions.load_vote_tally(), topics: {topicIDs}')
+    try:
+        voteTally.tally.prepare_load(topicIDs)
+        with app.app_context():
+            rows = (
+                db.session.query(Votes.TopicID, Votes.UserID, Votes.VoteType)
+                .filter(Votes.TopicID.in_(topicIDs))
+                .order_by(Votes.VoteID)
+                .all()
+            )
+
+        votesByTopic = {topicID: [] for topicID in topicIDs}
+        for topicID, userID, voteType in rows:
+            votesByTopic[topicID].append((userID, voteType))
+        for topicID, votes in votesByTopic.items():
+            voteTally.tally.seed(topicID, votes)
+        return True
+
+    except Exception as errorMsg:
+        logHandler.log(f'Running dbFunctions.load_vote_tally(), {str(errorMsg)}')
+        return False
+
+
+def tally_vote(app, userID, topicID, voteType):
+    """
+    Count an accepted vote in the in-memory vote tally.
 
+    Args:
+    - app (Flask): The Flask application object.
+    - userID (int): The ID of the user who voted.
+    - topicID (int): The ID of the topic the vote is for.
+    - voteType (str): The chosen option.
+
+    Returns:
+    - str or None: The user's previous choice on the topic, None for a first vote.
+
+    Note:
+    - A topic that is not tracked yet is seeded from the database first.
+    """
+
+    if not voteTally.tally.isTracked(topicID):
+        with _tallyLoadLock:
+            if not voteTally.tally.isTracked(topicID) and load_vote_tally(app, [topicID]) == False:
+                return None
+    return voteTally.tally.record(topicID, userID, voteType)
+
+
+def get_tally(app, topicID):
+    """
+    Retrieve the live vote counts of a topic.
+
+    Args:
+    - app (Flask): The Flask application object.
+    - topicID (int): The unique ID of the topic.
+
+    Returns:
+    - JSON: A JSON response with the vote counts of the topic and a status code 200.
+        - TopicID: The ID of the topic.
+        - Counts: Number of votes per vote type.
+        - TotalVotes: Number of votes on the topic.
+      A status code 404 if the topic does not exist.
+
+    Raises:
+    - JSON: A JSON response with an error message and a status code 500 in case of an exception.
+    """
+
+    try:
+        with app.app_context():
+            counts = voteTally.tally.counts(topicID)
+            if counts is None:
+                # Only existing topics are loaded, every loaded topic stays in the tally until it is forgotten.
+                if db.session.get(Topics, topicID) is None:
+                    return jsonify({'message': 'Topic not found.'}), 404
+                with _tallyLoadLock:
+                    if not voteTally.tally.isTracked(topicID) and load_vote_tally(app, [topicID]) == False:
+                        return jsonify({'error': 'Failed to load vote tally.'}), 500
+                counts = voteTally.tally.counts(topicID)
+
+            return jsonify({'TopicID': topicID, 'Counts': counts, 'TotalVotes': sum(counts.values())}), 200
+
+    except Exception as errorMsg:
+        error_message = {"error": str(errorMsg)}
+        return jsonify(error_message), 500
+
+
+@metrics.timed(metrics.dbCallSeconds)
 def unassign_esp_with_id(app, espID):
     """
     Unassign an ESP with the specified ID in the database.
@@ -916,6 +1282,8 @@ def unassign_esp_with_id(app, espID):
                 esp.Assigned = False
                 esp.UserID = None
                 db.session.commit()
+                espRegistry.registry.unassign(esp.DeviceIndex)
+                responseCache.cache.invalidate(responseCache.ESPS)
                 logHandler.log(f'dbFunctions.unassign_esp_with_id(), ESP{espID} unassigned.')
                 return jsonify({'message': f'ESP{espID} unassigned.'}), 200
             else:
@@ -926,6 +1294,7 @@ def unassign_esp_with_id(app, espID):
         return jsonify({'message': f'{str(errorMsg)}'}), 500
 
 
+@metrics.timed(metrics.dbCallSeconds)
 def unassign_all_esps(app):
     """
     Unassign all ESP devices in the database.
@@ -952,6 +1321,8 @@ def unassign_all_esps(app):
                 esp.Assigned = False
                 esp.UserID = None
             db.session.commit()
+            espRegistry.registry.unassignAll()
+            responseCache.cache.invalidate(responseCache.ESPS)
             logHandler.log(f'dbFunctions.unassign_all_esps(), All ESPs unassigned.')
             return jsonify({'message': 'All ESPs unassigned.'}), 200
     except Exception as errorMsg:
@@ -959,6 +1330,7 @@ def unassign_all_esps(app):
         return jsonify({'message': f'{str(errorMsg)}'}), 500
 
 
+@metrics.timed(metrics.dbCallSeconds)
 def find_active_topic(app, vote_info_object):
     """
     Find an active topic in the database and update the provided VoteInformation object.
@@ -986,7 +1358,7 @@ def find_active_topic(app, vote_info_object):
             if active_topic:
                 # Update the VoteInformation object with the information from the active topic
                 vote_info_object.topicID = active_topic.TopicID
-                vote_info_object.updateVoteInformation(active_topic.Title, active_topic.Description, active_topic.StartTime, active_topic.EndTime)
+                vote_info_object.updateVoteInformation(active_topic.Title, active_topic.Description, active_topic.StartTime, active_topic.EndTime, active_topic.Room)
                 logHandler.log(f'dbFunctions.find_active_topic(), Active topic found: {active_topic.Title}')
                 return True
             else:
@@ -999,3 +1371,69 @@ def find_active_topic(app, vote_info_object):
         return False
 
 
+@metrics.timed(metrics.dbCallSeconds)
+def find_active_topics(app):
+    """
+    Find the current topic of every room, the newest topic of the room that has not ended.
+
+    Args:
+        - app (Flask): The Flask application object.
+
+    Returns:
+        - list: voteHandling.VoteInformation objects ordered by StartTime, empty if none is found or on error.
+
+    Note:
+        - When a room has several such topics only the one with the highest TopicID is returned, like createTopic() replaces the topic of a room
+          with the new one whether it already started or not.
+    """
+
+    logHandler.log(f'Running dbFunctions.find_active_topics()')
+    try:
+        with app.app_context():
+            current_time = datetime.now()
+            topics = Topics.query.filter(Topics.EndTime >= current_time).order_by(Topics.TopicID).all()
+
+            topicsByRoom = {}
+            for topic in topics:
+                voteInformation = voteHandling.VoteInformation()
+                voteInformation.topicID = topic.TopicID
+                voteInformation.updateVoteInformation(topic.Title, topic.Description, topic.StartTime, topic.EndTime, topic.Room)
+                topicsByRoom[topic.Room] = voteInformation
+
+            logHandler.log(f'dbFunctions.find_active_topics(), {len(topicsByRoom)} active topics found.')
+            return sorted(topicsByRoom.values(), key=lambda voteInformation: voteInformation.voteStartTime)
+    except Exception as errorMsg:
+        logHandler.log(f'dbFunctions.find_active_topics(), ERROR: {str(errorMsg)}')
+        return []
+
+
+@metrics.timed(metrics.dbCallSeconds)
+def set_esp_room(app, espID, room):
+    """
+    Move an ESP to a room, its votes then count for the topic of that room.
+
+    Args:
+        - app (Flask): The Flask application object.
+        - espID (int): The DeviceIndex of the ESP.
+        - room (str or None): Name of the room, None for the default room.
+
+    Returns:
+        - tuple: A JSON response message with the DeviceID, MacAddress and Room of the ESP and an HTTP status code, 404 if the ESP is not found.
+    """
+
+    logHandler.log(f'Running dbFunctions.set_esp_room()')
+    try:
+        with app.app_context():
+            esp = RegisteredESPs.query.filter_by(DeviceIndex=espID).first()
+            if esp is None:
+                return jsonify({'message': f'ESP{espID} not found in db.'}), 404
+
+            esp.Room = room
+            db.session.commit()
+            espRegistry.registry.setRoom(esp.DeviceIndex, room)
+            responseCache.cache.invalidate(responseCache.ESPS)
+            logHandler.log(f'dbFunctions.set_esp_room(), ESP{espID} moved to room {room}.')
+            return jsonify({'message': f'ESP{espID} moved to room {room}.', 'DeviceID': esp.DeviceID, 'MacAddress': esp.MacAddress, 'Room': room}), 200
+    except Exception as errorMsg:
+        logHandler.log(f'dbFunctions.set_esp_room(), ERROR: {str(errorMsg)}')
+        return jsonify({'message': f'{str(errorMsg)}'}), 500
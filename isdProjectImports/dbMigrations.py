@@ -0,0 +1,202 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, MetaData, String, Table, TIMESTAMP, inspect, select, text
+from isdProjectImports import logHandler
+from isdProjectImports import dbFunctions
+
+# Applied migrations are recorded here, kept out of db.Model so db.create_all() does not own it.
+schemaMigrationsTable = Table(
+    'schema_migrations', MetaData(),
+    Column('Version', Integer, primary_key=True, autoincrement=False),
+    Column('Name', String(255), nullable=False),
+    Column('AppliedAt', TIMESTAMP, nullable=False),
+)
+
+
+def _create_indexes(connection, tableName, indexNames):
+    """Create the named indexes declared on the model of 'tableName' unless they already exist."""
+
+    table = dbFunctions.db.metadata.tables[tableName]
+    existing = {index['name'] for index in inspect(connection).get_indexes(tableName)}
+    for index in table.indexes:
+        if index.name in indexNames and index.name not in existing:
+            logHandler.log(f'dbMigrations, creating index {index.name} on {tableName}.')
+            index.create(connection)
+
+
+def _add_columns(connection, tableName, columnNames):
+    """Add the named nullable columns declared on the model of 'tableName' unless they already exist."""
+
+    table = dbFunctions.db.metadata.tables[tableName]
+    existing = {column['name'] for column in inspect(connection).get_columns(tableName)}
+    quote = connection.dialect.identifier_preparer.quote
+    for name in columnNames:
+        if name not in existing:
+            logHandler.log(f'dbMigrations, adding column {name} to {tableName}.')
+            columnType = table.c[name].type.compile(dialect=connection.dialect)
+            connection.execute(text(f'ALTER TABLE {quote(tableName)} ADD COLUMN {quote(name)} {columnType}'))
+
+
+def _add_lookup_indexes(connection):
+    _create_indexes(connection, 'registeredesps', {'ix_registeredesps_assigned_registered', 'ix_registeredesps_registered', 'ix_registeredesps_userid'})
+    _create_indexes(connection, 'topics', {'ix_topics_start_end'})
+    _create_indexes(connection, 'votes', {'ix_votes_topic_voteid'})
+
+
+def _add_unique_vote_key(connection):
+    # Keep only the latest vote per (UserID, TopicID) before the unique key is added.
+    # The derived table is required by MySQL, which cannot select from the table it deletes from.
+    votes = dbFunctions.Votes.__table__
+    latestVotes = (
+        select(dbFunctions.db.func.max(votes.c.VoteID).label('VoteID'))
+        .where(votes.c.UserID.isnot(None))
+        .group_by(votes.c.UserID, votes.c.TopicID)
+        .subquery('latest_votes')
+    )
+    removed = connection.execute(
+        votes.delete()
+        .where(votes.c.UserID.isnot(None))
+        .where(votes.c.VoteID.notin_(select(latestVotes.c.VoteID)))
+    ).rowcount
+    if removed:
+        logHandler.log(f'dbMigrations, removed {removed} duplicate votes.')
+    _create_indexes(connection, 'votes', {'uq_votes_user_topic'})
+
+
+def _add_pagination_indexes(connection):
+    _create_indexes(connection, 'votes', {'ix_votes_user_voteid'})
+
+
+def _add_rooms(connection):
+    _add_columns(connection, 'registeredesps', ['Room'])
+    _add_columns(connection, 'topics', ['Room'])
+    _create_indexes(connection, 'registeredesps', {'ix_registeredesps_room'})
+    _create_indexes(connection, 'topics', {'ix_topics_room'})
+
+
+# (Version, Name, function(connection)), applied in order and never changed once released.
+MIGRATIONS = [
+    (1, 'Composite indexes for the hot lookup columns', _add_lookup_indexes),
+    (2, 'Unique vote per user and topic', _add_unique_vote_key),
+    (3, 'Keyset pagination index of votes by user', _add_pagination_indexes),
+    (4, 'Rooms of ESPs and topics', _add_rooms),
+]
+
+
+def get_schema_version(app):
+    """
+    Return the version of the newest applied migration, 0 if none is applied.
+
+    Args:
+        - app (Flask): The Flask application object.
+    """
+
+    with app.app_context():
+        with dbFunctions.db.engine.begin() as connection:
+            schemaMigrationsTable.create(connection, checkfirst=True)
+            version = connection.execute(select(dbFunctions.db.func.max(schemaMigrationsTable.c.Version))).scalar()
+            return version or 0
+
+
+def apply_migrations(app):
+    """
+    Create missing tables and apply every migration newer than the current schema version.
+
+    Args:
+        - app (Flask): The Flask application object.
+
+    Returns:
+        - tuple: A message and a boolean indicating success.
+
+    Note:
+        - Each migration runs in its own transaction together with its schema_migrations row.
+        - Migrations only create what is missing, so a database created by db.create_all() with
+          the indexes already in place is simply marked as migrated.
+    """
+
+    logHandler.log(f'Running dbMigrations.apply_migrations()')
+    try:
+        with app.app_context():
+            dbFunctions.db.create_all()
+            currentVersion = get_schema_version(app)
+
+            applied = []
+            for version, name, migration in MIGRATIONS:
+                if version <= currentVersion:
+                    continue
+                logHandler.log(f'dbMigrations, applying migration {version}: {name}')
+                with dbFunctions.db.engine.begin() as connection:
+                    migration(connection)
+                    connection.execute(schemaMigrationsTable.insert().values(Version=version, Name=name, AppliedAt=datetime.now()))
+                applied.append(version)
+
+            message = f'Schema version {MIGRATIONS[-1][0]}, applied migrations: {applied}'
+            logHandler.log(f'dbMigrations.apply_migrations(), {message}')
+            return message, True
+
+    except Exception as errorMsg:
+        logHandler.log(f'dbMigrations.apply_migrations(), ERROR: {str(errorMsg)}')
+        return str(errorMsg), False
+
+
+def _hot_queries():
+    """(Name, statement, expected index names or None for any index) of the queries on the hot paths."""
+
+    esps = dbFunctions.RegisteredESPs.__table__
+    topics = dbFunctions.Topics.__table__
+    votes = dbFunctions.Votes.__table__
+    now = datetime.now()
+    return [
+        ('esp by DeviceID', select(esps.c.DeviceIndex).where(esps.c.DeviceID == 'device'), None),
+        ('esp by MacAddress', select(esps.c.DeviceIndex).where(esps.c.MacAddress == 'mac'), None),
+        ('assigned esps', select(esps.c.DeviceIndex).where(esps.c.Assigned == True), {'ix_registeredesps_assigned_registered'}),
+        ('unassigned esps', select(esps.c.DeviceIndex).where(esps.c.Registered == True, esps.c.Assigned == False), {'ix_registeredesps_assigned_registered', 'ix_registeredesps_registered'}),
+        ('vote by user and topic', select(votes.c.VoteID).where(votes.c.UserID == 1, votes.c.TopicID == 1), {'uq_votes_user_topic'}),
+        ('votes by topic', select(votes.c.VoteID).where(votes.c.TopicID == 1), {'ix_votes_topic_voteid', 'uq_votes_user_topic'}),
+        ('votes page by topic', select(votes.c.VoteID).where(votes.c.TopicID == 1, votes.c.VoteID > 100).order_by(votes.c.VoteID).limit(101), {'ix_votes_topic_voteid'}),
+        ('votes page by user', select(votes.c.VoteID).where(votes.c.UserID == 1, votes.c.VoteID > 100).order_by(votes.c.VoteID).limit(101), {'ix_votes_user_voteid'}),
+        ('topics page', select(topics.c.TopicID).where(topics.c.TopicID > 100).order_by(topics.c.TopicID).limit(101), None),
+        ('active topic', select(topics.c.TopicID).where(topics.c.StartTime <= now, topics.c.EndTime >= now), {'ix_topics_start_end'}),
+    ]
+
+
+def explain_hot_queries(app):
+    """
+    Run EXPLAIN on the hot queries and check that each one is served by an index.
+
+    Args:
+        - app (Flask): The Flask application object.
+
+    Returns:
+        - list: One dictionary per query with keys Query, UsesIndex and Plan.
+
+    Note:
+        - MySQL is checked with EXPLAIN (the 'key' column), SQLite with EXPLAIN QUERY PLAN.
+        - On tiny tables MySQL may prefer a full scan, run the check against production sized data.
+    """
+
+    results = []
+    with app.app_context():
+        with dbFunctions.db.engine.connect() as connection:
+            dialect = connection.dialect.name
+            for name, statement, expectedIndexes in _hot_queries():
+                compiled = statement.compile(dialect=connection.dialect)
+                if compiled.positional:
+                    params = tuple(compiled.params[param] for param in compiled.positiontup)
+                else:
+                    params = compiled.params
+
+                if dialect == 'sqlite':
+                    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params).fetchall()
+                    plan = '; '.join(row[-1] for row in rows)
+                    usedIndexes = {word for row in rows for word in row[-1].replace('(', ' ').split()}
+                    usesIndex = ' INDEX ' in f' {plan} ' or 'PRIMARY KEY' in plan
+                else:
+                    rows = connection.exec_driver_sql(f'EXPLAIN {compiled}', params).mappings().fetchall()
+                    plan = '; '.join(f'{row["table"]}: type={row["type"]}, key={row["key"]}' for row in rows)
+                    usedIndexes = {row['key'] for row in rows if row['key']}
+                    usesIndex = bool(usedIndexes)
+
+                if expectedIndexes is not None:
+                    usesIndex = bool(usedIndexes & expectedIndexes)
+                results.append({'Query': name, 'UsesIndex': usesIndex, 'Plan': plan})
+    return results
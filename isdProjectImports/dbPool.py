@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import deque
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that measures how long checkouts wait for a connection.
+
+    Opening a new connection (TCP and auth handshake) is not waiting on the pool, its time is left out.
+
+    Used as 'poolclass' of the engine so /api/getServerStats shows whether the MQTT workers and
+    the vote writer wait on the pool during vote bursts, and how often it runs into overflow.
+    """
+
+    slowCheckoutMs = 1  # Checkouts taking longer than this count as waited.
+    recentSamples = 1000  # Checkout times kept for the percentiles.
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._statsLock = threading.Lock()
+        self._local = threading.local()
+        self._checkoutTimes = deque(maxlen=self.recentSamples)
+        self.checkouts = 0
+        self.waitedCheckouts = 0
+        self.checkoutTimeouts = 0
+        self.overflowEvents = 0
+        self.maxCheckoutMs = 0.0
+
+    def _do_get(self):
+        # QueuePool._do_get() calls itself when it loses a race, only the outermost call is timed.
+        if getattr(self._local, 'timing', False):
+            return super()._do_get()
+
+        self._local.timing = True
+        self._local.connectSec = 0.0
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._statsLock:
+                self.checkoutTimeouts += 1
+            raise
+        finally:
+            self._local.timing = False
+            elapsedMs = (time.perf_counter() - start - self._local.connectSec) * 1000
+            with self._statsLock:
+                self.checkouts += 1
+                self._checkoutTimes.append(elapsedMs)
+                if elapsedMs > self.slowCheckoutMs:
+                    self.waitedCheckouts += 1
+                if elapsedMs > self.maxCheckoutMs:
+                    self.maxCheckoutMs = elapsedMs
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            if getattr(self._local, 'timing', False):
+                self._local.connectSec += time.perf_counter() - start
+
+    def _inc_overflow(self):
+        created = super()._inc_overflow()
+        # _overflow counts up from -pool_size, positive values are connections beyond pool_size.
+        if created and self._overflow > 0:
+            with self._statsLock:
+                self.overflowEvents += 1
+        return created
+
+    def stats(self):
+        with self._statsLock:
+            recent = sorted(self._checkoutTimes)
+            checkoutMs = {
+                'p50': round(recent[len(recent) // 2], 3) if recent else 0,
+                'p99': round(recent[min(len(recent) - 1, int(len(recent) * 0.99))], 3) if recent else 0,
+                'max': round(self.maxCheckoutMs, 3),
+            }
+            return {
+                'size': self.size(),
+                'maxOverflow': self._max_overflow,
+                'checkedOut': self.checkedout(),
+                'idle': self.checkedin(),
+                'overflow': max(self.overflow(), 0),
+                'checkouts': self.checkouts,
+                'waitedCheckouts': self.waitedCheckouts,
+                'checkoutTimeouts': self.checkoutTimeouts,
+                'overflowEvents': self.overflowEvents,
+                'checkoutMs': checkoutMs,
+            }
+
+
+def pool_options(poolSize, maxOverflow, recycleSec, prePing, timeoutSec):
+    """Return the SQLALCHEMY_ENGINE_OPTIONS of an instrumented connection pool."""
+
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': poolSize,
+        'max_overflow': maxOverflow,
+        'pool_recycle': recycleSec,
+        'pool_pre_ping': prePing,
+        'pool_timeout': timeoutSec,
+    }
+
+
+def stats(engine):
+    """Return the pool statistics of 'engine', or only the pool status if it is not instrumented."""
+
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        return engine.pool.stats()
+    return {'status': engine.pool.status()}
@@ -0,0 +1,98 @@
+from collections import namedtuple
+import threading
+
+# Cached view of a RegisteredESPs row, only the columns the vote path needs.
+DeviceEntry = namedtuple('DeviceEntry', ['deviceIndex', 'userID', 'assigned', 'room'])
+
+
+class DeviceRegistry:
+    """
+    Process-wide cache of registered ESPs keyed by DeviceID.
+
+    Entries are filled lazily on the first lookup of a DeviceID and are kept coherent
+    by the dbFunctions code paths that change DeviceID, UserID, Assigned or Room. Every
+    mutation bumps 'generation' so a DB read that raced with a mutation is not cached.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._byDeviceID = {}  # DeviceID -> DeviceEntry
+        self._deviceIDByIndex = {}  # DeviceIndex -> DeviceID
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, deviceID):
+        entry = self._byDeviceID.get(deviceID)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def store(self, deviceID, deviceIndex, userID, assigned, room=None, generation=None):
+        """
+        Cache a device. When 'generation' is given this is a read-through fill of a DB read: the
+        entry is only stored if no mutation happened since that generation was read, and it does
+        not bump the generation itself. Without it the store is a mutation, e.g. a registration.
+        """
+
+        entry = DeviceEntry(deviceIndex, userID, bool(assigned), room)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return entry
+
+            # A re-registration gives the device a new DeviceID, drop the old one.
+            oldDeviceID = self._deviceIDByIndex.get(deviceIndex)
+            if oldDeviceID is not None and oldDeviceID != deviceID:
+                self._byDeviceID.pop(oldDeviceID, None)
+
+            self._byDeviceID[deviceID] = entry
+            self._deviceIDByIndex[deviceIndex] = deviceID
+            if generation is None:
+                self.generation += 1
+        return entry
+
+    def assign(self, deviceIndex, userID):
+        self._update(deviceIndex, userID, True)
+
+    def unassign(self, deviceIndex):
+        self._update(deviceIndex, None, False)
+
+    def unassignAll(self):
+        with self._lock:
+            for deviceID, entry in self._byDeviceID.items():
+                self._byDeviceID[deviceID] = entry._replace(userID=None, assigned=False)
+            self.generation += 1
+
+    def setRoom(self, deviceIndex, room):
+        with self._lock:
+            deviceID = self._deviceIDByIndex.get(deviceIndex)
+            if deviceID is not None:
+                self._byDeviceID[deviceID] = self._byDeviceID[deviceID]._replace(room=room)
+            self.generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._byDeviceID.clear()
+            self._deviceIDByIndex.clear()
+            self.generation += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._byDeviceID),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+    def _update(self, deviceIndex, userID, assigned):
+        with self._lock:
+            deviceID = self._deviceIDByIndex.get(deviceIndex)
+            if deviceID is not None:
+                self._byDeviceID[deviceID] = self._byDeviceID[deviceID]._replace(userID=userID, assigned=assigned)
+            self.generation += 1
+
+
+registry = DeviceRegistry()
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import threading
+
+
+class EventSubscriber:
+    """
+    Pending events of one connected client.
+
+    Only the latest event per key is kept, so a client that reads slower than events are
+    published receives the current state instead of a growing backlog.
+    """
+
+    __slots__ = ('_condition', '_pending', 'closed')
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pending = {}  # Event key -> encoded event
+        self.closed = False
+
+    def offer(self, key, encodedEvent):
+        """Queue an event, returns True if it replaced an undelivered event with the same key."""
+
+        with self._condition:
+            # Re-insert so the replacing event is delivered after events published before it.
+            coalesced = self._pending.pop(key, None) is not None
+            self._pending[key] = encodedEvent
+            self._condition.notify()
+            return coalesced
+
+    def take(self, timeout):
+        """Wait up to 'timeout' seconds for events and return all pending ones."""
+
+        with self._condition:
+            if not self._pending and not self.closed:
+                self._condition.wait(timeout)
+            events = list(self._pending.values())
+            self._pending.clear()
+            return events
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify()
+
+
+class AsyncEventSubscriber(EventSubscriber):
+    """EventSubscriber of a client served on an asyncio event loop (asyncServer.py), events are awaited instead of waited for."""
+
+    __slots__ = ('_loop', '_ready')
+
+    def __init__(self, loop):
+        super().__init__()
+        self._loop = loop
+        self._ready = asyncio.Event()
+
+    def offer(self, key, encodedEvent):
+        coalesced = super().offer(key, encodedEvent)
+        self._loop.call_soon_threadsafe(self._ready.set)  # Events are published by the MQTT workers.
+        return coalesced
+
+    def close(self):
+        super().close()
+        self._loop.call_soon_threadsafe(self._ready.set)
+
+    async def take_async(self, timeout):
+        """Await events for up to 'timeout' seconds and return all pending ones."""
+
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._ready.clear()
+        return self.take(0)
+
+
+class EventStream:
+    """
+    Pushes server events (vote tallies, registrations, topic changes) to dashboards over
+    Server-Sent Events. An event is encoded once and shared by all subscribers.
+    """
+
+    def __init__(self, maxClients=250, heartbeatSec=15):
+        self.maxClients = maxClients
+        self.heartbeatSec = heartbeatSec
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self.publishedEvents = 0
+        self.coalescedEvents = 0
+        self.rejectedClients = 0
+
+    @staticmethod
+    def encode(eventType, data):
+        return f'event: {eventType}\ndata: {json.dumps(data, default=str)}\n\n'
+
+    def publish(self, eventType, data, key=None):
+        """
+        Send an event to every subscriber.
+
+        Args:
+            - eventType (str): The SSE event name.
+            - data (dict): JSON serializable event payload.
+            - key (str): Events with the same key replace each other while undelivered. Defaults to 'eventType'.
+        """
+
+        self.publishedEvents += 1
+        if not self._subscribers:
+            return
+        encodedEvent = self.encode(eventType, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.offer(key or eventType, encodedEvent):
+                self.coalescedEvents += 1
+
+    def subscribe(self, initialEvents=(), subscriber=None):
+        """
+        Register a new client.
+
+        Args:
+            - initialEvents (iterable): (eventType, data, key) tuples sent to the client first, e.g. the current state.
+            - subscriber (EventSubscriber): The subscriber to register, e.g. an AsyncEventSubscriber. Defaults to a new EventSubscriber.
+
+        Returns:
+            - EventSubscriber or None: The subscriber, None if 'maxClients' are already connected.
+        """
+
+        # The initial state is queued before registering so newer published events replace it.
+        subscriber = subscriber or EventSubscriber()
+        for eventType, data, key in initialEvents:
+            subscriber.offer(key or eventType, self.encode(eventType, data))
+
+        with self._lock:
+            if len(self._subscribers) >= self.maxClients:
+                self.rejectedClients += 1
+                return None
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, subscriber):
+        """Generator of the SSE response body of 'subscriber', sends a comment as heartbeat when idle."""
+
+        try:
+            yield 'retry: 3000\n\n'
+            while not subscriber.closed:
+                events = subscriber.take(self.heartbeatSec)
+                if events:
+                    yield ''.join(events)
+                else:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def stream_async(self, subscriber):
+        """Async generator of the SSE response body of an AsyncEventSubscriber, see stream()."""
+
+        try:
+            yield 'retry: 3000\n\n'
+            while not subscriber.closed:
+                events = await subscriber.take_async(self.heartbeatSec)
+                if events:
+                    yield ''.join(events)
+                elif not subscriber.closed:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        return {
+            'clients': len(self._subscribers),
+            'maxClients': self.maxClients,
+            'publishedEvents': self.publishedEvents,
+            'coalescedEvents': self.coalescedEvents,
+            'rejectedClients': self.rejectedClients,
+        }
@@ -0,0 +1,148 @@
+import json
+from flask import Response
+from werkzeug.http import http_date
+
+# orjson encodes the row dicts several times faster than json, used when installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+streamChunkRows = 1000  # Rows fetched from the database and encoded per chunk of a streamed response.
+
+
+def _dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def http_date_or_none(value):
+    """Format a datetime like Flask's jsonify() does, None stays null."""
+
+    return http_date(value) if value is not None else None
+
+
+class RowSerializer:
+    """
+    Turns result rows of a column query into JSON without building ORM objects.
+
+    The (key, row index, formatter) of every column is resolved once, sorted by key, and a row
+    is converted with a single dict comprehension over that list. Keys are emitted sorted, like
+    jsonify(), so responses are unchanged byte for byte apart from whitespace.
+    """
+
+    def __init__(self, columns):
+        """
+        Args:
+            - columns (list): (key, formatter) per selected column in query order. 'formatter' is None
+              to output the value as is, or a function applied to it, e.g. str for timestamps.
+        """
+
+        self.keys = tuple(key for key, _ in columns)
+        self.fields = tuple(sorted((key, index, formatter) for index, (key, formatter) in enumerate(columns)))
+
+    def to_dict(self, row):
+        return {key: row[index] if formatter is None else formatter(row[index]) for key, index, formatter in self.fields}
+
+    def encode(self, rows):
+        """Return the JSON array of 'rows' as bytes."""
+
+        to_dict = self.to_dict
+        return _dumps([to_dict(row) for row in rows])
+
+    def response(self, rows, status=200):
+        return Response(self.encode(rows), status=status, mimetype='application/json')
+
+    def page_response(self, rows, nextCursor):
+        """Response of one page: {"items": [...], "nextCursor": key of the last row or null}."""
+
+        body = b'{"items":' + self.encode(rows) + b',"nextCursor":' + _dumps(nextCursor) + b'}'
+        return Response(body, status=200, mimetype='application/json')
+
+    def stream(self, rowChunks):
+        """
+        Generator of a JSON array body, encoded chunk by chunk.
+
+        Args:
+            - rowChunks (iterable): Lists of rows, e.g. Result.partitions().
+        """
+
+        yield b'['
+        first = True
+        for rows in rowChunks:
+            if not rows:
+                continue
+            encoded = self.encode(rows)
+            yield encoded[1:-1] if first else b',' + encoded[1:-1]
+            first = False
+        yield b']'
+
+    def stream_response(self, app, db, statement, chunkRows=streamChunkRows):
+        """
+        Response streaming the rows of 'statement', only one chunk of rows is held in memory.
+
+        Args:
+            - app (Flask): The Flask application object.
+            - db (SQLAlchemy): The Flask-SQLAlchemy object the statement is executed with.
+            - statement (Select): Column query whose columns match the serializer.
+            - chunkRows (int): Rows fetched and encoded per chunk.
+
+        Note:
+            - The query runs while the body is sent, an error then can only cut the response short.
+        """
+
+        def generate():
+            with app.app_context():
+                result = db.session.execute(statement.execution_options(yield_per=chunkRows))
+                yield from self.stream(result.partitions())
+
+        return Response(generate(), status=200, mimetype='application/json')
+
+
+# Serializers of the listing functions in dbFunctions.
+espColumns = RowSerializer([
+    ('DeviceIndex', None),
+    ('DeviceID', None),
+    ('RegistrationTime', str),
+    ('LastActiveTime', str),
+    ('Assigned', None),
+    ('Registered', None),
+    ('MacAddress', None),
+    ('Room', None),
+])
+assignedEspColumns = RowSerializer([
+    ('DeviceIndex', None),
+    ('DeviceID', None),
+    ('RegistrationTime', http_date_or_none),
+    ('LastActiveTime', http_date_or_none),
+    ('Assigned', None),
+    ('Registered', None),
+    ('MacAddress', None),
+    ('Room', None),
+    ('Username', None),
+    ('UserID', None),
+])
+topicColumns = RowSerializer([
+    ('TopicID', None),
+    ('Title', None),
+    ('Description', None),
+    ('StartTime', str),
+    ('EndTime', str),
+    ('Room', None),
+])
+voteColumns = RowSerializer([
+    ('VoteID', None),
+    ('UserID', None),
+    ('VoteType', None),
+    ('TopicID', None),
+    ('VoteTime', str),
+])
+voteWithUsernameColumns = RowSerializer([
+    ('VoteID', None),
+    ('UserID', None),
+    ('VoteType', None),
+    ('TopicID', None),
+    ('VoteTime', str),
+    ('Username', None),
+])
@@ -1,33 +1,117 @@
 from datetime import datetime
+import atexit
 import os
+import queue
+import threading
+import time
+
+# Log levels, messages below the current level are dropped before they are formatted.
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+_levelNames = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+logLevel = INFO
+debugEnabled = False  # Cheap guard for call sites that build expensive debug messages.
+
+# Buffered writer settings.
+flushIntervalSec = 0.5  # Queued messages are written at least this often.
+maxQueueSize = 100000  # Messages logged while the queue is full are dropped and counted.
+maxBatchSize = 5000  # Maximum number of messages written with one write call.
+maxLogFileBytes = 10 * 1024 * 1024  # Start a new log file once the current one exceeds this size.
+maxLogFileAgeSec = 24 * 60 * 60  # Start a new log file once the current one is older than this.
 
 # Check if the log folder exists, if not create it.
 folder_path = "Logs/"
 if not os.path.exists(folder_path):
     os.makedirs(folder_path)
 
-# Create logfile name with timestamp.
-# This log file will be used until the server is restarted.
-current_logfile_name = "FlaskLog-" + str(datetime.now().strftime("%d-%m-%Y-%H-%M-%S")) + ".txt" 
 log_folder = "Logs/"
 
+_queue = queue.SimpleQueue()
+_flushRequest = object()  # Queue marker, the flusher sets the attached event once everything before it is written.
+_thread = None
+_threadLock = threading.Lock()
+_logFile = None
+_logFileOpened = 0.0
+droppedMessages = 0
+
+# strftime is only called once per second, the formatted timestamp is reused in between.
+_timestampSecond = None
+_timestampText = ''
+
+
+def _open_new_logfile():
+    """
+    Create a new log file with a timestamped name and make it the current log file.
+    This log file will be used until it is rotated or the server is restarted.
+    """
+
+    global current_logfile_name, _logFile, _logFileOpened
+
+    if _logFile is not None:
+        _logFile.close()
+
+    current_logfile_name = "FlaskLog-" + str(datetime.now().strftime("%d-%m-%Y-%H-%M-%S")) + ".txt"
+    suffix = 1
+    while os.path.exists(log_folder + current_logfile_name):
+        current_logfile_name = "FlaskLog-" + str(datetime.now().strftime("%d-%m-%Y-%H-%M-%S")) + f"-{suffix}.txt"
+        suffix += 1
+
+    _logFile = open(log_folder + current_logfile_name, 'w')
+    _logFile.write(f'Timestamp format: DD-MM-YYYY  HH-MM-SS:\n')
+    _logFile.write(f'Log file created at: {datetime.now().strftime("%d-%m-%Y  %H-%M-%S")}\n')
+    _logFile.flush()
+    _logFileOpened = time.monotonic()
+
+
 # Initialize the log file.
-with open(log_folder + current_logfile_name, 'w') as logFile:
-    logFile.write(f'Timestamp format: DD-MM-YYYY  HH-MM-SS:\n')
-    logFile.write(f'Log file created at: {datetime.now().strftime("%d-%m-%Y  %H-%M-%S")}\n')
+_open_new_logfile()
+
 
+def setLevel(level):
+    """
+    Set the minimum level of messages written to the log.
 
-def log(message):
+    Args:
+        - level (int): One of DEBUG, INFO, WARNING or ERROR.
+    """
+
+    global logLevel, debugEnabled
+    logLevel = level
+    debugEnabled = level <= DEBUG
+
+
+def log(message, *args, level=INFO):
     """
     Append a timestamped message to the current log file.
     The function automatically appends a timestamp to the message.
+    The message is queued and written by a background thread.
 
     Args:
-        - message (str): The log message to be appended.
+        - message (str): The log message to be appended. If 'args' are given it is formatted as 'message % args' when written.
+        - level (int): The level of the message, messages below the current log level are ignored.
     """
 
-    with open(log_folder + current_logfile_name, 'a') as logFile:
-        logFile.write(f'{datetime.now().strftime("%d-%m-%Y  %H-%M-%S")}: {message}\n')
+    if level < logLevel:
+        return
+    _enqueue((None, level, time.time(), message, args))
+    return
+
+
+def debug(message, *args):
+    """
+    Append a debug message to the current log file.
+    Pass the values as 'args' instead of formatting the message so disabled debug logging costs nothing.
+
+    Args:
+        - message (str): The log message, formatted as 'message % args' when written.
+    """
+
+    if not debugEnabled:
+        return
+    _enqueue((None, DEBUG, time.time(), message, args))
     return
 
 
@@ -42,6 +126,109 @@ def custom_log(logfile_name, message, logfile_path = ""):
         - logfile_path (str): The optional path to the directory containing the log file. Defaults to the root directory.
     """
 
-    with open(logfile_path + logfile_name, 'a') as logFile:
-        logFile.write(f'{datetime.now().strftime("%d-%m-%Y  %H-%M-%S")}: {message}\n')
-    return
\ No newline at end of file
+    _enqueue((logfile_path + logfile_name, INFO, time.time(), message, ()))
+    return
+
+
+def flush(timeout=5):
+    """Block until every message logged before this call has been written."""
+
+    if _thread is None:
+        return
+    written = threading.Event()
+    _queue.put((_flushRequest, written))
+    written.wait(timeout)
+
+
+def stats():
+    return {
+        'queueDepth': _queue.qsize(),
+        'droppedMessages': droppedMessages,
+        'currentLogFile': current_logfile_name,
+    }
+
+
+def _enqueue(record):
+    global droppedMessages
+    if _thread is None:
+        _start()
+    if _queue.qsize() >= maxQueueSize:
+        droppedMessages += 1
+        return
+    _queue.put(record)
+
+
+def _start():
+    global _thread
+    with _threadLock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name='LogHandler', daemon=True)
+            _thread.start()
+            atexit.register(flush)
+
+
+def _timestamp(recordTime):
+    global _timestampSecond, _timestampText
+    second = int(recordTime)
+    if second != _timestampSecond:
+        _timestampText = datetime.fromtimestamp(second).strftime("%d-%m-%Y  %H-%M-%S")
+        _timestampSecond = second
+    return _timestampText
+
+
+def _format(level, recordTime, message, args):
+    if args:
+        try:
+            message = message % args
+        except Exception as errorMsg:
+            message = f'{message} {args} (log format error: {errorMsg})'
+    if level == INFO:
+        return f'{_timestamp(recordTime)}: {message}\n'
+    return f'{_timestamp(recordTime)}: {_levelNames.get(level, level)}: {message}\n'
+
+
+def _run():
+    while True:
+        batch = [_queue.get()]
+        # Give other threads the flush interval to add to the batch, then take everything queued.
+        deadline = time.monotonic() + flushIntervalSec
+        while batch[-1][0] is not _flushRequest and len(batch) < maxBatchSize:
+            try:
+                batch.append(_queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        try:
+            _write_batch(batch)
+        except Exception:
+            # Logging must never take the server down, the batch is lost.
+            pass
+
+
+def _write_batch(batch):
+    mainLines = []
+    customLines = {}
+    flushEvents = []
+
+    for record in batch:
+        if record[0] is _flushRequest:
+            flushEvents.append(record[1])
+            continue
+        target, level, recordTime, message, args = record
+        if target is None:
+            mainLines.append(_format(level, recordTime, message, args))
+        else:
+            customLines.setdefault(target, []).append(_format(level, recordTime, message, args))
+
+    try:
+        if mainLines:
+            if _logFile.tell() > maxLogFileBytes or time.monotonic() - _logFileOpened > maxLogFileAgeSec:
+                _open_new_logfile()
+            _logFile.write(''.join(mainLines))
+            _logFile.flush()
+
+        for target, lines in customLines.items():
+            with open(target, 'a') as logFile:
+                logFile.write(''.join(lines))
+    finally:
+        for written in flushEvents:
+            written.set()
@@ -0,0 +1,215 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+# Prometheus metrics of the server, exported in the text exposition format at /metrics.
+#
+# Updates take no lock: every thread adds to its own slot (keyed by its Thread object) and only the
+# scrape sums the slots. The scrape folds the slots of finished threads into a retired total, so the
+# slots stay as many as the running threads (Flask starts one per request) and totals never go down.
+# A finished thread never writes again, so moving its slot does not race with an update.
+
+defaultBuckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_metrics = []  # Every metric created, in export order.
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelNames, labelValues, extra=()):
+    pairs = list(zip(labelNames, labelValues)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _finished_threads(slots):
+    return [thread for thread in list(slots) if not thread.is_alive()]
+
+
+class _CounterChild:
+    __slots__ = ('_values', '_retired', '_lock')
+
+    def __init__(self):
+        self._values = {}  # Thread -> count
+        self._retired = 0  # Count of finished threads.
+        self._lock = threading.Lock()  # Only taken by the scrape.
+
+    def inc(self, amount=1):
+        thread = threading.current_thread()
+        self._values[thread] = self._values.get(thread, 0) + amount
+
+    def value(self):
+        with self._lock:
+            for thread in _finished_threads(self._values):
+                self._retired += self._values.pop(thread)
+            return self._retired + sum(list(self._values.values()))
+
+
+class _HistogramChild:
+    __slots__ = ('_buckets', '_slots', '_retired', '_lock')
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._slots = {}  # Thread -> [count per bucket..., +Inf count, sum]
+        self._retired = [0] * (len(buckets) + 1) + [0.0]  # Slot of finished threads.
+        self._lock = threading.Lock()  # Only taken by the scrape.
+
+    def observe(self, value):
+        thread = threading.current_thread()
+        slot = self._slots.get(thread)
+        if slot is None:
+            slot = self._slots[thread] = [0] * (len(self._buckets) + 1) + [0.0]
+        slot[bisect_left(self._buckets, value)] += 1
+        slot[-1] += value
+
+    def snapshot(self):
+        """Return (cumulative bucket counts including +Inf, sum)."""
+
+        with self._lock:
+            for thread in _finished_threads(self._slots):
+                for index, value in enumerate(self._slots.pop(thread)):
+                    self._retired[index] += value
+            totals = list(self._retired)
+            for slot in list(self._slots.values()):
+                for index, value in enumerate(slot):
+                    totals[index] += value
+        cumulative = []
+        running = 0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-1]
+
+
+class _Metric:
+    """A metric and its children, one per combination of label values. Subclasses define the metric type."""
+
+    metricType = None
+
+    def __init__(self, name, documentation, labelNames=()):
+        if self.metricType is None:
+            raise TypeError(f'{type(self).__name__} is not a metric type, use Counter or Histogram.')
+        self.name = name
+        self.documentation = documentation
+        self.labelNames = tuple(labelNames)
+        self._children = {}  # Label values -> child
+        self._lock = threading.Lock()
+        _metrics.append(self)
+        if not self.labelNames:
+            self.labels()  # Export unlabelled metrics from the start.
+
+    def labels(self, *labelValues):
+        """Return the child of the given label values, created on first use."""
+
+        child = self._children.get(labelValues)
+        if child is None:
+            if len(labelValues) != len(self.labelNames):
+                raise ValueError(f'{self.name} expects labels {self.labelNames}, got {labelValues}.')
+            with self._lock:
+                child = self._children.setdefault(labelValues, self._new_child())
+        return child
+
+    def _new_child(self):
+        """Return a new child holding the value of one combination of label values."""
+
+        raise TypeError(f'{type(self).__name__} does not define _new_child().')
+
+    def _render_child(self, labelValues, child):
+        """Return the exposition lines of one child."""
+
+        raise TypeError(f'{type(self).__name__} does not define _render_child().')
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metricType}']
+        for labelValues, child in sorted(list(self._children.items())):
+            lines.extend(self._render_child(labelValues, child))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic counter, e.g. messages received per route."""
+
+    metricType = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_child(self, labelValues, child):
+        return [f'{self.name}{_format_labels(self.labelNames, labelValues)} {_format_value(child.value())}']
+
+
+class Histogram(_Metric):
+    """Distribution of observed values, e.g. latencies in seconds."""
+
+    metricType = 'histogram'
+
+    def __init__(self, name, documentation, labelNames=(), buckets=defaultBuckets):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelNames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, labelValues, child):
+        cumulative, total = child.snapshot()
+        lines = []
+        for bound, count in zip(self.buckets + (float('inf'),), cumulative):
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelNames, labelValues, [("le", _format_value(bound))])} {count}')
+        labels = _format_labels(self.labelNames, labelValues)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {cumulative[-1]}')
+        return lines
+
+
+def render():
+    """Return all metrics in the Prometheus text exposition format."""
+
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def timed(histogram):
+    """Decorator observing the run time of the decorated function in 'histogram', labelled with the function name."""
+
+    def decorator(function):
+        child = histogram.labels(function.__name__)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+# Metrics of the server.
+mqttMessagesReceived = Counter('mqtt_messages_received_total', 'MQTT messages received, by route.', ['route'])
+mqttDecodeFailures = Counter('mqtt_decode_failures_total', 'MQTT payloads that were not valid JSON.')
+mqttDroppedMessages = Counter('mqtt_dropped_messages_total', 'MQTT messages dropped because the queue of their worker was full, by route.', ['route'])
+mqttInvalidMessages = Counter('mqtt_invalid_messages_total', 'MQTT payloads rejected by the message schema, by route and reason (json or schema).', ['route', 'reason'])
+mqttPublishFailures = Counter('mqtt_publish_failures_total', 'MQTT publish attempts that failed or were rejected by the full publish queue, by topic prefix.', ['topic'])
+mqttPublishSeconds = Histogram('mqtt_publish_seconds', 'Time from queueing an MQTT message to its PUBACK (QoS 0: to the hand-off to the client), by topic prefix.', ['topic'])
+votes = Counter('votes_total', 'Votes received over MQTT, by outcome.', ['outcome'])
+dbCallSeconds = Histogram('db_call_seconds', 'Run time of dbFunctions calls, by function.', ['function'])
+httpRequestSeconds = Histogram('http_request_seconds', 'HTTP request latency, by route, method and status.', ['route', 'method', 'status'])
@@ -0,0 +1,197 @@
+import atexit
+import queue
+import threading
+import time
+from isdProjectImports import logHandler
+
+_STOP = object()  # Queue sentinel that makes the batcher flush and exit.
+_DRAIN = object()  # Queue key that makes the batcher flush and set the event queued as its value.
+
+
+class MicroBatcher:
+    """
+    Collects items on a bounded queue and hands them to 'flush' in micro-batches.
+
+    A background thread drains the queue and keeps one value per key, the latest one wins. A batch is
+    flushed when it holds 'batchSize' keys or 'windowMs' after its first item, whichever comes first.
+    flush(batch) gets the batch as a dict key -> value in arrival order and returns (result, status).
+    A batch whose flush fails is retried with backoff up to 'maxRetries' times. The handlers registered
+    with '@batcher.on_flushed' are called with (batch, result) after a successful flush, those registered
+    with '@batcher.on_dropped' with the batch that still failed.
+    """
+
+    def __init__(self, flush, name, batchSize=200, windowMs=50, maxQueueSize=10000, maxRetries=3):
+        self.flush = flush
+        self.name = name
+        self.batchSize = batchSize
+        self.window = windowMs / 1000
+        self.maxRetries = maxRetries
+        self._queue = queue.Queue(maxsize=maxQueueSize)
+        self._flushedHandlers = []
+        self._droppedHandlers = []
+        self._thread = None
+
+        # Metrics.
+        self.receivedItems = 0
+        self.coalescedItems = 0
+        self.rejectedItems = 0
+        self.flushedItems = 0
+        self.failedItems = 0
+        self.batches = 0
+        self.lastBatchSize = 0
+        self.maxBatchSize = 0
+        self.lastFlushMs = 0.0
+
+    def on_flushed(self, handler):
+        """Decorator registering handler(batch, result), called after every batch that was flushed."""
+
+        self._flushedHandlers.append(handler)
+        return handler
+
+    def on_dropped(self, handler):
+        """Decorator registering handler(batch), called with a batch that still failed after 'maxRetries' attempts."""
+
+        self._droppedHandlers.append(handler)
+        return handler
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        logHandler.log(f'{self.name} started, batchSize: {self.batchSize}, window: {self.window}s')
+
+    def submit(self, key, value=None, timeout=None):
+        """
+        Queue an item, it replaces the value of 'key' if the key is already in the current batch.
+
+        Args:
+            - timeout (float or None): Seconds to wait for room in a full queue, None rejects at once.
+
+        Returns:
+            - bool: True if the item was queued, False if the queue is full.
+        """
+
+        try:
+            if timeout is None:
+                self._queue.put_nowait((key, value))
+            else:
+                self._queue.put((key, value), timeout=timeout)
+            return True
+        except queue.Full:
+            self.rejectedItems += 1
+            return False
+
+    def drain(self, timeout=5):
+        """
+        Wait until every item queued before the call has been flushed (or dropped).
+
+        Returns:
+            - bool: True if the items were flushed, False on timeout or when the batcher is not running.
+        """
+
+        if self._thread is None or threading.current_thread() is self._thread:
+            return False
+        done = threading.Event()
+        try:
+            self._queue.put((_DRAIN, done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stop(self, timeout=10):
+        """Flush every queued item and stop the batcher thread."""
+
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        logHandler.log(f'{self.name} stopped, flushed: {self.flushedItems}, failed: {self.failedItems}')
+
+    def stats(self):
+        return {
+            'queueDepth': self._queue.qsize(),
+            'maxQueueSize': self._queue.maxsize,
+            'received': self.receivedItems,
+            'coalesced': self.coalescedItems,
+            'rejected': self.rejectedItems,
+            'flushed': self.flushedItems,
+            'failed': self.failedItems,
+            'batches': self.batches,
+            'lastBatchSize': self.lastBatchSize,
+            'maxBatchSize': self.maxBatchSize,
+            'lastFlushMs': round(self.lastFlushMs, 3),
+        }
+
+    def _run(self):
+        pending = {}  # Key -> value, latest value of the window wins.
+        deadline = None
+        stopping = False
+
+        while not stopping:
+            timeout = None if not pending else max(0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            # Drain whatever is already queued without blocking.
+            while item is not None:
+                if item is _STOP:
+                    stopping = True
+                    break
+
+                key, value = item
+                if key is _DRAIN:
+                    if pending:
+                        self._flush(pending)
+                        pending = {}
+                    value.set()
+                else:
+                    self.receivedItems += 1
+                    if key in pending:
+                        self.coalescedItems += 1
+                    elif not pending:
+                        deadline = time.monotonic() + self.window
+                    pending[key] = value
+
+                    # Stop draining at the deadline too, keys that keep coalescing would otherwise hold the batch below batchSize.
+                    if len(pending) >= self.batchSize or time.monotonic() >= deadline:
+                        break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            if pending and (stopping or len(pending) >= self.batchSize or time.monotonic() >= deadline):
+                self._flush(pending)
+                pending = {}
+
+    def _flush(self, batch):
+        for attempt in range(1, self.maxRetries + 1):
+            start = time.perf_counter()
+            result, status = self.flush(batch)
+            if status:
+                self.lastFlushMs = (time.perf_counter() - start) * 1000
+                self.batches += 1
+                self.flushedItems += len(batch)
+                self.lastBatchSize = len(batch)
+                self.maxBatchSize = max(self.maxBatchSize, len(batch))
+                self._call_handlers(self._flushedHandlers, batch, result)
+                return
+
+            logHandler.log(f'{self.name}._flush(), batch of {len(batch)} failed (attempt {attempt}/{self.maxRetries}): {result}')
+            time.sleep(0.1 * 2 ** (attempt - 1))
+
+        self.failedItems += len(batch)
+        logHandler.log(f'{self.name}._flush(), dropped a batch of {len(batch)}: {batch}')
+        self._call_handlers(self._droppedHandlers, batch)
+
+    def _call_handlers(self, handlers, *args):
+        for handler in handlers:
+            try:
+                handler(*args)
+            except Exception as errorMsg:
+                logHandler.log(f'{self.name}._flush(), handler {handler.__name__} failed: {errorMsg}')
@@ -0,0 +1,137 @@
+import atexit
+import queue
+import threading
+import time
+import zlib
+from isdProjectImports import logHandler
+from isdProjectImports import metrics
+
+_STOP = object()  # Queue sentinel that makes a worker exit.
+
+
+class RouteStats:
+    """Queue latency and handler time counters of one message route."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.errors = 0
+        self.dropped = 0
+        self.queueLatencyTotal = 0.0
+        self.queueLatencyMax = 0.0
+        self.handlerTimeTotal = 0.0
+        self.handlerTimeMax = 0.0
+
+    def record(self, queueLatency, handlerTime, failed):
+        with self._lock:
+            self.messages += 1
+            if failed:
+                self.errors += 1
+            self.queueLatencyTotal += queueLatency
+            self.handlerTimeTotal += handlerTime
+            if queueLatency > self.queueLatencyMax:
+                self.queueLatencyMax = queueLatency
+            if handlerTime > self.handlerTimeMax:
+                self.handlerTimeMax = handlerTime
+
+    def recordDropped(self):
+        with self._lock:
+            self.dropped += 1
+
+    def asDict(self):
+        messages = self.messages or 1
+        return {
+            'messages': self.messages,
+            'errors': self.errors,
+            'dropped': self.dropped,
+            'avgQueueLatencyMs': round(self.queueLatencyTotal / messages * 1000, 3),
+            'maxQueueLatencyMs': round(self.queueLatencyMax * 1000, 3),
+            'avgHandlerTimeMs': round(self.handlerTimeTotal / messages * 1000, 3),
+            'maxHandlerTimeMs': round(self.handlerTimeMax * 1000, 3),
+        }
+
+
+class MessageDispatcher:
+    """
+    Runs MQTT message handlers on a pool of worker threads.
+
+    Every worker owns its own queue and a message is placed on the queue picked by a
+    hash of its ordering key (DeviceID or MAC address). Messages with the same key are
+    therefore handled in arrival order while different devices are handled in parallel.
+    """
+
+    def __init__(self, workerCount=4, maxQueueSize=1000):
+        self.workerCount = workerCount
+        self._queues = [queue.Queue(maxsize=maxQueueSize) for _ in range(workerCount)]
+        self._threads = []
+        self._routeStats = {}
+        self._routeStatsLock = threading.Lock()
+
+    def start(self):
+        if self._threads:
+            return
+        for index, workerQueue in enumerate(self._queues):
+            thread = threading.Thread(target=self._run, args=(workerQueue,), name=f'MqttWorker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        atexit.register(self.stop)
+        logHandler.log(f'MessageDispatcher started with {self.workerCount} workers.')
+
+    def submit(self, routeName, key, handler, *args, **kwargs):
+        """
+        Queue 'handler(*args, **kwargs)' on the worker that owns 'key'.
+        Never blocks: the caller is the MQTT network loop, which must keep reading and sending keepalives.
+
+        Returns:
+            - bool: True if the message was queued, False if it was dropped because that worker's queue is full.
+        """
+
+        workerQueue = self._queues[zlib.crc32(key.encode('utf-8')) % self.workerCount]
+        try:
+            workerQueue.put_nowait((routeName, handler, args, kwargs, time.perf_counter()))
+            return True
+        except queue.Full:
+            self._getRouteStats(routeName).recordDropped()
+            metrics.mqttDroppedMessages.labels(routeName).inc()
+            return False
+
+    def stop(self, timeout=10):
+        """Handle every queued message and stop the workers."""
+
+        if not self._threads:
+            return
+        for workerQueue in self._queues:
+            workerQueue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self):
+        return {
+            'workers': self.workerCount,
+            'queueDepths': [workerQueue.qsize() for workerQueue in self._queues],
+            'routes': {routeName: routeStats.asDict() for routeName, routeStats in self._routeStats.items()},
+        }
+
+    def _getRouteStats(self, routeName):
+        routeStats = self._routeStats.get(routeName)
+        if routeStats is None:
+            with self._routeStatsLock:
+                routeStats = self._routeStats.setdefault(routeName, RouteStats())
+        return routeStats
+
+    def _run(self, workerQueue):
+        while True:
+            item = workerQueue.get()
+            if item is _STOP:
+                return
+
+            routeName, handler, args, kwargs, enqueueTime = item
+            start = time.perf_counter()
+            failed = False
+            try:
+                handler(*args, **kwargs)
+            except Exception as errorMsg:
+                failed = True
+                logHandler.log(f'MessageDispatcher, {routeName} handler failed. Error: {errorMsg}')
+            self._getRouteStats(routeName).record(start - enqueueTime, time.perf_counter() - start, failed)
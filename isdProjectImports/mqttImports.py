@@ -3,6 +3,10 @@ import json
 import random
 from datetime import datetime
 from isdProjectImports import logHandler
+from isdProjectImports import topicRouter
+from isdProjectImports import metrics
+from isdProjectImports import subscriptionManager
+from isdProjectImports import publishQueue
 
 mqttBrokerPort = 1883
 mqttKeepAliveSec = 10
@@ -13,15 +17,32 @@ mqtt = Mqtt()
 
 # Topics
 # Registration topics
-registrationIncomingTopic = '/registration/Server/#' # + mac address, ESPs will start registration with this topic.
+registrationIncomingTopic = '/registration/Server/<macAddress>' # ESPs will start registration with this topic.
 registrationResponeTopic = '/registration/esp/'  # + mac address, server will respond to ESPs with this topic.
+deviceTopic = '/registration/ESP/<deviceID>'  # Topic of a registered ESP, subscribed for all ESPs with one wildcard.
 # VoteSetup topics
-voteSetupTopic = '/setupVote/Setup'  # Vote information is posted here.
+voteSetupTopic = '/setupVote/Setup'  # Vote information of the default room is posted here, of other rooms to '/setupVote/Setup/<room>'.
 voteResyncTopic = '/setupVote/Resync'  # ESPs will request resync with this topic.
 # Vote topics
-voteIncomingTopic = '/vote/#'  # + votingID, ESPs will send votes to this topic.
+voteIncomingTopic = '/vote/<deviceID>'  # ESPs will send votes to this topic.
+voteRejectedTopic = '/vote/rejected/'  # + deviceID, server tells an ESP that its vote was dropped and should be sent again.
 
-initialSubscribeTopics = [registrationIncomingTopic, voteResyncTopic, voteIncomingTopic] 
+# Incoming topics are routed to handlers registered with '@router.route(topic)'.
+router = topicRouter.TopicRouter()
+
+# Subscription filters of all registered routes, filled in as handlers are registered.
+initialSubscribeTopics = router.subscriptions
+
+# All subscriptions of the server, restored in batches when the client (re)connects.
+subscriptions = subscriptionManager.SubscriptionManager(mqtt, qos=mqttQoSLevel, routeFilters=router.subscriptions)
+
+# Outbound messages, published by the publisher thread started in main. First matching filter wins.
+# The vote state is retained so ESPs receive it when they (re)subscribe instead of requesting a resync,
+# bursts of state messages are collapsed to one message per 200 ms.
+publishPolicies = [
+    (voteSetupTopic + '/#', publishQueue.PublishPolicy(qos=mqttQoSLevel, retain=True, coalesceMs=200)),
+]
+publisher = publishQueue.PublishQueue(mqtt, publishPolicies, defaultPolicy=publishQueue.PublishPolicy(qos=mqttQoSLevel))
 
 # Decodes JSON string to Python dictionary.
 def decodeStringToJSON(json_string):
@@ -29,6 +50,7 @@ def decodeStringToJSON(json_string):
         decodedMessage = json.loads(json_string)
         return decodedMessage
     except json.decoder.JSONDecodeError as error:
+        metrics.mqttDecodeFailures.inc()
         logHandler.log(f'JSON decode error: {error}')
         return -1
 
@@ -54,13 +76,14 @@ def validateKeywordsInJSON(decodedJSON, keywordList, verifycationLevel):
         raise ValueError("Invalid verification level. Please provide either 1 or 2.")
 
 
-# Publishes 'message' to MQTT 'topic'.
-def publishJSONtoMQTT(topic, message):
-    try:
-        mqtt.publish(topic, message, qos=mqttQoSLevel)
-    except:
-        
-        logHandler.log(f'publishJSONtoMQTT: Failed to publish message: {message} to topic: {topic}')
-        return False
-    else:
-        return True
+# Setup topic of 'room', ESPs subscribe to the topic of their room. The default room (None) keeps '/setupVote/Setup'.
+def voteSetupTopicOf(room):
+    if room is None:
+        return voteSetupTopic
+    return f'{voteSetupTopic}/{room}'
+
+
+# Queues 'message' (a dict or a JSON string) for MQTT 'topic', returns False if the publish queue is full.
+# Coalesced messages with the same 'key' (default: the topic) replace each other while queued.
+def publishJSONtoMQTT(topic, message, key=None):
+    return publisher.publish(topic, message, key)
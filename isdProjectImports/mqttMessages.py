@@ -0,0 +1,113 @@
+import json
+
+# orjson decodes straight from bytes and is several times faster than json, used when installed.
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    orjson = None
+    _loads = json.loads
+
+_missing = object()
+
+
+def _scalar_text(value):
+    """JSON spelling of a number or boolean, e.g. 1 -> '1', True -> 'true'."""
+
+    if type(value) is bool:
+        return 'true' if value else 'false'
+    return str(value)
+
+
+class MessageError(ValueError):
+    """Raised when a payload is not valid JSON ('json') or does not match the schema ('schema')."""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+class MessageSchema:
+    """
+    Base class of the MQTT payload schemas.
+
+    Subclasses list their required fields and types in 'fields' and the same names in '__slots__'.
+    decode() parses the raw payload bytes and checks every field in one pass, so a handler only
+    ever receives a complete message object.
+    """
+
+    __slots__ = ()
+    fields = {}  # Field name -> type (or tuple of types)
+    scalarFields = ()  # str fields that also accept a number or boolean, converted with _scalar_text().
+    requireObject = True  # False accepts any JSON value, e.g. messages whose content is ignored.
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fieldItems = tuple(cls.fields.items())
+
+    @classmethod
+    def decode(cls, payload):
+        """
+        Decode and validate 'payload'.
+
+        Args:
+            - payload (bytes): The raw MQTT payload.
+
+        Returns:
+            - MessageSchema: An instance of the schema with the fields set as attributes.
+
+        Raises:
+            - MessageError: If the payload is not valid JSON or a field is missing or has a wrong type.
+        """
+
+        try:
+            data = _loads(payload)
+        except ValueError as error:  # json.JSONDecodeError, orjson.JSONDecodeError and UnicodeDecodeError.
+            raise MessageError('json', f'Invalid JSON: {error}') from None
+
+        message = object.__new__(cls)
+        if type(data) is not dict:
+            if cls.requireObject:
+                raise MessageError('schema', f'{cls.__name__} expects a JSON object, got {type(data).__name__}.')
+            return message
+
+        for name, fieldType in cls._fieldItems:
+            value = data.get(name, _missing)
+            if value is _missing:
+                raise MessageError('schema', f'{cls.__name__} is missing field {name}.')
+            if not isinstance(value, fieldType):
+                if name in cls.scalarFields and type(value) in (int, float, bool):
+                    setattr(message, name, _scalar_text(value))
+                    continue
+                raise MessageError('schema', f'{cls.__name__} field {name} must be {fieldType}, got {type(value).__name__}.')
+            setattr(message, name, value)
+        return message
+
+    def __repr__(self):
+        values = ', '.join(f'{name}={getattr(self, name)!r}' for name, _ in self._fieldItems)
+        return f'{type(self).__name__}({values})'
+
+
+class VoteMessage(MessageSchema):
+    """
+    Vote of an ESP, '/vote/<deviceID>': {"VoteTitle": "...", "vote": "..."}
+    Older firmware sends numeric or boolean votes, they are stored as text like before, e.g. 1 as '1'.
+    """
+
+    __slots__ = ('VoteTitle', 'vote')
+    fields = {'VoteTitle': str, 'vote': str}
+    scalarFields = ('vote',)
+
+
+class RegistrationMessage(MessageSchema):
+    """Registration request of an ESP, '/registration/Server/<macAddress>'. The content is not used."""
+
+    __slots__ = ()
+    requireObject = False
+
+
+class ResyncMessage(MessageSchema):
+    """Resync request, '/setupVote/Resync'. The content is not used, so any JSON value is accepted."""
+
+    __slots__ = ()
+    requireObject = False
@@ -0,0 +1,138 @@
+from datetime import datetime
+
+# Keyset pagination of the listing endpoints.
+# A page is requested with 'limit' and continues after the key ('after') of the last row of the
+# previous page, e.g. /api/getTopics?limit=100&after=2300. The next page is found with an index
+# range scan on the key, so its cost does not depend on how many rows come before it.
+
+defaultLimit = 100
+maxLimit = 1000
+timeFormat = '%Y-%m-%d %H:%M:%S'
+
+
+class PageRequest:
+    """Pagination and filter parameters of a listing request, None means not given."""
+
+    __slots__ = ('limit', 'after', 'since', 'until', 'assigned', 'registered')
+
+    def __init__(self, limit=None, after=None, since=None, until=None, assigned=None, registered=None):
+        self.limit = limit
+        self.after = after
+        self.since = since
+        self.until = until
+        self.assigned = assigned
+        self.registered = registered
+
+
+def _parse_bool(name, value):
+    if value.lower() in ('1', 'true'):
+        return True
+    if value.lower() in ('0', 'false'):
+        return False
+    raise ValueError(f'{name} must be true or false.')
+
+
+def _parse_time(name, value):
+    try:
+        return datetime.strptime(value, timeFormat)
+    except ValueError:
+        raise ValueError(f'{name} must be formatted as YYYY-MM-DD HH:MM:SS.') from None
+
+
+def parse_page_request(args):
+    """
+    Read the pagination parameters from the query string.
+
+    Args:
+        - args (MultiDict): request.args with the optional parameters:
+            - limit (int): Page size, 1 to maxLimit. Without it the full list is returned.
+            - after (int): Key of the last row of the previous page.
+            - since, until (str): Time range 'YYYY-MM-DD HH:MM:SS', inclusive.
+            - assigned, registered (bool): ESP state filters.
+
+    Returns:
+        - PageRequest or None: None if no parameter is given.
+
+    Raises:
+        - ValueError: If a parameter is invalid.
+    """
+
+    if not any(name in args for name in PageRequest.__slots__):
+        return None
+
+    page = PageRequest()
+    if 'limit' in args:
+        try:
+            page.limit = int(args['limit'])
+        except ValueError:
+            raise ValueError('limit must be an integer.') from None
+        if not 1 <= page.limit <= maxLimit:
+            raise ValueError(f'limit must be between 1 and {maxLimit}.')
+    if 'after' in args:
+        try:
+            page.after = int(args['after'])
+        except ValueError:
+            raise ValueError('after must be an integer.') from None
+        if page.limit is None:
+            page.limit = defaultLimit
+    if 'since' in args:
+        page.since = _parse_time('since', args['since'])
+    if 'until' in args:
+        page.until = _parse_time('until', args['until'])
+    if 'assigned' in args:
+        page.assigned = _parse_bool('assigned', args['assigned'])
+    if 'registered' in args:
+        page.registered = _parse_bool('registered', args['registered'])
+    return page
+
+
+def apply(statement, page, keyColumn, timeColumn=None, assignedColumn=None, registeredColumn=None):
+    """
+    Add the filters and the keyset page of 'page' to a select statement.
+
+    Args:
+        - statement (Select): The listing query, its first column must be 'keyColumn'.
+        - page (PageRequest or None): The parameters, None returns the statement unchanged.
+        - keyColumn (Column): Unique, indexed column the pages are ordered by (the primary key).
+        - timeColumn (Column): Column filtered by 'since'/'until'.
+        - assignedColumn, registeredColumn (Column): Columns filtered by 'assigned'/'registered'.
+
+    Raises:
+        - ValueError: If a filter is given that the listing does not support.
+
+    Note:
+        - One row more than 'limit' is selected to find out if there is a next page, see page_rows().
+    """
+
+    if page is None:
+        return statement
+
+    filters = ((timeColumn, 'since', page.since), (timeColumn, 'until', page.until),
+               (assignedColumn, 'assigned', page.assigned), (registeredColumn, 'registered', page.registered))
+    for column, name, value in filters:
+        if value is not None and column is None:
+            raise ValueError(f'{name} is not supported by this listing.')
+
+    if page.since is not None:
+        statement = statement.where(timeColumn >= page.since)
+    if page.until is not None:
+        statement = statement.where(timeColumn <= page.until)
+    if page.assigned is not None:
+        statement = statement.where(assignedColumn == page.assigned)
+    if page.registered is not None:
+        statement = statement.where(registeredColumn == page.registered)
+
+    if page.limit is not None:
+        if page.after is not None:
+            statement = statement.where(keyColumn > page.after)
+        statement = statement.order_by(keyColumn).limit(page.limit + 1)
+    return statement
+
+
+def page_rows(rows, page):
+    """Split the rows selected by apply() into (rows of the page, key to continue after or None)."""
+
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        return rows, rows[-1][0]
+    return rows, None
@@ -0,0 +1,224 @@
+import atexit
+import heapq
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from paho.mqtt.client import MQTT_ERR_NO_CONN, MQTT_ERR_SUCCESS, topic_matches_sub
+from isdProjectImports import logHandler
+from isdProjectImports import metrics
+
+# How messages of a topic are published.
+#   qos, retain: passed to the broker. A retained message is handed to every client that subscribes later.
+#   coalesceMs: 0 publishes every message. Otherwise a coalescing key (the topic by default) is published at most
+#               once per window, messages queued during the window are replaced by the newest one (latest state wins).
+PublishPolicy = namedtuple('PublishPolicy', ['qos', 'retain', 'coalesceMs'], defaults=[1, False, 0])
+
+
+def _topic_label(topic):
+    # Labelled with the first topic level only, the rest holds MAC addresses and device IDs.
+    return topic.lstrip('/').split('/')[0]
+
+
+class PublishQueue:
+    """
+    Outbound MQTT messages, published by one background thread.
+
+    publish() only queues the message and returns. The policy of the first matching filter in
+    'policies' decides QoS, retain and coalescing of a topic. A publish the client refuses (e.g. a
+    QoS 0 message while disconnected, or a full client queue) is retried with exponential backoff up
+    to 'maxRetries' times, a coalesced message is not retried when a newer message with its key is
+    already queued. QoS 1 and 2 messages published while disconnected are kept by the client and
+    sent after the reconnect, so they are not retried. stop() publishes everything still queued.
+    Latency is measured from publish() to the broker's PUBACK (QoS 0: to the hand-off to the
+    client) and exported as metrics.mqttPublishSeconds.
+    """
+
+    def __init__(self, mqtt, policies=(), defaultPolicy=PublishPolicy(), maxQueueSize=10000, maxRetries=5, retryBaseMs=200, maxTrackedInflight=10000):
+        self.mqtt = mqtt
+        self.policies = list(policies)  # [(filter, PublishPolicy)]
+        self.defaultPolicy = defaultPolicy
+        self.maxQueueSize = maxQueueSize
+        self.maxRetries = maxRetries
+        self.retryBase = retryBaseMs / 1000
+        self.maxTrackedInflight = maxTrackedInflight
+        self._condition = threading.Condition()
+        self._heap = []  # (due, sequence, topic, payload or None for the latest coalesced payload, attempt, queuedAt, key)
+        self._sequence = itertools.count()
+        self._latest = {}  # Coalescing key -> (payload, queuedAt) waiting to be published.
+        self._lastSent = {}  # Coalescing key -> time of its last publish.
+        self._inflightLock = threading.Lock()
+        self._inflight = OrderedDict()  # mid -> (topic label, queuedAt), waiting for the PUBACK.
+        self._earlyAcks = OrderedDict()  # mid -> None, PUBACKs that arrived before publish() returned the mid.
+        self._thread = None
+        self._running = False
+        self._stopped = False
+
+        # Metrics.
+        self.queuedMessages = 0
+        self.coalescedMessages = 0
+        self.rejectedMessages = 0
+        self.publishedMessages = 0
+        self.retriedMessages = 0
+        self.droppedMessages = 0
+
+    def policy(self, topic):
+        for subscription, policy in self.policies:
+            if topic_matches_sub(subscription, topic):
+                return policy
+        return self.defaultPolicy
+
+    def publish(self, topic, message, key=None):
+        """
+        Queue a message.
+
+        Args:
+            - topic (str): The MQTT topic.
+            - message (dict, list, str or bytes): JSON serializable objects are encoded with json.dumps().
+            - key (str): Coalesced messages with the same key replace each other while queued. Defaults to 'topic'.
+
+        Returns:
+            - bool: True if the message was queued, False if the queue is full or the publisher was stopped.
+        """
+
+        payload = message if isinstance(message, (str, bytes)) else json.dumps(message)
+        policy = self.policy(topic)
+        key = key or topic
+        now = time.monotonic()
+        with self._condition:
+            if self._stopped:
+                self.rejectedMessages += 1
+                metrics.mqttPublishFailures.labels(_topic_label(topic)).inc()
+                logHandler.log(f'PublishQueue.publish(), publisher stopped, message to {topic} dropped.')
+                return False
+            if policy.coalesceMs and key in self._latest:
+                self._latest[key] = (payload, self._latest[key][1])
+                self.coalescedMessages += 1
+                return True
+            if len(self._heap) >= self.maxQueueSize:
+                self.rejectedMessages += 1
+                metrics.mqttPublishFailures.labels(_topic_label(topic)).inc()
+                logHandler.log(f'PublishQueue.publish(), queue full, message to {topic} dropped.')
+                return False
+
+            if policy.coalesceMs:
+                self._latest[key] = (payload, now)
+                due = max(now, self._lastSent.get(key, 0) + policy.coalesceMs / 1000)
+                heapq.heappush(self._heap, (due, next(self._sequence), topic, None, 0, now, key))
+            else:
+                heapq.heappush(self._heap, (now, next(self._sequence), topic, payload, 0, now, key))
+            self.queuedMessages += 1
+            self._condition.notify()
+        return True
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.mqtt.client.on_publish = self._handle_publish
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='PublishQueue', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=5):
+        """Publish every queued message, also those waiting for their coalescing window or retry, and stop the publisher thread."""
+
+        with self._condition:
+            self._running = False
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._due():
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._condition.wait(timeout)
+                if not self._running and not self._due():
+                    return
+                due, _, topic, payload, attempt, queuedAt, key = heapq.heappop(self._heap)
+                policy = self.policy(topic)
+                if payload is None:
+                    payload, queuedAt = self._latest.pop(key)
+                if policy.coalesceMs:
+                    self._lastSent[key] = time.monotonic()
+
+            # Published without holding the condition: paho calls on_publish with its own lock held.
+            self._send(topic, payload, policy, attempt, queuedAt, key)
+
+    def _due(self):
+        # While stopping every queued message is due.
+        return self._heap and (not self._running or self._heap[0][0] <= time.monotonic())
+
+    def _send(self, topic, payload, policy, attempt, queuedAt, key):
+        label = _topic_label(topic)
+        try:
+            result, mid = self.mqtt.publish(topic, payload, qos=policy.qos, retain=policy.retain)
+        except Exception as error:
+            result, mid = error, None
+
+        # At QoS 1 and 2 the client keeps a message it could not send while disconnected and sends it after
+        # the reconnect, it then waits for its PUBACK like a sent one. Retrying it would publish it twice.
+        if result == MQTT_ERR_SUCCESS or (result == MQTT_ERR_NO_CONN and policy.qos > 0):
+            self.publishedMessages += 1
+            if policy.qos == 0:
+                metrics.mqttPublishSeconds.labels(label).observe(time.monotonic() - queuedAt)
+                return
+            with self._inflightLock:
+                if mid in self._earlyAcks:
+                    del self._earlyAcks[mid]
+                    metrics.mqttPublishSeconds.labels(label).observe(time.monotonic() - queuedAt)
+                    return
+                self._inflight[mid] = (label, queuedAt)
+                while len(self._inflight) > self.maxTrackedInflight:
+                    self._inflight.popitem(last=False)  # PUBACKs lost with a dropped session.
+            return
+
+        metrics.mqttPublishFailures.labels(label).inc()
+        with self._condition:
+            self._retry(topic, payload, policy, attempt, queuedAt, key, result)
+
+    def _retry(self, topic, payload, policy, attempt, queuedAt, key, result):
+        if policy.coalesceMs and key in self._latest:
+            return  # A newer message with the key is queued, it replaces the failed one.
+        if attempt < self.maxRetries and self._running:
+            self.retriedMessages += 1
+            if policy.coalesceMs:
+                # Queued as the latest message of the key, so messages published before the retry replace it.
+                self._latest[key] = (payload, queuedAt)
+                payload = None
+            retryAt = time.monotonic() + self.retryBase * 2 ** attempt
+            heapq.heappush(self._heap, (retryAt, next(self._sequence), topic, payload, attempt + 1, queuedAt, key))
+            logHandler.log(f'PublishQueue, publish to {topic} failed ({result}), retry {attempt + 1}/{self.maxRetries}.')
+        else:
+            self.droppedMessages += 1
+            logHandler.log(f'PublishQueue, failed to publish message: {payload} to topic: {topic}, {result}')
+
+    def _handle_publish(self, client, userdata, mid):
+        with self._inflightLock:
+            entry = self._inflight.pop(mid, None)
+            if entry is None:
+                self._earlyAcks[mid] = None
+                while len(self._earlyAcks) > self.maxTrackedInflight:
+                    self._earlyAcks.popitem(last=False)  # QoS 0 messages, their mid is never looked up.
+        if entry is not None:
+            label, queuedAt = entry
+            metrics.mqttPublishSeconds.labels(label).observe(time.monotonic() - queuedAt)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'queueDepth': len(self._heap),
+                'maxQueueSize': self.maxQueueSize,
+                'inflight': len(self._inflight),
+                'queuedMessages': self.queuedMessages,
+                'coalescedMessages': self.coalescedMessages,
+                'rejectedMessages': self.rejectedMessages,
+                'publishedMessages': self.publishedMessages,
+                'retriedMessages': self.retriedMessages,
+                'droppedMessages': self.droppedMessages,
+            }
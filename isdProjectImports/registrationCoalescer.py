@@ -0,0 +1,111 @@
+import csv
+import io
+from isdProjectImports import logHandler
+from isdProjectImports import dbFunctions
+from isdProjectImports import microBatcher
+
+
+class RegistrationCoalescer:
+    """
+    Batches ESP registrations that arrive within a short window.
+
+    When a hall of ESPs powers on they all register at once. The MQTT handler only queues the
+    MAC address; a microBatcher.MicroBatcher collects the registrations of a 'windowMs' window (or
+    'batchSize' ESPs), registers them with one dbFunctions.register_esps() upsert and hands the
+    registered rows to the handlers registered with '@coalescer.on_registered', which send the
+    replies of the whole batch together. A MAC address registering twice in a window is
+    registered once.
+    """
+
+    def __init__(self, app, batchSize=500, windowMs=50, maxQueueSize=10000, maxRetries=3):
+        self.app = app
+        self._batcher = microBatcher.MicroBatcher(self._register, 'RegistrationCoalescer', batchSize=batchSize, windowMs=windowMs, maxQueueSize=maxQueueSize, maxRetries=maxRetries)
+        self._batcher.on_flushed(self._registered)
+        self._handlers = []
+        self.registeredESPs = 0
+
+    def on_registered(self, handler):
+        """Decorator registering handler(registeredESPs), called with the rows of every registered batch."""
+
+        self._handlers.append(handler)
+        return handler
+
+    def start(self):
+        self._batcher.start()
+
+    def submit(self, macAddress):
+        """
+        Queue the registration of an ESP.
+
+        Returns:
+            - bool: True if the registration was queued, False if the queue is full.
+        """
+
+        if self._batcher.submit(macAddress):
+            return True
+        logHandler.log(f'RegistrationCoalescer.submit(), queue full, registration rejected. MAC address: {macAddress}')
+        return False
+
+    def stop(self, timeout=10):
+        """Register every queued ESP and stop the coalescer thread."""
+
+        self._batcher.stop(timeout)
+
+    def stats(self):
+        stats = self._batcher.stats()
+        return {
+            'queueDepth': stats['queueDepth'],
+            'maxQueueSize': stats['maxQueueSize'],
+            'receivedRegistrations': stats['received'],
+            'coalescedRegistrations': stats['coalesced'],
+            'rejectedRegistrations': stats['rejected'],
+            'registeredESPs': self.registeredESPs,
+            'failedRegistrations': stats['failed'],
+            'batches': stats['batches'],
+            'lastBatchSize': stats['lastBatchSize'],
+            'maxBatchSize': stats['maxBatchSize'],
+            'lastFlushMs': stats['lastFlushMs'],
+        }
+
+    def _register(self, batch):
+        return dbFunctions.register_esps(self.app, list(batch))
+
+    def _registered(self, batch, registeredESPs):
+        self.registeredESPs += len(registeredESPs)
+        for handler in self._handlers:
+            try:
+                handler(registeredESPs)
+            except Exception as errorMsg:
+                logHandler.log(f'RegistrationCoalescer._registered(), handler {handler.__name__} failed: {errorMsg}')
+
+
+def parse_provisioning_csv(text):
+    """
+    Read the ESPs of a provisioning CSV.
+
+    Args:
+        - text (str): One ESP per line, 'MacAddress' or 'MacAddress,Room'. A first line starting
+          with the MacAddress header is skipped. MAC addresses must be written like the ESPs send them.
+
+    Returns:
+        - list: (MacAddress, Room) tuples, Room is None when the column is missing or empty.
+
+    Raises:
+        - ValueError: If a line has more than two columns or a value is too long.
+    """
+
+    esps = []
+    for lineNumber, row in enumerate(csv.reader(io.StringIO(text)), start=1):
+        row = [value.strip() for value in row]
+        if not row or not row[0]:
+            continue
+        if lineNumber == 1 and row[0].lower() == 'macaddress':
+            continue
+        if len(row) > 2:
+            raise ValueError(f'Line {lineNumber}: expected MacAddress,Room.')
+        macAddress = row[0]
+        room = row[1] if len(row) == 2 and row[1] else None
+        if len(macAddress) > 255 or (room is not None and len(room) > 64):
+            raise ValueError(f'Line {lineNumber}: MacAddress or Room is too long.')
+        esps.append((macAddress, room))
+    return esps
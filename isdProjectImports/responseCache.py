@@ -0,0 +1,135 @@
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import Response, make_response, request
+
+# Invalidation tags, a cached response is dropped when one of its tags is invalidated.
+ESPS = 'esps'      # ESP registration and assignment, users.
+TOPICS = 'topics'  # Topics.
+
+
+class CachedResponse:
+    __slots__ = ('body', 'etag', 'status', 'mimetype')
+
+    def __init__(self, body, etag, status, mimetype):
+        self.body = body
+        self.etag = etag
+        self.status = status
+        self.mimetype = mimetype
+
+
+class ResponseCache:
+    """
+    Cache of serialized REST responses, keyed by path and query string.
+
+    Entries are not timed out, they are invalidated by the dbFunctions code paths that change
+    the data (see the tags above). Every tag has a generation counter; a response is only
+    stored if none of its tags was invalidated while it was built, so a response read before a
+    concurrent change is never cached.
+    Responses carry an ETag and a matching If-None-Match is answered with 304 Not Modified.
+    """
+
+    def __init__(self, maxEntries=256):
+        self.maxEntries = maxEntries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # Key -> (CachedResponse, tags)
+        self._generations = {}  # Tag -> number of invalidations
+        self._epoch = 0  # Number of clear() calls.
+        self.hits = 0
+        self.misses = 0
+        self.notModified = 0
+        self.invalidations = 0
+
+    def invalidate(self, *tags):
+        """Drop every cached response with one of 'tags'."""
+
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in [key for key, (_, entryTags) in self._entries.items() if not entryTags.isdisjoint(tags)]:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def _generation_snapshot(self, tags):
+        return (self._epoch,) + tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)  # Keep recently used entries, evict the least recently used.
+            return entry[0]
+
+    def put(self, key, tags, generations, response):
+        """Store 'response' unless one of 'tags' changed since 'generations' was taken."""
+
+        body = response.get_data()
+        cached = CachedResponse(body, hashlib.blake2b(body, digest_size=12).hexdigest(), response.status_code, response.mimetype)
+        with self._lock:
+            if self._generation_snapshot(tags) != generations:
+                return cached
+            self._entries[key] = (cached, frozenset(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+        return cached
+
+    def _respond(self, cached):
+        if request.if_none_match.contains(cached.etag):
+            self.notModified += 1
+            response = Response(status=304)
+        else:
+            response = Response(cached.body, status=cached.status, mimetype=cached.mimetype)
+        response.set_etag(cached.etag)
+        response.headers['Cache-Control'] = 'no-cache'  # Clients revalidate with If-None-Match.
+        return response
+
+    def cached(self, *tags):
+        """
+        Decorator caching the response of a GET view function.
+
+        Args:
+            - tags (str): Invalidation tags of the data the view returns.
+
+        Note:
+            - Only 200 responses are cached, streamed responses ('?stream=1') bypass the cache.
+        """
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                key = request.full_path
+                cached = self.get(key)
+                if cached is not None:
+                    self.hits += 1
+                    return self._respond(cached)
+
+                self.misses += 1
+                generations = self._generation_snapshot(tags)
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                return self._respond(self.put(key, tags, generations, response))
+            return wrapper
+        return decorator
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'maxEntries': self.maxEntries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'notModified': self.notModified,
+            'invalidations': self.invalidations,
+            'hitRate': round(self.hits / (self.hits + self.misses), 4) if self.hits + self.misses else 0,
+        }
+
+
+cache = ResponseCache()
@@ -0,0 +1,88 @@
+import json
+import threading
+import time
+
+
+class ResyncResponder:
+    """
+    Answers resync requests with the current vote state.
+
+    The state messages are encoded when the vote state changes (update()), not per request. Requests
+    are debounced: the first request of a window is answered right away, the requests that arrive
+    during the window are collapsed into one more broadcast at its end. When 300 ESPs reboot together
+    they cause two broadcasts instead of 300.
+    """
+
+    def __init__(self, publish, windowMs=500):
+        """
+        Args:
+            - publish (function): publish(topic, payload, key), e.g. mqttImports.publishJSONtoMQTT.
+            - windowMs (int): Debounce window.
+        """
+
+        self.publish = publish
+        self.window = windowMs / 1000
+        self._lock = threading.Lock()
+        self._payloads = {}  # Key -> (topic, encoded state message).
+        self._windowEnd = 0.0
+        self._timer = None
+
+        # Metrics.
+        self.requests = 0
+        self.collapsedRequests = 0
+        self.broadcasts = 0
+
+    def update(self, key, topic, message):
+        """Store the state message of 'key' (e.g. a room) and its topic, sent on every later request. Returns the encoded message."""
+
+        payload = json.dumps(message)
+        with self._lock:
+            self._payloads[key] = (topic, payload)
+        return payload
+
+    def remove(self, key):
+        with self._lock:
+            self._payloads.pop(key, None)
+
+    def request(self):
+        """
+        Handle a resync request.
+
+        Returns:
+            - bool: True if the state was broadcast now, False if the request was collapsed into the broadcast at the end of the window.
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            if now < self._windowEnd:
+                self.collapsedRequests += 1
+                if self._timer is None:
+                    self._timer = threading.Timer(self._windowEnd - now, self._trailing_broadcast)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return False
+            self._windowEnd = now + self.window
+        self._broadcast()
+        return True
+
+    def _trailing_broadcast(self):
+        with self._lock:
+            self._timer = None
+            self._windowEnd = time.monotonic() + self.window
+        self._broadcast()
+
+    def _broadcast(self):
+        with self._lock:
+            payloads = list(self._payloads.items())
+            self.broadcasts += 1
+        for key, (topic, payload) in payloads:
+            self.publish(topic, payload, key)
+
+    def stats(self):
+        return {
+            'states': len(self._payloads),
+            'requests': self.requests,
+            'collapsedRequests': self.collapsedRequests,
+            'broadcasts': self.broadcasts,
+        }
@@ -0,0 +1,95 @@
+import itertools
+import threading
+from paho.mqtt.client import MQTT_ERR_SUCCESS, topic_matches_sub
+from isdProjectImports import logHandler
+
+
+class SubscriptionManager:
+    """
+    The MQTT subscriptions of the server, kept as one bounded set of filters.
+
+    Subscriptions go straight to the paho client instead of Mqtt.subscribe(), so flask-mqtt does
+    not collect them in its topic dict and re-subscribe them one by one on reconnect. A filter is
+    only subscribed once, and not at all if a wildcard filter of the set already covers it, e.g.
+    '/registration/ESP/<DeviceID>' under '/registration/ESP/+'. After a reconnect restore()
+    subscribes the whole set with one SUBSCRIBE packet per 'batchSize' filters.
+    Filters are never unsubscribed: device topics are covered by the wildcard of their route, so
+    the set holds the route filters and does not grow with the number of ESPs.
+    """
+
+    def __init__(self, mqtt, qos=1, batchSize=50, routeFilters=()):
+        """
+        Args:
+            - routeFilters (list): Filters that are always subscribed, e.g. topicRouter.TopicRouter.subscriptions. The list
+              is kept, not copied, so routes registered later count as subscribed too, also before the first restore().
+        """
+
+        self.mqtt = mqtt
+        self.qos = qos
+        self.batchSize = batchSize
+        self.routeFilters = routeFilters
+        self._lock = threading.Lock()
+        self._filters = {}  # Filter -> QoS, in subscription order.
+        self.subscribePackets = 0
+        self.skippedFilters = 0
+        self.restores = 0
+
+    def covers(self, topic):
+        """True if another, subscribed wildcard filter matches 'topic'."""
+
+        return any(subscription != topic and ('+' in subscription or '#' in subscription) and topic_matches_sub(subscription, topic) for subscription in itertools.chain(self.routeFilters, self._filters))
+
+    def add(self, *filters, qos=None):
+        """
+        Subscribe to the filters that are not subscribed or covered by a wildcard yet.
+
+        Returns:
+            - list: The filters that were subscribed.
+        """
+
+        qos = self.qos if qos is None else qos
+        with self._lock:
+            added = []
+            for subscription in filters:
+                if subscription in self._filters or subscription in self.routeFilters or subscription in added or self.covers(subscription):
+                    self.skippedFilters += 1
+                    continue
+                added.append(subscription)
+            for subscription in added:
+                self._filters[subscription] = qos
+        if added:
+            self._subscribe([(subscription, qos) for subscription in added])
+        return added
+
+    def restore(self, filters=()):
+        """
+        Subscribe the route filters and the whole set again, called when the client (re)connects.
+
+        Args:
+            - filters (iterable): More filters added to the set before it is restored.
+        """
+
+        with self._lock:
+            for subscription in itertools.chain(self.routeFilters, filters):
+                if subscription not in self._filters and not self.covers(subscription):
+                    self._filters[subscription] = self.qos
+            subscriptions = list(self._filters.items())
+        self.restores += 1
+        self._subscribe(subscriptions)
+        logHandler.log(f'SubscriptionManager.restore(), subscribed to {len(subscriptions)} filters: {[subscription for subscription, _ in subscriptions]}')
+
+    def _subscribe(self, subscriptions):
+        for start in range(0, len(subscriptions), self.batchSize):
+            self.subscribePackets += 1
+            result, _ = self.mqtt.client.subscribe(subscriptions[start:start + self.batchSize])
+            if result != MQTT_ERR_SUCCESS:
+                # Not connected, the filters stay in the set and are subscribed by the next restore().
+                logHandler.log(f'SubscriptionManager._subscribe(), subscribe failed with MQTT error code {result}')
+
+    def stats(self):
+        return {
+            'filters': len(self._filters),
+            'subscribePackets': self.subscribePackets,
+            'skippedFilters': self.skippedFilters,
+            'restores': self.restores,
+        }
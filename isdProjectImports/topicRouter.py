@@ -0,0 +1,138 @@
+class Route:
+    """A registered topic pattern and the handler it routes to."""
+
+    __slots__ = ('name', 'pattern', 'subscription', 'handler', 'orderKey', 'paramLevels', 'schema')
+
+    def __init__(self, name, pattern, subscription, handler, orderKey, paramLevels, schema=None):
+        self.name = name
+        self.pattern = pattern
+        self.subscription = subscription
+        self.handler = handler
+        self.orderKey = orderKey
+        self.paramLevels = paramLevels  # ((levelIndex, paramName), ...)
+        self.schema = schema  # mqttMessages.MessageSchema subclass the payload is decoded with.
+
+
+class _Node:
+    __slots__ = ('children', 'singleLevel', 'multiLevel', 'route')
+
+    def __init__(self):
+        self.children = {}
+        self.singleLevel = None
+        self.multiLevel = None
+        self.route = None
+
+
+class TopicRouter:
+    """
+    Routes MQTT topics to handlers through a trie over topic levels.
+
+    Patterns are MQTT topic filters where a single level can be a named parameter:
+        - '/vote/<deviceID>'         matches '/vote/abc', params {'deviceID': 'abc'}
+        - '/registration/Server/+'   '+' matches any single level
+        - '/telemetry/#'             '#' matches the remaining levels (last level only)
+    Matching walks one trie node per topic level, so the cost depends on the topic depth
+    and not on the number of registered routes. Exact levels win over '+' and '+' over '#'.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._exactRoutes = {}  # Patterns without wildcards are matched with a single dict lookup.
+        self.routes = []
+        self.subscriptions = []  # MQTT subscription filters of the registered routes.
+
+    def route(self, pattern, name=None, orderKey=None, schema=None):
+        """
+        Decorator registering 'handler' for 'pattern'.
+
+        Args:
+            - pattern (str): Topic pattern, see the class docstring.
+            - name (str): Route name used in logs and metrics. Defaults to the handler name.
+            - orderKey (str): Parameter whose value identifies the device, messages with the same value are kept in order.
+            - schema (class): mqttMessages.MessageSchema subclass the payload is decoded and validated with.
+        """
+
+        def decorator(handler):
+            self.add(pattern, handler, name or handler.__name__, orderKey, schema)
+            return handler
+        return decorator
+
+    def add(self, pattern, handler, name, orderKey=None, schema=None):
+        levels = pattern.split('/')
+        node = self._root
+        paramLevels = []
+        subscriptionLevels = []
+
+        for index, level in enumerate(levels):
+            if level == '#':
+                if index != len(levels) - 1:
+                    raise ValueError(f"'#' must be the last level of the topic pattern: {pattern}")
+                if node.multiLevel is None:
+                    node.multiLevel = _Node()
+                node = node.multiLevel
+                subscriptionLevels.append('#')
+
+            elif level == '+' or (level.startswith('<') and level.endswith('>')):
+                if level != '+':
+                    paramLevels.append((index, level[1:-1]))
+                if node.singleLevel is None:
+                    node.singleLevel = _Node()
+                node = node.singleLevel
+                subscriptionLevels.append('+')
+
+            else:
+                node = node.children.setdefault(level, _Node())
+                subscriptionLevels.append(level)
+
+        if orderKey is not None and orderKey not in [paramName for _, paramName in paramLevels]:
+            raise ValueError(f'Order key {orderKey} is not a parameter of the topic pattern: {pattern}')
+        if node.route is not None:
+            raise ValueError(f'Topic pattern already registered: {pattern}')
+
+        node.route = Route(name, pattern, '/'.join(subscriptionLevels), handler, orderKey, tuple(paramLevels), schema)
+        if '+' not in subscriptionLevels and '#' not in subscriptionLevels:
+            self._exactRoutes[pattern] = node.route
+        self.routes.append(node.route)
+        if node.route.subscription not in self.subscriptions:
+            self.subscriptions.append(node.route.subscription)
+        return node.route
+
+    def match(self, topic):
+        """
+        Find the route of 'topic'.
+
+        Returns:
+            - tuple: (Route, params dict) of the matching route, or None if no route matches.
+        """
+
+        route = self._exactRoutes.get(topic)
+        if route is not None:
+            return route, {}
+
+        levels = topic.split('/')
+        route = self._match(self._root, levels, 0)
+        if route is None:
+            return None
+        return route, {paramName: levels[index] for index, paramName in route.paramLevels}
+
+    def _match(self, node, levels, index):
+        if index == len(levels):
+            if node.route is not None:
+                return node.route
+            # 'a/#' also matches 'a'.
+            return node.multiLevel.route if node.multiLevel is not None else None
+
+        child = node.children.get(levels[index])
+        if child is not None:
+            route = self._match(child, levels, index + 1)
+            if route is not None:
+                return route
+
+        if node.singleLevel is not None:
+            route = self._match(node.singleLevel, levels, index + 1)
+            if route is not None:
+                return route
+
+        if node.multiLevel is not None:
+            return node.multiLevel.route
+        return None
@@ -7,9 +7,11 @@ class VoteInformation:
         self.description = None
         self.voteStartTime = None
         self.voteEndTime = None
+        self.room = None  # None is the default room.
     
-    def updateVoteInformation(self, title, description, voteStartTime, voteEndTime):
+    def updateVoteInformation(self, title, description, voteStartTime, voteEndTime, room=None):
         self.title = title
         self.description = description
         self.voteStartTime = voteStartTime
         self.voteEndTime = voteEndTime
+        self.room = room
@@ -0,0 +1,163 @@
+import atexit
+import heapq
+import itertools
+import threading
+from datetime import datetime
+from isdProjectImports import logHandler
+
+# Topic states.
+PENDING = 'pending'
+STARTED = 'started'
+ENDED = 'ended'
+
+
+class VoteScheduler:
+    """
+    Moves topics through pending -> started -> ended at their start and end times.
+
+    Transitions are kept in a heap ordered by time and a single thread sleeps until the next
+    one is due. The current state of every scheduled topic is cached, so isAccepting() on the
+    vote path is a dict lookup instead of datetime comparisons. Handlers registered with
+    '@scheduler.on_transition' are called once per transition, always on the scheduler thread,
+    so the states of a topic are published in order.
+    """
+
+    maxSleepSec = 60  # Upper bound of a wait, so a changed system clock is picked up.
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._heap = []  # (time, sequence, topicID, version, state, announce)
+        self._sequence = itertools.count()
+        self._versionCounter = itertools.count(1)  # Versions are never reused, so entries of a forgotten topic never match again.
+        self._topics = {}  # TopicID -> VoteInformation
+        self._versions = {}  # TopicID -> version, heap entries of older versions are skipped.
+        self._states = {}  # TopicID -> state
+        self._handlers = []
+        self._thread = None
+        self._running = False
+        self.transitions = 0
+
+    def on_transition(self, handler):
+        """Decorator registering handler(voteInformation, state), called when a topic changes state."""
+
+        self._handlers.append(handler)
+        return handler
+
+    @staticmethod
+    def state_at(voteInformation, now):
+        # A topic that ends before it starts is never started.
+        if now >= voteInformation.voteEndTime:
+            return ENDED
+        if now < voteInformation.voteStartTime:
+            return PENDING
+        return STARTED
+
+    def isAccepting(self, topicID):
+        """True if 'topicID' is scheduled and between its start and end time."""
+
+        return self._states.get(topicID) == STARTED
+
+    def state(self, topicID):
+        return self._states.get(topicID)
+
+    def schedule(self, voteInformation):
+        """
+        Schedule (or reschedule) the transitions of a topic.
+
+        Args:
+            - voteInformation (VoteInformation): The topic, with topicID and datetime start and end times.
+
+        Note:
+            - The current state is announced to the handlers as soon as the scheduler thread runs, so
+              ESPs learn the state of a new topic. isAccepting() reflects it immediately.
+        """
+
+        topicID = voteInformation.topicID
+        now = datetime.now()
+        state = self.state_at(voteInformation, now)
+        with self._condition:
+            version = next(self._versionCounter)
+            self._versions[topicID] = version
+            self._topics[topicID] = voteInformation
+            self._states[topicID] = state
+            heapq.heappush(self._heap, (now, next(self._sequence), topicID, version, state, True))
+            if state == PENDING and voteInformation.voteStartTime < voteInformation.voteEndTime:
+                heapq.heappush(self._heap, (voteInformation.voteStartTime, next(self._sequence), topicID, version, STARTED, False))
+            if state != ENDED:
+                heapq.heappush(self._heap, (voteInformation.voteEndTime, next(self._sequence), topicID, version, ENDED, False))
+            self._condition.notify()
+
+        logHandler.log(f'voteScheduler, topic {topicID} scheduled, state: {state}, start: {voteInformation.voteStartTime}, end: {voteInformation.voteEndTime}')
+
+    def forget(self, topicID):
+        """Stop tracking a topic, its pending transitions and announcements are dropped."""
+
+        with self._condition:
+            self._versions.pop(topicID, None)
+            self._topics.pop(topicID, None)
+            self._states.pop(topicID, None)
+
+    def _notify(self, voteInformation, state):
+        for handler in self._handlers:
+            try:
+                handler(voteInformation, state)
+            except Exception as errorMsg:
+                logHandler.log(f'voteScheduler, transition handler {handler.__name__} failed: {errorMsg}')
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='VoteScheduler', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _due_transitions(self):
+        """Wait for and pop the transitions that are due, returns [(voteInformation, state)]."""
+
+        with self._condition:
+            while self._running:
+                now = datetime.now()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, topicID, version, state, announce = heapq.heappop(self._heap)
+                    if self._versions.get(topicID) != version:
+                        continue
+                    if announce:
+                        due.append((self._topics[topicID], state))
+                    elif self._states.get(topicID) != state:
+                        self._states[topicID] = state
+                        due.append((self._topics[topicID], state))
+                if due:
+                    return due
+
+                timeout = self.maxSleepSec
+                if self._heap:
+                    timeout = min(timeout, max((self._heap[0][0] - now).total_seconds(), 0))
+                self._condition.wait(timeout)
+            return []
+
+    def _run(self):
+        while self._running:
+            for voteInformation, state in self._due_transitions():
+                self.transitions += 1
+                logHandler.log(f'voteScheduler, topic {voteInformation.topicID} {state}.')
+                self._notify(voteInformation, state)
+
+    def stats(self):
+        with self._condition:
+            states = list(self._states.values())
+            return {
+                'scheduledTopics': len(states),
+                'startedTopics': states.count(STARTED),
+                'pendingTransitions': len(self._heap),
+                'transitions': self.transitions,
+            }
@@ -0,0 +1,77 @@
+import threading
+
+
+class VoteSessions:
+    """
+    The current topic of every room, indexed for the vote path.
+
+    A room runs one topic at a time, creating a topic in a room replaces the previous one. Topics are
+    indexed by TopicID and by (room, title), so a vote is routed with one dict lookup using the room of
+    the ESP and the VoteTitle of the message. Readers do not lock, the indexes are only changed under
+    '_lock' and every change is a single dict assignment or removal.
+    Room None is the default room of ESPs and topics created without a room.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._byRoom = {}  # Room -> VoteInformation
+        self._byTopicID = {}  # TopicID -> VoteInformation
+        self._byRoomTitle = {}  # (Room, Title) -> VoteInformation
+
+    def add(self, voteInformation):
+        """
+        Make 'voteInformation' the topic of its room.
+
+        Returns:
+            - VoteInformation or None: The topic it replaced.
+        """
+
+        with self._lock:
+            replaced = self._byRoom.get(voteInformation.room)
+            if replaced is not None:
+                self._remove(replaced)
+            self._byRoom[voteInformation.room] = voteInformation
+            self._byTopicID[voteInformation.topicID] = voteInformation
+            self._byRoomTitle[(voteInformation.room, voteInformation.title)] = voteInformation
+            return replaced
+
+    def remove(self, topicID):
+        with self._lock:
+            voteInformation = self._byTopicID.get(topicID)
+            if voteInformation is not None:
+                self._remove(voteInformation)
+                self._byRoom.pop(voteInformation.room, None)
+
+    def _remove(self, voteInformation):
+        self._byTopicID.pop(voteInformation.topicID, None)
+        if self._byRoomTitle.get((voteInformation.room, voteInformation.title)) is voteInformation:
+            del self._byRoomTitle[(voteInformation.room, voteInformation.title)]
+
+    def clear(self):
+        with self._lock:
+            self._byRoom.clear()
+            self._byTopicID.clear()
+            self._byRoomTitle.clear()
+
+    def resolve(self, room, title):
+        """Topic of 'room' titled 'title', None if the room runs no such topic."""
+
+        return self._byRoomTitle.get((room, title))
+
+    def get(self, topicID):
+        return self._byTopicID.get(topicID)
+
+    def room(self, room):
+        return self._byRoom.get(room)
+
+    def all(self):
+        return list(self._byRoom.values())
+
+    def stats(self):
+        return {
+            'rooms': len(self._byRoom),
+            'topics': len(self._byTopicID),
+        }
+
+
+sessions = VoteSessions()
@@ -0,0 +1,129 @@
+import threading
+
+
+class TopicTally:
+    """Vote counts of one topic and the current choice of every user that voted."""
+
+    __slots__ = ('counts', 'choices')
+
+    def __init__(self):
+        self.counts = {}  # VoteType -> number of votes
+        self.choices = {}  # UserID -> VoteType
+
+
+class VoteTally:
+    """
+    Live vote counts per topic, updated incrementally as votes are accepted.
+
+    A topic is tracked once it has been seeded from the database (or created empty for a
+    new topic). Recording a vote moves the user's count from the previous choice to the
+    new one, so reading the counts never touches the database. Handlers registered with
+    '@tally.before_load' run before topics are loaded from the database, e.g. to store the
+    votes that are still queued.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._topics = {}  # TopicID -> TopicTally
+        self._beforeLoadHandlers = []
+
+    def before_load(self, handler):
+        """Decorator registering handler(topicIDs), called before the given topics are loaded from the database."""
+
+        self._beforeLoadHandlers.append(handler)
+        return handler
+
+    def prepare_load(self, topicIDs):
+        for handler in self._beforeLoadHandlers:
+            handler(topicIDs)
+
+    def isTracked(self, topicID):
+        return topicID in self._topics
+
+    def seed(self, topicID, votes):
+        """
+        Start tracking a topic.
+
+        Args:
+            - topicID (int): The ID of the topic.
+            - votes (iterable): (UserID, VoteType) pairs already stored for the topic.
+        """
+
+        topicTally = TopicTally()
+        for userID, voteType in votes:
+            topicTally.choices[userID] = voteType
+        for voteType in topicTally.choices.values():
+            topicTally.counts[voteType] = topicTally.counts.get(voteType, 0) + 1
+
+        with self._lock:
+            self._topics[topicID] = topicTally
+
+    def record(self, topicID, userID, voteType):
+        """
+        Count a vote of 'userID' on a tracked topic.
+
+        Returns:
+            - str or None: The user's previous choice, None if this is the user's first vote on the topic or the
+              topic is not tracked (it was forgotten, the vote is counted when the topic is loaded again).
+        """
+
+        with self._lock:
+            topicTally = self._topics.get(topicID)
+            if topicTally is None:
+                return None
+            previous = topicTally.choices.get(userID)
+            if previous == voteType:
+                return previous
+
+            if previous is not None:
+                remaining = topicTally.counts[previous] - 1
+                if remaining:
+                    topicTally.counts[previous] = remaining
+                else:
+                    del topicTally.counts[previous]
+            topicTally.counts[voteType] = topicTally.counts.get(voteType, 0) + 1
+            topicTally.choices[userID] = voteType
+            return previous
+
+    def restore(self, topicID, userID, previous):
+        """Undo a recorded vote, e.g. when it could not be stored. 'previous' is the value record() returned."""
+
+        if previous is None:
+            with self._lock:
+                topicTally = self._topics.get(topicID)
+                voteType = topicTally.choices.pop(userID, None) if topicTally is not None else None
+                if voteType is not None:
+                    remaining = topicTally.counts[voteType] - 1
+                    if remaining:
+                        topicTally.counts[voteType] = remaining
+                    else:
+                        del topicTally.counts[voteType]
+        elif self.isTracked(topicID):
+            self.record(topicID, userID, previous)
+
+    def counts(self, topicID):
+        """Return a copy of the vote counts of a tracked topic, or None if the topic is not tracked."""
+
+        with self._lock:
+            topicTally = self._topics.get(topicID)
+            if topicTally is None:
+                return None
+            return dict(topicTally.counts)
+
+    def forget(self, topicID):
+        with self._lock:
+            self._topics.pop(topicID, None)
+
+    def clear(self):
+        with self._lock:
+            self._topics.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'trackedTopics': len(self._topics),
+                'trackedVotes': sum(len(topicTally.choices) for topicTally in self._topics.values()),
+            }
+
+
+tally = VoteTally()
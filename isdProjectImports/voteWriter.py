@@ -0,0 +1,87 @@
+from isdProjectImports import logHandler
+from isdProjectImports import dbFunctions
+from isdProjectImports import microBatcher
+
+
+class VoteWriter:
+    """
+    Write-behind persistence for incoming votes.
+
+    The MQTT handler only puts votes on a bounded queue. A microBatcher.MicroBatcher drains it
+    in micro-batches, keeps the latest vote per (UserID, TopicID) of the window and
+    writes the whole batch in one transaction through dbFunctions.apply_vote_batch().
+    When the queue is full submit() blocks for up to 'submitTimeoutSec' (backpressure
+    on the MQTT loop) and then rejects the vote. The rows of a batch that still fails after
+    'maxRetries' are handed to the handlers registered with '@writer.on_dropped'.
+    """
+
+    def __init__(self, app, batchSize=200, flushIntervalMs=50, maxQueueSize=10000, submitTimeoutSec=0.5, maxRetries=3):
+        self.app = app
+        self.submitTimeoutSec = submitTimeoutSec
+        self._batcher = microBatcher.MicroBatcher(self._write, 'VoteWriter', batchSize=batchSize, windowMs=flushIntervalMs, maxQueueSize=maxQueueSize, maxRetries=maxRetries)
+        self._batcher.on_dropped(self._dropped)
+        self._droppedHandlers = []
+
+    def on_dropped(self, handler):
+        """Decorator registering handler(rows), called with the (UserID, TopicID, VoteType) rows of a batch that could not be stored."""
+
+        self._droppedHandlers.append(handler)
+        return handler
+
+    def start(self):
+        self._batcher.start()
+
+    def submit(self, userID, topicID, voteType):
+        """
+        Queue a vote for persistence.
+
+        Returns:
+            - bool: True if the vote was queued, False if the queue stayed full for 'submitTimeoutSec'.
+        """
+
+        if self._batcher.submit((userID, topicID), voteType, timeout=self.submitTimeoutSec):
+            return True
+        logHandler.log(f'VoteWriter.submit(), queue full, vote rejected. UserID: {userID}, TopicID: {topicID}')
+        return False
+
+    def drain(self, timeout=5):
+        """Wait until every vote submitted before the call is written, see MicroBatcher.drain()."""
+
+        return self._batcher.drain(timeout)
+
+    def stop(self, timeout=10):
+        """Flush every queued vote to the database and stop the writer thread."""
+
+        self._batcher.stop(timeout)
+
+    def stats(self):
+        stats = self._batcher.stats()
+        return {
+            'queueDepth': stats['queueDepth'],
+            'maxQueueSize': stats['maxQueueSize'],
+            'receivedVotes': stats['received'],
+            'coalescedVotes': stats['coalesced'],
+            'rejectedVotes': stats['rejected'],
+            'flushedVotes': stats['flushed'],
+            'failedVotes': stats['failed'],
+            'batches': stats['batches'],
+            'lastBatchSize': stats['lastBatchSize'],
+            'maxBatchSize': stats['maxBatchSize'],
+            'avgBatchSize': round(stats['flushed'] / stats['batches'], 2) if stats['batches'] else 0,
+            'lastFlushMs': stats['lastFlushMs'],
+        }
+
+    @staticmethod
+    def _rows(batch):
+        return [(userID, topicID, voteType) for (userID, topicID), voteType in batch.items()]
+
+    def _write(self, batch):
+        return dbFunctions.apply_vote_batch(self.app, self._rows(batch))
+
+    def _dropped(self, batch):
+        rows = self._rows(batch)
+        for handler in self._droppedHandlers:
+            try:
+                handler(rows)
+            except Exception as errorMsg:
+                logHandler.log(f'VoteWriter._dropped(), handler {handler.__name__} failed: {errorMsg}')